@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+APT repository indexes for a collected debian directory.
+
+The .debs under pool/ are indexed into the layout apt expects:
+
+    dists/<suite>/main/binary-<arch>/Packages{,.gz,.xz}
+    dists/<suite>/Release
+
+Release lists every index with its size and SHA256, so apt checks what it
+reads. With a GPG key, Release is also signed (InRelease and Release.gpg)
+and the public key is exported to archive-keyring.gpg, so the offline side
+can use signed-by= instead of [trusted=yes]:
+
+    deb [signed-by=/srv/debian/archive-keyring.gpg] file:/srv/debian jammy main
+
+The suite defaults to the codename in resolutions/, and an Architecture: all
+package is listed for every architecture.
+
+The control stanzas and hashes collect_debian.py took from the archive's
+Packages indexes (resolutions/<arch>.json) are reused as they are, so
+collected files are never read again. Only .debs from elsewhere are opened
+to read their control file and hash them. What is known about each file is
+kept in dists/.repo-state.json. A rebuild only reads new or changed files,
+only rewrites indexes whose contents changed, and only re-signs Release when
+it changed.
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from artifact_cache import write_if_changed
+
+
+STATE_FILE = '.repo-state.json'
+STATE_VERSION = 1
+
+COMPONENT = 'main'
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+AR_MAGIC = b'!<arch>\n'
+
+SIGNATURE_FILES = ('InRelease', 'Release.gpg')
+
+
+def read_control(path):
+    """Return the control file of a .deb as text, or None if it cannot be read."""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(AR_MAGIC)) != AR_MAGIC:
+                return None
+            while True:
+                header = f.read(60)
+                if len(header) < 60:
+                    return None
+                name = header[:16].decode('ascii', 'replace').strip().rstrip('/')
+                size = int(header[48:58])
+                if name.startswith('control.tar'):
+                    data = f.read(size)
+                    break
+                f.seek(size + size % 2, os.SEEK_CUR)
+        # control.tar.zst needs a zstd module the standard library lacks
+        with tarfile.open(fileobj=io.BytesIO(data), mode='r:*') as archive:
+            for member in archive:
+                if member.isfile() and member.name.lstrip('./') == 'control':
+                    return archive.extractfile(member).read().decode('utf-8', 'replace')
+    except (OSError, ValueError, tarfile.TarError, EOFError, lzma.LZMAError):
+        pass
+    return None
+
+
+def describe_deb(path):
+    """Build the Packages stanza of a .deb from its control file, or None."""
+    control = read_control(path)
+    if control is None:
+        return None
+    md5 = hashlib.md5()
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return (control.strip('\n') + f"\nSize: {path.stat().st_size}\n"
+            f"MD5sum: {md5.hexdigest()}\nSHA256: {sha256.hexdigest()}\n")
+
+
+def stanza_fields(stanza):
+    """Return the single-line fields of a stanza as a dict."""
+    fields = {}
+    for line in stanza.splitlines():
+        if line[:1] not in (' ', '\t') and ':' in line:
+            key, _, value = line.partition(':')
+            fields[key] = value.strip()
+    return fields
+
+
+def with_filename(stanza, filename):
+    """Return a stanza whose Filename: field is filename."""
+    lines = [line for line in stanza.strip('\n').split('\n') if not line.startswith('Filename:')]
+    # Filename goes where dpkg-scanpackages puts it, before Size
+    at = next((i for i, line in enumerate(lines) if line.startswith('Size:')), len(lines))
+    lines.insert(at, f"Filename: {filename}")
+    return '\n'.join(lines) + '\n'
+
+
+def read_resolutions(debian_dir):
+    """Return (codename, architectures, {pool path: (size, stanza)}) from resolutions/."""
+    codename = None
+    architectures = []
+    captured = {}
+    for path in sorted((debian_dir / 'resolutions').glob('*.json')):
+        try:
+            with open(path, 'r') as f:
+                resolution = json.load(f)
+        except (OSError, ValueError):
+            continue
+        codename = codename or resolution.get('codename')
+        if resolution.get('architecture'):
+            architectures.append(resolution['architecture'])
+        for record in resolution.get('packages', []):
+            if record.get('control') and record.get('filename'):
+                captured[record['filename']] = (record['size'], record['control'])
+    return codename, architectures, captured
+
+
+def write_index(binary_dir, content):
+    """Write Packages, Packages.gz and Packages.xz; return True if they changed."""
+    binary_dir.mkdir(parents=True, exist_ok=True)
+    plain = binary_dir / 'Packages'
+    compressed = [binary_dir / 'Packages.gz', binary_dir / 'Packages.xz']
+    try:
+        unchanged = plain.read_text() == content and all(path.exists() for path in compressed)
+    except OSError:
+        unchanged = False
+    if unchanged:
+        return False
+    data = content.encode()
+    write_if_changed(plain, content)
+    for path, payload in ((compressed[0], gzip.compress(data, 9, mtime=0)),
+                          (compressed[1], lzma.compress(data, preset=6))):
+        tmp = path.with_name(path.name + '.tmp')
+        tmp.write_bytes(payload)
+        os.replace(tmp, path)
+    return True
+
+
+def release_body(suite_dir, suite, architectures):
+    """Return the Release file for a suite, without its Date: field."""
+    entries = []
+    for path in sorted(suite_dir.rglob('Packages*')):
+        if path.name.endswith('.tmp'):
+            continue
+        data = path.read_bytes()
+        entries.append((hashlib.md5(data).hexdigest(), hashlib.sha256(data).hexdigest(),
+                        len(data), path.relative_to(suite_dir).as_posix()))
+    width = max([len(str(size)) for _, _, size, _ in entries] + [1])
+    lines = [
+        'Origin: disconnected-resources',
+        'Label: disconnected-resources',
+        f"Suite: {suite}",
+        f"Codename: {suite}",
+        f"Architectures: {' '.join(architectures)}",
+        f"Components: {COMPONENT}",
+        'Description: Packages collected for a disconnected environment',
+        'MD5Sum:',
+    ]
+    lines += [f" {md5} {size:>{width}} {name}" for md5, _, size, name in entries]
+    lines.append('SHA256:')
+    lines += [f" {sha256} {size:>{width}} {name}" for _, sha256, size, name in entries]
+    return '\n'.join(lines) + '\n'
+
+
+def sign_release(debian_dir, suite_dir, key):
+    """Sign Release with key (InRelease, Release.gpg) and export the public key."""
+    if shutil.which('gpg') is None:
+        raise RuntimeError("gpg is required to sign the repository")
+    release = suite_dir / 'Release'
+    commands = [
+        ['gpg', '--batch', '--yes', '--local-user', key, '--clearsign',
+         '--output', str(suite_dir / 'InRelease'), str(release)],
+        ['gpg', '--batch', '--yes', '--local-user', key, '--armor', '--detach-sign',
+         '--output', str(suite_dir / 'Release.gpg'), str(release)],
+        ['gpg', '--batch', '--yes', '--output', str(debian_dir / 'archive-keyring.gpg'),
+         '--export', key],
+    ]
+    for command in commands:
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{' '.join(command[:5])} failed: {result.stderr.strip()}")
+
+
+def build_repository(debian_dir, suite=None, architectures=None, sign_key=None,
+                     workers=DEFAULT_WORKERS):
+    """Build or update dists/ for the .debs under debian_dir/pool.
+
+    Returns (packages, indexes rewritten, Release rewritten).
+    """
+    debian_dir = Path(debian_dir)
+    pool_dir = debian_dir / 'pool'
+    dists_dir = debian_dir / 'dists'
+    dists_dir.mkdir(parents=True, exist_ok=True)
+    state_path = dists_dir / STATE_FILE
+
+    codename, resolved_architectures, captured = read_resolutions(debian_dir)
+    suite = suite or codename
+    if not suite:
+        raise ValueError("No suite given and no codename in resolutions/")
+
+    previous = {}
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            previous = state['files']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Known files and stanzas captured at download time are not read again
+    current = {}
+    stale = []
+    for path in sorted(pool_dir.rglob('*.deb')):
+        if not path.is_file():
+            continue
+        filename = path.relative_to(debian_dir).as_posix()
+        stat = path.stat()
+        known = previous.get(filename)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            current[filename] = known
+        elif filename in captured and captured[filename][0] == stat.st_size:
+            current[filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                 'stanza': with_filename(captured[filename][1], filename)}
+        else:
+            stale.append((filename, path, stat))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (filename, path, stat), stanza in zip(stale, executor.map(
+                lambda item: describe_deb(item[1]), stale)):
+            if stanza is None:
+                print(f"  Warning: Skipping {filename}: cannot read its control file")
+                continue
+            current[filename] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                                 'stanza': with_filename(stanza, filename)}
+
+    by_architecture = {}
+    for filename, info in current.items():
+        fields = stanza_fields(info['stanza'])
+        by_architecture.setdefault(fields.get('Architecture', 'all'), []).append(
+            (fields.get('Package', ''), fields.get('Version', ''), filename))
+    architectures = sorted(set(architectures or resolved_architectures or
+                               [arch for arch in by_architecture if arch != 'all']))
+
+    suite_dir = dists_dir / suite
+    component_dir = suite_dir / COMPONENT
+    rewritten = 0
+    for arch in architectures:
+        entries = sorted(by_architecture.get(arch, []) + by_architecture.get('all', []))
+        content = '\n'.join(current[filename]['stanza'] for _, _, filename in entries)
+        if write_index(component_dir / f"binary-{arch}", content):
+            rewritten += 1
+    if component_dir.is_dir():
+        for path in component_dir.iterdir():
+            if path.name.startswith('binary-') and path.name[len('binary-'):] not in architectures:
+                shutil.rmtree(path)
+                rewritten += 1
+    for path in dists_dir.iterdir():
+        if path.is_dir() and path.name != suite:
+            shutil.rmtree(path)
+
+    # Release only gets a new Date (and signature) when an index changed
+    body = release_body(suite_dir, suite, architectures)
+    release = suite_dir / 'Release'
+    try:
+        existing = ''.join(line for line in release.read_text().splitlines(keepends=True)
+                           if not line.startswith('Date:'))
+    except OSError:
+        existing = None
+    release_changed = existing != body
+    if release_changed:
+        date = time.strftime('%a, %d %b %Y %H:%M:%S UTC', time.gmtime())
+        lines = body.split('\n')
+        lines.insert(4, f"Date: {date}")
+        write_if_changed(release, '\n'.join(lines))
+    if sign_key:
+        if release_changed or not all((suite_dir / name).exists() for name in SIGNATURE_FILES):
+            sign_release(debian_dir, suite_dir, sign_key)
+    else:
+        # A signature of an older Release would only make apt reject the repository
+        for name in SIGNATURE_FILES:
+            (suite_dir / name).unlink(missing_ok=True)
+        (debian_dir / 'archive-keyring.gpg').unlink(missing_ok=True)
+
+    tmp = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': STATE_VERSION, 'files': current}, f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+
+    return len(current), rewritten, release_changed
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Build APT repository indexes for a debian directory')
+    parser.add_argument('debian_dir', help='debian output directory holding pool/')
+    parser.add_argument('--suite', help='Suite name under dists/ (default: the codename in resolutions/)')
+    parser.add_argument('--architectures', nargs='+',
+                        help='Architectures to index (default: those in resolutions/)')
+    parser.add_argument('--sign-key', help='GPG key to sign Release with (default: unsigned)')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Files read at once (default: {DEFAULT_WORKERS})')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.debian_dir, 'pool')):
+        print(f"Error: {args.debian_dir} has no pool/ directory", file=sys.stderr)
+        sys.exit(1)
+    try:
+        packages, rewritten, release_changed = build_repository(
+            args.debian_dir, args.suite, args.architectures, args.sign_key, args.workers)
+    except (ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"Indexed {packages} packages ({rewritten} indexes updated, "
+          f"Release {'updated' if release_changed else 'unchanged'})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,358 @@
+"""
+Content-addressed artifact cache shared by the collectors.
+
+Artifacts are stored once per sha256 under objects/ and looked up by a
+(source, name, version, platform) key. One key may map to several files,
+e.g. a pip download of a package together with its dependencies. The
+index lives in a SQLite database so collectors running concurrently can
+share the cache safely. Least recently used entries are evicted when the
+cache grows past its size cap.
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+DEFAULT_CACHE_DIR = '~/.cache/disconnected-resources'
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+SIZE_UNITS = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+
+DURATION_UNITS = {'': 1, 's': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (source, name, version, platform)
+);
+CREATE TABLE IF NOT EXISTS members (
+    source TEXT NOT NULL,
+    name TEXT NOT NULL,
+    version TEXT NOT NULL,
+    platform TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    PRIMARY KEY (source, name, version, platform, filename)
+);
+CREATE TABLE IF NOT EXISTS objects (
+    sha256 TEXT PRIMARY KEY,
+    size INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS members_sha256 ON members (sha256);
+"""
+
+
+def parse_size(value):
+    """Parse a size such as '8G', '500M' or 1024 into bytes (0 means unlimited)."""
+    if value is None:
+        return 0
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([KMGT]?)B?\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid size: {value!r}")
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).upper()])
+
+
+def parse_duration(value):
+    """Parse a duration such as '24h', '7d', '30m' or 3600 into seconds (0 means never)."""
+    if isinstance(value, int):
+        return value
+    match = re.fullmatch(r'\s*(\d+(?:\.\d+)?)\s*([smhd]?)\s*', str(value), re.IGNORECASE)
+    if not match:
+        raise ValueError(f"Invalid duration: {value!r}")
+    return int(float(match.group(1)) * DURATION_UNITS[match.group(2).lower()])
+
+
+def format_size(size):
+    """Format a byte count for humans."""
+    for unit in ['B', 'K', 'M', 'G']:
+        if size < 1024:
+            return f"{size:.1f}{unit}" if unit != 'B' else f"{size}B"
+        size /= 1024
+    return f"{size:.1f}T"
+
+
+def sha256_file(path):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(HASH_BUFFER_SIZE)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def link_or_copy(src, dest):
+    """Hardlink src to dest, copying when linking is not possible."""
+    tmp = f"{dest}.tmp-{os.getpid()}"
+    try:
+        os.link(src, tmp)
+    except OSError:
+        shutil.copyfile(src, tmp)
+    os.replace(tmp, dest)
+
+
+def write_if_changed(path, content):
+    """Write content to path unless it already holds exactly that."""
+    try:
+        if path.read_text() == content:
+            return
+    except OSError:
+        pass
+    tmp = path.with_name(path.name + '.tmp')
+    tmp.write_text(content)
+    os.replace(tmp, path)
+
+
+class ArtifactStore:
+    """Content-addressed artifact store with an LRU size cap."""
+
+    def __init__(self, root=None, max_size=0):
+        self.root = Path(os.path.expanduser(root or DEFAULT_CACHE_DIR))
+        self.objects_dir = self.root / 'objects'
+        self.max_size = max_size
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.root / 'index.db', timeout=60)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def object_path(self, sha256):
+        return self.objects_dir / sha256[:2] / sha256
+
+    def lookup(self, source, name, version, platform=''):
+        """Return [(filename, object_path)] for a key, or None on a miss."""
+        rows = self.db.execute(
+            "SELECT m.filename, m.sha256, o.size FROM members m "
+            "JOIN entries e USING (source, name, version, platform) "
+            "JOIN objects o USING (sha256) "
+            "WHERE source = ? AND name = ? AND version = ? AND platform = ?",
+            (source, name, version, platform)).fetchall()
+        if not rows:
+            return None
+
+        members = []
+        for filename, sha256, size in rows:
+            path = self.object_path(sha256)
+            try:
+                if path.stat().st_size != size:
+                    return None
+            except FileNotFoundError:
+                return None
+            members.append((filename, path))
+
+        with self.db:
+            self.db.execute(
+                "UPDATE entries SET last_used = ? "
+                "WHERE source = ? AND name = ? AND version = ? AND platform = ?",
+                (time.time(), source, name, version, platform))
+        return members
+
+    def fetch(self, source, name, version, platform, dest_dir):
+        """Materialize a cached entry into dest_dir; return filenames or None."""
+        members = self.lookup(source, name, version, platform)
+        if members is None:
+            return None
+
+        dest_dir = Path(dest_dir)
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        for filename, path in members:
+            link_or_copy(path, dest_dir / filename)
+        return [filename for filename, _ in members]
+
+    def store(self, source, name, version, platform, files):
+        """Add files to the cache under a key, replacing any previous entry."""
+        members = []
+        for file_path in files:
+            file_path = Path(file_path)
+            sha256 = sha256_file(file_path)
+            size = file_path.stat().st_size
+            target = self.object_path(sha256)
+            if not target.exists():
+                target.parent.mkdir(exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=target.parent, prefix='.incoming-')
+                os.close(fd)
+                shutil.copyfile(file_path, tmp)
+                os.chmod(tmp, 0o444)
+                os.replace(tmp, target)
+            members.append((file_path.name, sha256, size))
+
+        now = time.time()
+        key = (source, name, version, platform)
+        with self.db:
+            self.db.execute(
+                "DELETE FROM members WHERE source = ? AND name = ? AND version = ? AND platform = ?",
+                key)
+            self.db.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                key + (now, now))
+            for filename, sha256, size in members:
+                self.db.execute("INSERT OR IGNORE INTO objects VALUES (?, ?)", (sha256, size))
+                self.db.execute("INSERT INTO members VALUES (?, ?, ?, ?, ?, ?)",
+                                key + (filename, sha256))
+
+        if self.max_size:
+            self.prune()
+        return [filename for filename, _, _ in members]
+
+    def total_size(self):
+        return self.db.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+
+    def stats(self):
+        """Return a summary of cache usage."""
+        per_source = self.db.execute(
+            "SELECT e.source, COUNT(DISTINCT e.name || '|' || e.version || '|' || e.platform), "
+            "COUNT(m.filename) FROM entries e LEFT JOIN members m "
+            "USING (source, name, version, platform) GROUP BY e.source ORDER BY e.source"
+        ).fetchall()
+        return {
+            'root': str(self.root),
+            'objects': self.db.execute("SELECT COUNT(*) FROM objects").fetchone()[0],
+            'entries': self.db.execute("SELECT COUNT(*) FROM entries").fetchone()[0],
+            'total_size': self.total_size(),
+            'max_size': self.max_size,
+            'sources': {source: {'entries': entries, 'files': files}
+                        for source, entries, files in per_source},
+        }
+
+    def prune(self, max_size=None):
+        """Evict least recently used entries until the cache fits max_size.
+
+        Returns (entries_removed, bytes_freed).
+        """
+        max_size = self.max_size if max_size is None else max_size
+        removed = 0
+        freed = self._remove_orphans()
+
+        if max_size:
+            entries = self.db.execute(
+                "SELECT source, name, version, platform FROM entries ORDER BY last_used"
+            ).fetchall()
+            for key in entries:
+                if self.total_size() <= max_size:
+                    break
+                with self.db:
+                    self.db.execute(
+                        "DELETE FROM members WHERE source = ? AND name = ? AND version = ? "
+                        "AND platform = ?", key)
+                    self.db.execute(
+                        "DELETE FROM entries WHERE source = ? AND name = ? AND version = ? "
+                        "AND platform = ?", key)
+                removed += 1
+                freed += self._remove_orphans()
+
+        return removed, freed
+
+    def _remove_orphans(self):
+        """Delete objects no longer referenced by any entry; return bytes freed."""
+        orphans = self.db.execute(
+            "SELECT sha256, size FROM objects "
+            "WHERE sha256 NOT IN (SELECT sha256 FROM members)").fetchall()
+        freed = 0
+        with self.db:
+            for sha256, size in orphans:
+                try:
+                    self.object_path(sha256).unlink()
+                except FileNotFoundError:
+                    pass
+                self.db.execute("DELETE FROM objects WHERE sha256 = ?", (sha256,))
+                freed += size
+        return freed
+
+
+def store_from_config(config, cache_dir=None, max_size=None):
+    """Open the artifact store described by the 'cache' config section."""
+    cache_config = (config or {}).get('cache', {}) or {}
+    root = (cache_dir
+            or os.environ.get('RESOURCES_CACHE_DIR')
+            or cache_config.get('dir')
+            or DEFAULT_CACHE_DIR)
+    if max_size is None:
+        max_size = cache_config.get('max_size', 0)
+    return ArtifactStore(root, parse_size(max_size))
+
+
+def cmd_cache(argv, load_config=None):
+    """Entry point for the 'cache' subcommand of parse_config.py."""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog='parse_config.py cache',
+                                     description='Manage the shared artifact cache')
+    parser.add_argument('--config', help='Configuration file (YAML or JSON) with a cache section')
+    parser.add_argument('--cache-dir', help=f'Cache directory (default: {DEFAULT_CACHE_DIR})')
+    parser.add_argument('--max-size', help="Size cap such as '8G' (default: cache.max_size)")
+    subparsers = parser.add_subparsers(dest='action', required=True)
+
+    subparsers.add_parser('stats', help='Show cache usage')
+    prune = subparsers.add_parser('prune',
+                                  help='Evict least recently used entries down to the size cap')
+    prune.add_argument('--max-size', dest='prune_max_size',
+                       help='Size cap for this prune (overrides the configured cap)')
+
+    for action in ['get', 'put']:
+        sub = subparsers.add_parser(action, help=f'{action.capitalize()} artifacts for a key')
+        sub.add_argument('--source', required=True)
+        sub.add_argument('--name', required=True)
+        sub.add_argument('--version', required=True)
+        sub.add_argument('--platform', default='')
+        if action == 'get':
+            sub.add_argument('--dest', required=True, help='Directory to place cached files in')
+        else:
+            sub.add_argument('files', nargs='+', help='Files to store under the key')
+
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config) if args.config and load_config else {}
+    try:
+        max_size = getattr(args, 'prune_max_size', None) or args.max_size
+        max_size = parse_size(max_size) if max_size is not None else None
+        store = store_from_config(config, args.cache_dir, max_size)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    try:
+        if args.action == 'stats':
+            stats = store.stats()
+            print(f"Cache directory: {stats['root']}")
+            print(f"Entries: {stats['entries']}")
+            print(f"Objects: {stats['objects']}")
+            cap = format_size(stats['max_size']) if stats['max_size'] else 'unlimited'
+            print(f"Size: {format_size(stats['total_size'])} (cap: {cap})")
+            for source, counts in stats['sources'].items():
+                print(f"  {source}: {counts['entries']} entries, {counts['files']} files")
+        elif args.action == 'prune':
+            removed, freed = store.prune()
+            print(f"Removed {removed} entries, freed {format_size(freed)}")
+            print(f"Cache size: {format_size(store.total_size())}")
+        elif args.action == 'get':
+            filenames = store.fetch(args.source, args.name, args.version, args.platform, args.dest)
+            if filenames is None:
+                sys.exit(1)
+            for filename in filenames:
+                print(filename)
+        elif args.action == 'put':
+            missing = [f for f in args.files if not os.path.isfile(f)]
+            if missing:
+                print(f"Error: Not a file: {', '.join(missing)}", file=sys.stderr)
+                sys.exit(1)
+            store.store(args.source, args.name, args.version, args.platform, args.files)
+    finally:
+        store.close()
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Bundle manifests and incremental delta bundles.
+
+A manifest lists every file in bundle-staging/ with its size, sha256,
+source ecosystem and, where the filename tells, package name and version,
+and every symlink with its target. npm tarballs are named by their hash, so
+their package and version come from the collector's npm/packages/*.json.
+Files are hashed while they are copied into the staging tree, on a bounded
+thread pool with fixed-size buffers, so no second pass over the bundle is
+needed. Instead of copying, staging can hardlink (or reflink) the collected
+files, or only reference them in place through a file list that the bundler
+reads when it writes the tar.
+Comparing the manifest of the last delivered bundle with the current tree
+gives a delta bundle holding only new or changed files, plus a
+DELTA_MANIFEST.json describing which files to keep, add or drop and which
+symlinks to create.
+
+This script only uses the standard library. It is copied into every delta
+bundle as apply_delta.py so the full tree can be rebuilt offline:
+
+    python3 apply_delta.py apply --base bundle-staging --delta bundle-delta
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import unquote
+
+
+MANIFEST_NAME = 'MANIFEST.json'
+DELTA_MANIFEST_NAME = 'DELTA_MANIFEST.json'
+APPLY_SCRIPT_NAME = 'apply_delta.py'
+MANIFEST_FORMAT = 1
+
+# Files describing the bundle itself are never listed in a manifest
+EXCLUDED_FILES = {MANIFEST_NAME, DELTA_MANIFEST_NAME, APPLY_SCRIPT_NAME}
+
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# copy: write a copy of every file; link: hardlink or reflink, copying only
+# across filesystems; reference: leave files in place and list them instead
+STAGING_MODES = ['copy', 'link', 'reference']
+
+# ioctl that clones a file's extents on btrfs, XFS and other CoW filesystems
+FICLONE = 0x40049409
+
+DEFAULT_WORKERS = min(16, (os.cpu_count() or 1) + 4)
+
+ECOSYSTEMS = ['npm', 'pypi', 'debian', 'rpm', 'containers', 'vscode']
+
+# Filename patterns used to recover package name and version per ecosystem
+WHEEL_RE = re.compile(r'^(?P<name>[^-]+)-(?P<version>[^-]+)(-\d[^-]*)?-[^-]+-[^-]+-[^-]+\.whl$')
+SDIST_RE = re.compile(r'^(?P<name>.+)-(?P<version>\d[^-]*)\.(tar\.gz|tar\.bz2|zip)$')
+NPM_RE = re.compile(r'^(?P<name>.+?)-(?P<version>\d+\.\d+\.\d+[^/]*)\.tgz$')
+DEB_RE = re.compile(r'^(?P<name>[^_]+)_(?P<version>[^_]+)_[^_]+\.deb$')
+RPM_RE = re.compile(r'^(?P<name>.+)-(?P<version>[^-]+-[^-]+)\.[^.]+\.rpm$')
+VSIX_RE = re.compile(r'^(?P<name>[^.]+\.[^@]+?)(?:[-@](?P<version>\d[^/]*))?\.vsix$')
+IMAGE_RE = re.compile(r'^(?P<name>.+)_(?P<version>[^_]+)\.tar(\.gz)?$')
+
+# collect_npm.py stores tarballs by integrity (npm/tarballs/sha512-<hex>.tgz)
+# and lists name and version for each in npm/packages/<name>.json
+NPM_PACKAGES_RE = re.compile(r'^npm/packages/.+\.json$')
+
+FILENAME_PATTERNS = {
+    'npm': [NPM_RE],
+    'pypi': [WHEEL_RE, SDIST_RE],
+    'debian': [DEB_RE],
+    'rpm': [RPM_RE],
+    'vscode': [VSIX_RE],
+    'containers': [IMAGE_RE],
+}
+
+_buffers = threading.local()
+
+
+def _buffer():
+    """Return this thread's reusable read buffer."""
+    buf = getattr(_buffers, 'buf', None)
+    if buf is None:
+        buf = _buffers.buf = memoryview(bytearray(HASH_BUFFER_SIZE))
+    return buf
+
+
+def hash_file(path):
+    """Return the sha256 hex digest of a file."""
+    digest = hashlib.sha256()
+    buf = _buffer()
+    with open(path, 'rb') as f:
+        while True:
+            n = f.readinto(buf)
+            if not n:
+                break
+            digest.update(buf[:n])
+    return digest.hexdigest()
+
+
+def copy_and_hash(src, dest):
+    """Copy src to dest and return the sha256 of the bytes copied."""
+    digest = hashlib.sha256()
+    buf = _buffer()
+    with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+        while True:
+            n = fin.readinto(buf)
+            if not n:
+                break
+            digest.update(buf[:n])
+            fout.write(buf[:n])
+    shutil.copymode(src, dest)
+    return digest.hexdigest()
+
+
+def reflink(src, dest):
+    """Clone src to dest without copying data; raises OSError when unsupported."""
+    import fcntl
+    with open(src, 'rb') as fin, open(dest, 'wb') as fout:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+    shutil.copymode(src, dest)
+
+
+def link_and_hash(src, dest):
+    """Hardlink or reflink src to dest and return its sha256.
+
+    Falls back to copying when neither is possible, e.g. across filesystems.
+    """
+    try:
+        os.link(src, dest)
+    except OSError:
+        try:
+            reflink(src, dest)
+        except (OSError, ImportError):
+            dest.unlink(missing_ok=True)
+            return copy_and_hash(src, dest)
+    return hash_file(dest)
+
+
+def identify(rel_path, store_names=None):
+    """Return (ecosystem, package, version) for a path inside the bundle.
+
+    store_names maps paths whose file name does not carry the package, such
+    as npm's content-addressed tarballs, to (package, version).
+    """
+    parts = rel_path.split('/')
+    ecosystem = parts[0] if len(parts) > 1 and parts[0] in ECOSYSTEMS else None
+    if store_names and rel_path in store_names:
+        return (ecosystem, *store_names[rel_path])
+    for pattern in FILENAME_PATTERNS.get(ecosystem, []):
+        match = pattern.match(parts[-1])
+        if match:
+            version = match.group('version')
+            return ecosystem, match.group('name'), unquote(version) if version else None
+    return ecosystem, None, None
+
+
+def read_store_names(files):
+    """Return {bundle path: (package, version)} from the npm package lists among files.
+
+    files yields (bundle path, path on disk) pairs; unreadable lists are skipped.
+    """
+    names = {}
+    for rel, path in files:
+        if not NPM_PACKAGES_RE.match(rel):
+            continue
+        try:
+            with open(path, 'r') as f:
+                tarballs = json.load(f).get('tarballs') or []
+        except (OSError, ValueError, AttributeError):
+            continue
+        for tarball in tarballs:
+            if isinstance(tarball, dict) and tarball.get('path'):
+                names[f"npm/{tarball['path']}"] = (tarball.get('name'), tarball.get('version'))
+    return names
+
+
+def file_entry(rel, size, sha256, store_names=None):
+    """Build a manifest entry for a file."""
+    ecosystem, package, version = identify(rel, store_names)
+    return {
+        'path': rel,
+        'size': size,
+        'sha256': sha256,
+        'ecosystem': ecosystem,
+        'package': package,
+        'version': version,
+    }
+
+
+def walk_files(root, references=None):
+    """Yield (relative_path, absolute_path) for every regular file under root.
+
+    Files referenced in place (see read_file_list) are included as well.
+    """
+    root = Path(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            path = Path(dirpath) / filename
+            rel = path.relative_to(root).as_posix()
+            if rel in EXCLUDED_FILES or not path.is_file() or path.is_symlink():
+                continue
+            yield rel, path
+    for rel in sorted(references or {}):
+        yield rel, references[rel]
+
+
+def walk_links(root):
+    """Yield (relative_path, target) for every symlink under root, without following them."""
+    root = Path(root)
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for entry in sorted(dirnames + filenames):
+            path = Path(dirpath) / entry
+            if path.is_symlink():
+                yield path.relative_to(root).as_posix(), os.readlink(path)
+
+
+def read_file_list(path):
+    """Load a file list written by 'stage --mode reference': {bundle path: source path}."""
+    with open(path, 'r') as f:
+        return {rel: Path(src) for rel, src in json.load(f)['files'].items()}
+
+
+def write_file_list(references, path):
+    """Write the files referenced in place by a staging tree."""
+    with open(path, 'w') as f:
+        json.dump({'files': {rel: str(src) for rel, src in sorted(references.items())}},
+                  f, indent=2)
+        f.write('\n')
+
+
+def build_manifest(root, bundle_name=None, reuse=None, workers=DEFAULT_WORKERS,
+                   references=None):
+    """Build a manifest of every file under root, hashing in parallel.
+
+    Entries from a previous manifest of the same tree (reuse) are kept when
+    the file size still matches, so only new files are read.
+    """
+    known = {entry['path']: entry for entry in (reuse or {}).get('files', [])}
+    found = list(walk_files(root, references))
+    store_names = read_store_names(found)
+    files = []
+    pending = []
+    for rel, path in found:
+        size = path.stat().st_size
+        entry = known.get(rel)
+        if entry is not None and entry['size'] == size:
+            files.append(file_entry(rel, size, entry['sha256'], store_names))
+        else:
+            pending.append((rel, path, size))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        hashes = executor.map(lambda item: hash_file(item[1]), pending)
+        for (rel, _, size), sha256 in zip(pending, hashes):
+            files.append(file_entry(rel, size, sha256, store_names))
+    return new_manifest(files, bundle_name, dict(walk_links(root)))
+
+
+def stage_tree(sources, staging_dir, workers=DEFAULT_WORKERS, mode='copy'):
+    """Stage source directories into the staging tree, hashing every file once.
+
+    sources is a list of (name, directory) pairs; each directory is staged as
+    staging_dir/name, merging into anything already there like cp -r does.
+    Directories and symlinks are always created in the staging tree; regular
+    files are copied, linked or only referenced depending on mode.
+    Returns (manifest entries, {bundle path: symlink target},
+    {bundle path: source path} for referenced files).
+    """
+    if mode not in STAGING_MODES:
+        raise ValueError(f"Unknown staging mode: {mode}")
+    staging_dir = Path(staging_dir)
+    jobs = []
+    links = {}
+    references = {}
+    for name, source_dir in sources:
+        source_dir = Path(source_dir)
+        for dirpath, dirnames, filenames in os.walk(source_dir):
+            rel_dir = Path(dirpath).relative_to(source_dir)
+            dest_dir = staging_dir / name / rel_dir
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            for entry in dirnames + filenames:
+                src = Path(dirpath) / entry
+                dest = dest_dir / entry
+                if src.is_symlink():
+                    # Keep relative links such as pypi/simple/ as links
+                    if dest.is_symlink() or dest.exists():
+                        dest.unlink()
+                    os.symlink(os.readlink(src), dest)
+                    links[(Path(name) / rel_dir / entry).as_posix()] = os.readlink(src)
+                elif entry in filenames and src.is_file():
+                    jobs.append((src, dest, (Path(name) / rel_dir / entry).as_posix()))
+    store_names = read_store_names((rel, src) for src, _, rel in jobs)
+
+    def stage_one(job):
+        src, dest, rel = job
+        if dest.is_symlink() or dest.exists():
+            dest.unlink()
+        if mode == 'reference':
+            references[rel] = src.resolve()
+            sha256 = hash_file(src)
+        elif mode == 'link':
+            sha256 = link_and_hash(src, dest)
+        else:
+            sha256 = copy_and_hash(src, dest)
+        return file_entry(rel, src.stat().st_size, sha256, store_names)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        files = list(executor.map(stage_one, jobs))
+    return files, links, references
+
+
+def new_manifest(files, bundle_name=None, links=None):
+    """Wrap a list of file entries and {path: symlink target} in the manifest envelope."""
+    return {
+        'format': MANIFEST_FORMAT,
+        'bundle': bundle_name,
+        'created': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'algorithm': 'sha256',
+        'files': sorted(files, key=lambda entry: entry['path']),
+        'links': [{'path': path, 'target': target} for path, target in sorted((links or {}).items())],
+    }
+
+
+def read_manifest(path):
+    """Load a manifest from disk."""
+    with open(path, 'r') as f:
+        manifest = json.load(f)
+    if manifest.get('format') != MANIFEST_FORMAT:
+        raise ValueError(f"Unsupported manifest format in {path}: {manifest.get('format')!r}")
+    return manifest
+
+
+def write_manifest(manifest, path):
+    """Write a manifest to disk."""
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+        f.write('\n')
+
+
+def manifest_entries(manifest):
+    """Return {path: what must match} for the files and symlinks of a manifest.
+
+    Manifests written before symlinks were recorded have no 'links'.
+    """
+    entries = {entry['path']: (entry['sha256'], entry['size']) for entry in manifest['files']}
+    entries.update((link['path'], ('link', link['target'])) for link in manifest.get('links', []))
+    return entries
+
+
+def diff_manifests(base, current):
+    """Compare two manifests by path and content hash, or symlink target.
+
+    Returns a dict of sorted path lists: added, changed, removed, unchanged.
+    """
+    base_files = manifest_entries(base)
+    current_files = manifest_entries(current)
+
+    diff = {'added': [], 'changed': [], 'removed': [], 'unchanged': []}
+    for path, entry in current_files.items():
+        old = base_files.get(path)
+        if old is None:
+            diff['added'].append(path)
+        elif old != entry:
+            diff['changed'].append(path)
+        else:
+            diff['unchanged'].append(path)
+    diff['removed'] = [path for path in base_files if path not in current_files]
+
+    for paths in diff.values():
+        paths.sort()
+    return diff
+
+
+def create_delta(staging_dir, base_manifest, delta_dir, bundle_name=None, current=None,
+                 references=None):
+    """Populate delta_dir with the files that changed since base_manifest.
+
+    Returns the delta manifest that was written.
+    """
+    # Not needed by apply_delta.py, which only has the standard library
+    from artifact_cache import link_or_copy
+
+    staging_dir = Path(staging_dir)
+    delta_dir = Path(delta_dir)
+    references = references or {}
+    if current is None:
+        current = build_manifest(staging_dir, bundle_name, references=references)
+    diff = diff_manifests(base_manifest, current)
+
+    if delta_dir.exists():
+        shutil.rmtree(delta_dir)
+    delta_dir.mkdir(parents=True)
+
+    links = {link['path']: link['target'] for link in current.get('links', [])}
+    for path in diff['added'] + diff['changed']:
+        if path in links:
+            continue
+        (delta_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(references.get(path, staging_dir / path), delta_dir / path)
+
+    delta = {
+        'format': MANIFEST_FORMAT,
+        'bundle': bundle_name,
+        'base_bundle': base_manifest.get('bundle'),
+        'created': current['created'],
+        'keep': diff['unchanged'],
+        'add': diff['added'],
+        'replace': diff['changed'],
+        'drop': diff['removed'],
+        'links': {path: links[path] for path in diff['added'] + diff['changed'] if path in links},
+    }
+    write_manifest(delta, delta_dir / DELTA_MANIFEST_NAME)
+    write_manifest(current, delta_dir / MANIFEST_NAME)
+    shutil.copy2(Path(__file__).resolve(), delta_dir / APPLY_SCRIPT_NAME)
+    return delta
+
+
+def verify_tree(root, manifest, paths=None, check_hash=True):
+    """Check files under root against a manifest; return a list of problems."""
+    problems = []
+    entries = manifest['files']
+    if paths is not None:
+        wanted = set(paths)
+        entries = [entry for entry in entries if entry['path'] in wanted]
+
+    for entry in entries:
+        path = Path(root) / entry['path']
+        if not path.is_file():
+            problems.append(f"missing: {entry['path']}")
+        elif path.stat().st_size != entry['size']:
+            problems.append(f"size mismatch: {entry['path']}")
+        elif check_hash and hash_file(path) != entry['sha256']:
+            problems.append(f"checksum mismatch: {entry['path']}")
+    return problems
+
+
+def apply_delta(base_dir, delta_dir, verify=True):
+    """Rebuild the full tree in base_dir from the previous bundle plus a delta."""
+    base_dir = Path(base_dir)
+    delta_dir = Path(delta_dir)
+    delta = read_manifest(delta_dir / DELTA_MANIFEST_NAME)
+    target = read_manifest(delta_dir / MANIFEST_NAME)
+
+    # Refuse to touch a tree that does not hold the files the delta keeps.
+    # Sizes are enough to catch the wrong base; full hashes would mean
+    # reading the whole previous bundle again.
+    if verify:
+        problems = verify_tree(base_dir, target, delta['keep'], check_hash=False)
+        if problems:
+            raise RuntimeError("Base tree does not match the delta's base bundle:\n  "
+                               + "\n  ".join(problems))
+
+    for path in delta['drop']:
+        (base_dir / path).unlink(missing_ok=True)
+
+    # Remove only the directories dropped files (or links) left empty
+    for parent in sorted({(base_dir / path).parent for path in delta['drop']},
+                         key=lambda path: len(path.parts), reverse=True):
+        while parent != base_dir and parent.is_dir() and not any(parent.iterdir()):
+            parent.rmdir()
+            parent = parent.parent
+
+    links = delta.get('links', {})
+    for path in delta['add'] + delta['replace']:
+        dest = base_dir / path
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(dest.name + '.delta-tmp')
+        if path in links:
+            tmp.unlink(missing_ok=True)
+            os.symlink(links[path], tmp)
+        else:
+            shutil.copy2(delta_dir / path, tmp)
+        os.replace(tmp, dest)
+
+    if verify:
+        problems = verify_tree(base_dir, target, [path for path in delta['add'] + delta['replace']
+                                                  if path not in links])
+        if problems:
+            raise RuntimeError("Delta files failed verification:\n  " + "\n  ".join(problems))
+
+    write_manifest(target, base_dir / MANIFEST_NAME)
+    return delta
+
+
+def cmd_stage(args):
+    sources = []
+    for spec in args.source:
+        name, sep, directory = spec.partition('=')
+        if not sep or not name or not directory:
+            raise ValueError(f"Invalid --source {spec!r}, expected NAME=DIRECTORY")
+        sources.append((name, directory))
+
+    if args.mode == 'reference' and not args.file_list:
+        raise ValueError("--mode reference needs --file-list")
+
+    files, links, references = stage_tree(sources, args.staging_dir, args.workers, args.mode)
+    write_manifest(new_manifest(files, args.bundle_name, links),
+                   Path(args.staging_dir) / MANIFEST_NAME)
+    if args.file_list:
+        write_file_list(references, args.file_list)
+    total = sum(entry['size'] for entry in files)
+    print(f"Staged {len(files)} files and {len(links)} symlinks, {total} bytes ({args.mode})")
+
+
+def cmd_generate(args):
+    output = args.output or Path(args.directory) / MANIFEST_NAME
+    reuse = read_manifest(args.reuse) if args.reuse and os.path.exists(args.reuse) else None
+    references = read_file_list(args.file_list) if args.file_list else None
+    manifest = build_manifest(args.directory, args.bundle_name, reuse, args.workers, references)
+    write_manifest(manifest, output)
+    total = sum(entry['size'] for entry in manifest['files'])
+    print(f"Manifest: {len(manifest['files'])} files, {total} bytes")
+
+
+def cmd_diff(args):
+    diff = diff_manifests(read_manifest(args.base), read_manifest(args.current))
+    for key in ['added', 'changed', 'removed']:
+        for path in diff[key]:
+            print(f"{key[0].upper()} {path}")
+    print(f"{len(diff['added'])} added, {len(diff['changed'])} changed, "
+          f"{len(diff['removed'])} removed, {len(diff['unchanged'])} unchanged",
+          file=sys.stderr)
+
+
+def cmd_delta(args):
+    base = read_manifest(args.base_manifest)
+    current = read_manifest(args.manifest) if args.manifest else None
+    references = read_file_list(args.file_list) if args.file_list else None
+    delta = create_delta(args.staging_dir, base, args.output, args.bundle_name, current, references)
+    print(f"Delta against {delta['base_bundle'] or args.base_manifest}: "
+          f"{len(delta['add'])} added, {len(delta['replace'])} changed, "
+          f"{len(delta['drop'])} dropped, {len(delta['keep'])} kept")
+
+
+def cmd_apply(args):
+    delta = apply_delta(args.base, args.delta, verify=not args.no_verify)
+    print(f"Applied delta {delta['bundle'] or args.delta} onto {args.base}: "
+          f"{len(delta['add'])} added, {len(delta['replace'])} replaced, "
+          f"{len(delta['drop'])} dropped")
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Bundle manifests and delta bundles')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stage = subparsers.add_parser('stage', help='Stage directories into a staging tree and hash them')
+    stage.add_argument('--staging-dir', required=True)
+    stage.add_argument('--source', action='append', required=True, metavar='NAME=DIRECTORY',
+                       help='Stage DIRECTORY as <staging-dir>/NAME (may be repeated)')
+    stage.add_argument('--bundle-name')
+    stage.add_argument('--mode', choices=STAGING_MODES, default='copy',
+                       help='copy files, link them (copying only across filesystems) or '
+                            'reference them in place (default: copy)')
+    stage.add_argument('--file-list', help='Where to write the files referenced in place')
+    stage.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                       help=f'Files copied and hashed at once (default: {DEFAULT_WORKERS})')
+    stage.set_defaults(func=cmd_stage)
+
+    generate = subparsers.add_parser('generate', help='Write a manifest for a directory')
+    generate.add_argument('directory')
+    generate.add_argument('--output', '-o', help=f'Manifest path (default: <directory>/{MANIFEST_NAME})')
+    generate.add_argument('--bundle-name')
+    generate.add_argument('--reuse', help='Earlier manifest of the same tree; only files not in it are hashed')
+    generate.add_argument('--file-list', help='Files referenced in place by the tree (from stage)')
+    generate.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                          help=f'Files hashed at once (default: {DEFAULT_WORKERS})')
+    generate.set_defaults(func=cmd_generate)
+
+    diff = subparsers.add_parser('diff', help='Compare two manifests')
+    diff.add_argument('base')
+    diff.add_argument('current')
+    diff.set_defaults(func=cmd_diff)
+
+    delta = subparsers.add_parser('delta', help='Create a delta tree against a base manifest')
+    delta.add_argument('--staging-dir', required=True, help='Full bundle tree for this run')
+    delta.add_argument('--base-manifest', required=True, help='Manifest of the last delivered bundle')
+    delta.add_argument('--output', required=True, help='Directory to write the delta tree to')
+    delta.add_argument('--manifest', help='Manifest already generated for the staging tree')
+    delta.add_argument('--file-list', help='Files referenced in place by the staging tree')
+    delta.add_argument('--bundle-name')
+    delta.set_defaults(func=cmd_delta)
+
+    apply = subparsers.add_parser('apply', help='Rebuild the full tree from a base bundle and a delta')
+    apply.add_argument('--base', required=True, help='Extracted tree of the previous bundle (updated in place)')
+    apply.add_argument('--delta', required=True, help='Extracted delta tree')
+    apply.add_argument('--no-verify', action='store_true', help='Skip checksum verification')
+    apply.set_defaults(func=cmd_apply)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except (OSError, ValueError, RuntimeError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
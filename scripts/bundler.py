@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Streaming bundle writer for disconnected resources.
+
+Packs a directory into a tar stream that goes straight through the
+compressor and into the output file, or into split parts, in a single pass.
+No uncompressed tarball is written and the configured checksum is computed
+while the bytes are written, so peak disk usage is the compressed bundle
+only.
+
+Compression runs on all cores when a parallel tool is installed: zstd -T,
+pigz for gzip, xz -T and pbzip2/lbzip2 for bzip2. Their output is the
+standard format, so the bundle still extracts with plain tar on the
+disconnected side. Without those tools gzip, bzip2 and xz fall back to the
+single-threaded standard library codecs.
+
+Most of a bundle is already compressed (image tarballs, wheels, .tgz, .deb,
+.rpm, .vsix). The "mixed" layout writes text and metadata members first
+through the compressor and then stores the already-compressed members
+without compressing them again. The stream is a sequence of gzip members
+or zstd frames, which gzip, zstd and tar read as one stream, so the bundle
+still extracts with a single tar -xf.
+
+A file list from 'bundle_manifest.py stage --mode reference' adds files
+that were left in place instead of being copied into the staging tree.
+"""
+
+import argparse
+import bz2
+import gzip
+import hashlib
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import threading
+from pathlib import Path
+
+from artifact_cache import format_size, parse_size
+from bundle_manifest import read_file_list
+
+
+COMPRESSIONS = ['gzip', 'bzip2', 'xz', 'zstd', 'none']
+
+EXTENSIONS = {'gzip': '.gz', 'bzip2': '.bz2', 'xz': '.xz', 'zstd': '.zst', 'none': ''}
+
+# Valid and default levels, matching the command line tools
+COMPRESSION_LEVELS = {
+    'gzip': (1, 9, 6),
+    'bzip2': (1, 9, 9),
+    'xz': (0, 9, 6),
+    'zstd': (1, 22, 3),
+}
+
+# zstd window log used for --long when zstd_long is true; decompressing a
+# window above 27 needs --long=<n> on the disconnected side as well
+ZSTD_DEFAULT_LONG = 27
+ZSTD_LONG_RANGE = (10, 31)
+
+CHECKSUM_ALGORITHMS = ['sha256', 'sha512', 'md5']
+
+LAYOUTS = ['solid', 'mixed']
+
+# Compressions whose streams may be concatenated from differently compressed parts
+MIXED_LAYOUT_COMPRESSIONS = ['gzip', 'zstd']
+
+# Extensions of formats that are already compressed
+PRECOMPRESSED_EXTENSIONS = {
+    '.gz', '.tgz', '.bz2', '.tbz2', '.xz', '.txz', '.zst', '.zstd', '.lz4', '.lzma',
+    '.zip', '.whl', '.egg', '.jar', '.7z', '.deb', '.udeb', '.rpm', '.vsix', '.nupkg',
+    '.png', '.jpg', '.jpeg', '.gif', '.webp',
+}
+
+# Leading bytes of compressed formats, for files without a telling extension
+PRECOMPRESSED_MAGIC = [
+    b'\x1f\x8b',                # gzip
+    b'BZh',                     # bzip2
+    b'\xfd7zXZ\x00',            # xz
+    b'\x28\xb5\x2f\xfd',        # zstd
+    b'PK\x03\x04',              # zip, wheel, vsix
+    b'\xed\xab\xee\xdb',        # rpm
+    b'!<arch>\ndebian',          # deb
+]
+
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def split_suffix(index):
+    """Return the suffix GNU split -d gives the index-th part (00..89, 9000..9899, ...)."""
+    prefix = ''
+    width = 2
+    count = 90
+    while index >= count:
+        index -= count
+        prefix += '9'
+        width += 1
+        count *= 10
+    return f"{prefix}{index:0{width}d}"
+
+
+class SplitWriter:
+    """File-like sink that hashes everything written and optionally splits it.
+
+    Without a split size the stream is written to a single file. With one,
+    parts named <path>.part-00, <path>.part-01, ... are written directly,
+    each with its own digest, and the whole-stream digest matches the file
+    the parts reassemble into.
+    """
+
+    def __init__(self, path, split_size=0, algorithm='sha256'):
+        self.path = Path(path)
+        self.split_size = split_size
+        self.algorithm = algorithm
+        self.digest = hashlib.new(algorithm)
+        self.size = 0
+        self.parts = []
+        self._file = None
+        self._part_digest = None
+        self._part_size = 0
+        if not split_size:
+            self._file = open(self.path, 'wb', buffering=WRITE_BUFFER_SIZE)
+
+    def _next_part(self):
+        self._close_part()
+        part_path = self.path.with_name(f"{self.path.name}.part-{split_suffix(len(self.parts))}")
+        self._file = open(part_path, 'wb', buffering=WRITE_BUFFER_SIZE)
+        self._part_digest = hashlib.new(self.algorithm)
+        self._part_size = 0
+        self.parts.append([part_path, None, 0])
+
+    def _close_part(self):
+        if self.parts and self._file is not None:
+            self._file.close()
+            self.parts[-1][1] = self._part_digest.hexdigest()
+            self.parts[-1][2] = self._part_size
+            self._file = None
+
+    def write(self, data):
+        data = memoryview(data)
+        self.digest.update(data)
+        self.size += len(data)
+
+        if not self.split_size:
+            self._file.write(data)
+            return len(data)
+
+        offset = 0
+        while offset < len(data):
+            if self._file is None or self._part_size >= self.split_size:
+                self._next_part()
+            chunk = data[offset:offset + self.split_size - self._part_size]
+            self._file.write(chunk)
+            self._part_digest.update(chunk)
+            self._part_size += len(chunk)
+            offset += len(chunk)
+        return len(data)
+
+    def flush(self):
+        if self._file is not None:
+            self._file.flush()
+
+    def close(self):
+        if self.split_size:
+            self._close_part()
+        elif self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+class ProcessCompressor:
+    """File-like object that pipes data through an external compressor.
+
+    Compressed output is copied from the process into the sink on a
+    separate thread so the compressor never blocks on a full pipe.
+    """
+
+    def __init__(self, command, sink):
+        self.command = command
+        self.sink = sink
+        self.proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+        self._error = None
+        self._reader = threading.Thread(target=self._drain, daemon=True)
+        self._reader.start()
+
+    def _drain(self):
+        try:
+            while True:
+                chunk = self.proc.stdout.read(WRITE_BUFFER_SIZE)
+                if not chunk:
+                    break
+                self.sink.write(chunk)
+        except Exception as e:  # surfaced from close()
+            self._error = e
+
+    def write(self, data):
+        self.proc.stdin.write(data)
+        return len(data)
+
+    def flush(self):
+        self.proc.stdin.flush()
+
+    def close(self):
+        self.proc.stdin.close()
+        self._reader.join()
+        returncode = self.proc.wait()
+        if self._error is not None:
+            raise self._error
+        if returncode != 0:
+            raise RuntimeError(f"{self.command[0]} exited with status {returncode}")
+
+
+def resolve_threads(threads):
+    """Turn the configured thread count into a concrete one (0 means all cores)."""
+    if not threads:
+        return os.cpu_count() or 1
+    return threads
+
+
+def compressor_command(compression, level, threads, zstd_long=None):
+    """Return the parallel compressor command for a compression, or None."""
+    if compression == 'zstd' and shutil.which('zstd'):
+        command = ['zstd', '-q', '-c', f'-T{threads}', f'-{level}']
+        if level > 19:
+            command.insert(1, '--ultra')
+        if zstd_long:
+            command.append(f'--long={zstd_long}')
+        return command
+    if threads > 1:
+        if compression == 'gzip' and shutil.which('pigz'):
+            return ['pigz', '-c', '-p', str(threads), f'-{level}']
+        if compression == 'xz' and shutil.which('xz'):
+            return ['xz', '-c', f'-T{threads}', f'-{level}']
+        if compression == 'bzip2':
+            if shutil.which('pbzip2'):
+                return ['pbzip2', '-c', f'-p{threads}', f'-{level}']
+            if shutil.which('lbzip2'):
+                return ['lbzip2', '-c', f'-n{threads}', f'-{level}']
+    return None
+
+
+def open_compressor(sink, compression, level=None, threads=1, zstd_long=None):
+    """Wrap a sink in a compressing file object.
+
+    Uses a parallel command line compressor when one is available and falls
+    back to the standard library codecs otherwise.
+    """
+    if compression == 'none':
+        return sink
+    if compression not in COMPRESSION_LEVELS:
+        raise ValueError(f"Unknown compression: {compression}")
+
+    if level is None:
+        level = COMPRESSION_LEVELS[compression][2]
+    threads = resolve_threads(threads)
+    if zstd_long is True:
+        zstd_long = ZSTD_DEFAULT_LONG
+
+    command = compressor_command(compression, level, threads, zstd_long)
+    if command:
+        print(f"Compressor: {' '.join(command)}")
+        return ProcessCompressor(command, sink)
+
+    print(f"Compressor: Python {compression} (level {level}, single-threaded)")
+    if compression == 'gzip':
+        return gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=level)
+    if compression == 'bzip2':
+        return bz2.BZ2File(sink, mode='wb', compresslevel=level)
+    if compression == 'xz':
+        return lzma.LZMAFile(sink, mode='wb', preset=level)
+
+    # zstd without the command line tool needs the optional zstandard module
+    try:
+        import zstandard
+    except ImportError:
+        raise RuntimeError("zstd compression needs the zstd command or the zstandard "
+                           "Python module") from None
+    params = zstandard.ZstdCompressionParameters.from_level(
+        level, threads=threads, enable_ldm=bool(zstd_long),
+        window_log=zstd_long or 0)
+    return zstandard.ZstdCompressor(compression_params=params).stream_writer(
+        sink, closefd=False)
+
+
+def is_precompressed(path):
+    """Return True if a file is already compressed and not worth compressing again."""
+    path = Path(path)
+    if path.suffix.lower() in PRECOMPRESSED_EXTENSIONS:
+        return True
+    try:
+        with open(path, 'rb') as f:
+            head = f.read(16)
+    except OSError:
+        return False
+    return any(head.startswith(magic) for magic in PRECOMPRESSED_MAGIC)
+
+
+class SegmentedStream:
+    """Tar sink whose compression can change between tar members.
+
+    Each segment becomes its own gzip member or zstd frame in the sink.
+    tarfile is used in seekless 'w' mode, which writes every member straight
+    through, so switching segments between members is safe.
+    """
+
+    def __init__(self, open_segment):
+        self.open_segment = open_segment
+        self.segment = None
+        self.stream = None
+        self.position = 0
+        self.sizes = {}
+
+    def select(self, segment):
+        if segment == self.segment:
+            return
+        self._close_stream()
+        self.segment = segment
+        self.stream = self.open_segment(segment)
+
+    def write(self, data):
+        self.stream.write(data)
+        self.position += len(data)
+        self.sizes[self.segment] = self.sizes.get(self.segment, 0) + len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def _close_stream(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+
+    def close(self):
+        self._close_stream()
+
+
+class _Unclosable:
+    """Pass-through wrapper so closing a segment does not close the sink."""
+
+    def __init__(self, sink):
+        self.sink = sink
+
+    def write(self, data):
+        return self.sink.write(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def open_stored_segment(sink, compression, threads):
+    """Open a segment that wraps data in the container format without compressing it."""
+    if compression == 'gzip':
+        # Level 0 emits stored deflate blocks: only framing and a CRC are added
+        return gzip.GzipFile(fileobj=_Unclosable(sink), mode='wb', compresslevel=0)
+    # zstd at its fastest level detects incompressible blocks and stores them raw
+    return open_compressor(_Unclosable(sink), 'zstd', 1, threads)
+
+
+def add_references(tar, references, arcname):
+    """Add files referenced in place under their bundle paths."""
+    for rel in sorted(references):
+        tar.add(references[rel], arcname=f"{arcname}/{rel}", recursive=False)
+
+
+def add_mixed(tar, stream, directory, arcname, references=None):
+    """Add a tree with compressible members first, then already-compressed ones."""
+    directory = Path(directory)
+    compressible = []
+    stored = []
+    for dirpath, dirnames, filenames in os.walk(directory):
+        dirnames.sort()
+        rel_dir = Path(dirpath).relative_to(directory)
+        compressible.append((Path(dirpath), Path(arcname) / rel_dir))
+        for entry in sorted(filenames) + [d for d in dirnames if (Path(dirpath) / d).is_symlink()]:
+            path = Path(dirpath) / entry
+            member = (path, Path(arcname) / rel_dir / entry)
+            if path.is_file() and not path.is_symlink() and is_precompressed(path):
+                stored.append(member)
+            else:
+                compressible.append(member)
+    for rel in sorted(references or {}):
+        member = (references[rel], Path(arcname) / rel)
+        (stored if is_precompressed(references[rel]) else compressible).append(member)
+
+    stream.select('compress')
+    for path, name in compressible:
+        tar.add(path, arcname=name.as_posix(), recursive=False)
+    stream.select('store')
+    for path, name in stored:
+        tar.add(path, arcname=name.as_posix(), recursive=False)
+    # The end-of-archive blocks are tiny; keep them in a compressed segment
+    stream.select('compress-end')
+
+
+def write_checksum_file(path, entries):
+    """Write '<digest>  <name>' lines in the format sha256sum -c expects."""
+    with open(path, 'w') as f:
+        for digest, name in entries:
+            f.write(f"{digest}  {name}\n")
+
+
+def create_bundle(directory, output, compression='gzip', split_size=0,
+                  algorithm='sha256', generate_checksums=True, arcname=None,
+                  level=None, threads=1, zstd_long=None, layout='solid', references=None):
+    """Stream directory into a compressed, optionally split, tarball.
+
+    references maps bundle paths to files outside directory to add as well.
+    Returns the SplitWriter describing what was written.
+    """
+    output = Path(output)
+    arcname = arcname or Path(directory).name
+    sink = SplitWriter(output, split_size, algorithm)
+
+    if layout == 'mixed' and compression != 'none':
+        if compression not in MIXED_LAYOUT_COMPRESSIONS:
+            raise ValueError(f"The mixed layout needs {' or '.join(MIXED_LAYOUT_COMPRESSIONS)} "
+                             f"compression, not {compression}")
+
+        def open_segment(segment):
+            if segment == 'store':
+                return open_stored_segment(sink, compression, resolve_threads(threads))
+            return open_compressor(_Unclosable(sink), compression, level, threads, zstd_long)
+
+        stream = SegmentedStream(open_segment)
+        try:
+            with tarfile.open(fileobj=stream, mode='w') as tar:
+                add_mixed(tar, stream, directory, arcname, references)
+        finally:
+            stream.close()
+            sink.close()
+        compressed = stream.sizes.get('compress', 0) + stream.sizes.get('compress-end', 0)
+        print(f"Tar data compressed: {format_size(compressed)}, "
+              f"stored without recompression: {format_size(stream.sizes.get('store', 0))}")
+    else:
+        stream = open_compressor(sink, compression, level, threads, zstd_long)
+        try:
+            with tarfile.open(fileobj=stream, mode='w|') as tar:
+                tar.add(directory, arcname=arcname)
+                add_references(tar, references or {}, arcname)
+        finally:
+            if stream is not sink:
+                stream.close()
+            sink.close()
+
+    if generate_checksums:
+        # The whole-file checksum also verifies the file reassembled from parts
+        write_checksum_file(f"{output}.{algorithm}", [(sink.digest.hexdigest(), output.name)])
+        if sink.parts:
+            write_checksum_file(f"{output}.parts.{algorithm}",
+                                [(digest, path.name) for path, digest, _ in sink.parts])
+    return sink
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Stream a directory into a compressed bundle')
+    parser.add_argument('directory', help='Directory to bundle (stored under its own name)')
+    parser.add_argument('--output', '-o', required=True,
+                        help='Bundle file name, including the compression extension')
+    parser.add_argument('--compression', choices=COMPRESSIONS, default='gzip')
+    parser.add_argument('--split-size', default='0',
+                        help="Write parts of this size instead of one file, e.g. '2G' (default: 0)")
+    parser.add_argument('--level', type=int, help='Compression level (default: the tool default)')
+    parser.add_argument('--threads', type=int, default=0,
+                        help='Compression threads, 0 for all cores (default: 0)')
+    parser.add_argument('--zstd-long', type=int, default=None,
+                        help=f'zstd long-distance matching window log ({ZSTD_LONG_RANGE[0]}-{ZSTD_LONG_RANGE[1]})')
+    parser.add_argument('--layout', choices=LAYOUTS, default='solid',
+                        help='solid: compress the whole stream; mixed: store already-compressed '
+                             'members without compressing them again (default: solid)')
+    parser.add_argument('--file-list',
+                        help='Files referenced in place by the staging tree (from bundle_manifest.py stage)')
+    parser.add_argument('--checksum-algorithm', choices=CHECKSUM_ALGORITHMS, default='sha256')
+    parser.add_argument('--no-checksums', action='store_true', help='Do not write checksum files')
+
+    args = parser.parse_args()
+
+    try:
+        split_size = parse_size(args.split_size)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not os.path.isdir(args.directory):
+        print(f"Error: Not a directory: {args.directory}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Streaming {args.directory} -> {args.output} ({args.compression})")
+    if args.level is not None and args.compression in COMPRESSION_LEVELS:
+        low, high, _ = COMPRESSION_LEVELS[args.compression]
+        if not low <= args.level <= high:
+            print(f"Error: {args.compression} level must be between {low} and {high}",
+                  file=sys.stderr)
+            sys.exit(1)
+
+    try:
+        references = read_file_list(args.file_list) if args.file_list else None
+        sink = create_bundle(args.directory, args.output, args.compression, split_size,
+                             args.checksum_algorithm, not args.no_checksums,
+                             level=args.level, threads=args.threads, zstd_long=args.zstd_long,
+                             layout=args.layout, references=references)
+    except (OSError, RuntimeError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Bundle size: {format_size(sink.size)}")
+    if not args.no_checksums:
+        print(f"{args.checksum_algorithm.upper()}: {sink.digest.hexdigest()}  {Path(args.output).name}")
+    for path, digest, size in sink.parts:
+        print(f"  {path.name}: {format_size(size)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+#!/bin/bash
+# Shared artifact cache helpers for the collectors.
+#
+# Source this file after CONFIG_JSON and SCRIPT_DIR are set and before
+# changing directory. Caching is enabled with `cache.enabled: true` in the
+# configuration (CACHE_ENABLED, when already set from `parse_config.py plan
+# --settings`, is used as is); see `parse_config.py cache --help` for the
+# store itself.
+
+CACHE_CONFIG="$(cd "$(dirname "$CONFIG_JSON")" && pwd)/$(basename "$CONFIG_JSON")"
+CACHE_ENABLED="${CACHE_ENABLED:-$(jq -r '.cache.enabled // false' "$CACHE_CONFIG")}"
+
+# cache_get <source> <name> <version> <platform> <dest_dir>
+# Restores cached artifacts into dest_dir. Returns non-zero on a miss.
+cache_get() {
+    [ "$CACHE_ENABLED" = "true" ] || return 1
+    python3 "$SCRIPT_DIR/parse_config.py" cache --config "$CACHE_CONFIG" get \
+        --source "$1" --name "$2" --version "$3" --platform "$4" --dest "$5" > /dev/null 2>&1
+}
+
+# cache_put <source> <name> <version> <platform> <file>...
+# Stores artifacts after a successful fetch. Unmatched globs are skipped and
+# failures are only reported.
+cache_put() {
+    [ "$CACHE_ENABLED" = "true" ] || return 0
+    local source="$1" name="$2" version="$3" platform="$4"
+    shift 4
+    local files=() file
+    for file in "$@"; do
+        [ -f "$file" ] && files+=("$file")
+    done
+    [ "${#files[@]}" -gt 0 ] || return 0
+    python3 "$SCRIPT_DIR/parse_config.py" cache --config "$CACHE_CONFIG" put \
+        --source "$source" --name "$name" --version "$version" --platform "$platform" "${files[@]}" \
+        || echo "  Warning: Failed to store $name $version in the artifact cache"
+}
@@ -12,21 +12,23 @@ echo "=== Container Image Collector ==="
 echo "Config: $CONFIG_JSON"
 echo "Output: $OUTPUT_DIR"
 
+# Parse configuration: settings with defaults applied, then one
+# image/tag/reference/file name row per image
+SETTINGS=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" containers --settings)
+eval "$SETTINGS"
+
 # Check if containers collection is enabled
-CONTAINERS_ENABLED=$(jq -r '.containers.enabled // false' "$CONFIG_JSON")
-if [ "$CONTAINERS_ENABLED" != "true" ]; then
+if [ "$ENABLED" != "true" ]; then
     echo "Container collection is disabled in config"
     exit 0
 fi
 
+PLAN=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" containers)
+
 # Create output directory
 mkdir -p "$OUTPUT_DIR"
 cd "$OUTPUT_DIR"
 
-# Parse configuration
-EXPORT_FORMAT=$(jq -r '.containers.export_format // "docker-archive"' "$CONFIG_JSON")
-IMAGES=$(jq -c '.containers.images[]' "$CONFIG_JSON")
-
 echo "Export format: $EXPORT_FORMAT"
 echo ""
 
@@ -50,11 +52,7 @@ mkdir -p images
 > images.txt
 
 # Pull and export images
-for img in $IMAGES; do
-    IMAGE=$(echo "$img" | jq -r '.image')
-    TAG=$(echo "$img" | jq -r '.tag // "latest"')
-    FULL_IMAGE="$IMAGE:$TAG"
-
+while IFS=$'\t' read -r -u 3 IMAGE TAG FULL_IMAGE SAFE_NAME; do
     echo "Processing: $FULL_IMAGE"
 
     # Pull image
@@ -64,8 +62,6 @@ for img in $IMAGES; do
         continue
     }
 
-    # Create safe filename
-    SAFE_NAME=$(echo "$FULL_IMAGE" | sed 's/[\/:]/_/g')
     OUTPUT_FILE="images/${SAFE_NAME}.tar"
 
     # Export image
@@ -104,7 +100,7 @@ for img in $IMAGES; do
     echo "$FULL_IMAGE" >> images.txt
     echo "  Done: ${OUTPUT_FILE}.gz"
     echo ""
-done
+done 3<<< "$PLAN"
 
 # Count exported images
 IMAGE_COUNT=$(ls -1 images/*.tar.gz 2>/dev/null | wc -l || echo "0")
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Debian/Ubuntu collector that resolves the full dependency closure.
+
+For each configured architecture, the Packages indexes of the configured
+distribution and release are read by debian_resolver.py. All requested
+packages are resolved together into one closure. apt on the host is not
+used, so the host's own release, architecture and sources.list do not
+matter. The Release files are checked against the distribution's archive
+keyring with gpgv, or against debian.keyring for a mirror signed with its
+own key.
+
+The closures of all architectures are then downloaded in one concurrent
+batch, straight from the archive's pool paths (the Filename: field), each
+checked against the SHA256 the index gives for it. Files are kept under
+the same pool/ path as in the archive, so an Architecture: all package
+needed by several architectures is downloaded and stored once.
+packages/<arch>/ holds relative symlinks into pool/ for each
+architecture's closure.
+
+The download list of each architecture is written to
+resolutions/<arch>.json, with the control stanza of every package as the
+index gave it, for apt_repo.py to build the repository indexes from. A
+mirror (including a file:// directory laid out like the archive) can stand
+in for the default archives.
+
+Packages can be pinned to a version, and a snapshot timestamp reads the
+archives as they were at that time. A snapshot fixes the closure, so with
+the artifact cache enabled it is cached by snapshot and package set, and
+later runs skip reading the indexes and resolving altogether.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from pathlib import Path, PurePosixPath
+
+from artifact_cache import link_or_copy, sha256_file, store_from_config
+from debian_resolver import COMPONENTS, DEFAULT_KEYRINGS, default_sources, fetch_index, release_codename, resolve
+from downloader import DEFAULT_WORKERS, DownloadError, Downloader
+from parse_config import load_config, plan_rows, source_settings
+
+
+# Bump to invalidate closures cached by earlier versions
+CLOSURE_VERSION = 1
+
+
+def pool_path(filename):
+    """Return an index Filename: as a safe relative path, or None."""
+    path = PurePosixPath(filename)
+    if path.is_absolute() or '..' in path.parts or not path.parts:
+        return None
+    return Path(*path.parts)
+
+
+def closure_fingerprint(settings, codename, names, pins, architecture):
+    """Return a digest of everything an architecture's closure depends on in the config."""
+    inputs = {
+        'version': CLOSURE_VERSION,
+        'distribution': settings['distribution'],
+        'codename': codename,
+        'architecture': architecture,
+        'snapshot': settings['snapshot'],
+        'mirror': settings['mirror'],
+        'packages': sorted(set(names)),
+        'pins': pins,
+        'include_dependencies': settings['include_dependencies'],
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def resolve_architectures(downloader, settings, codename, names, pins, closure_cache=None,
+                          refresh=False):
+    """Resolve every architecture; return ({arch: records}, failures).
+
+    With a closure_cache directory, a closure resolved cleanly before for
+    the same inputs is read from it unless refresh is set, and new clean
+    closures are added to it.
+    """
+    distribution = settings['distribution']
+    closures = {}
+    failures = 0
+    for arch in settings['architectures']:
+        fingerprint = closure_fingerprint(settings, codename, names, pins, arch)
+        if closure_cache is not None and not refresh:
+            try:
+                with open(closure_cache / f"{fingerprint}.json", 'r') as f:
+                    closures[arch] = json.load(f)['packages']
+                print(f"Reusing the cached closure of {arch} ({len(closures[arch])} packages)")
+                continue
+            except (OSError, ValueError, KeyError):
+                pass
+
+        print(f"Resolving architecture: {arch}")
+        sources = default_sources(distribution, codename, arch, settings['mirror'] or None,
+                                  settings['snapshot'] or None)
+        try:
+            index = fetch_index(downloader, sources, arch, COMPONENTS[distribution],
+                                settings['keyring'] or DEFAULT_KEYRINGS[distribution])
+        except (RuntimeError, DownloadError) as e:
+            print(f"  Warning: Cannot read the package indexes for {arch}: {e}")
+            failures += len(names)
+            continue
+        records, missing, unsatisfied = resolve(index, names, settings['include_dependencies'], pins)
+        for name in missing:
+            print(f"  Warning: {name} is not available for {arch}")
+        for description in unsatisfied:
+            print(f"  Warning: Unsatisfied dependency {description}")
+        failures += len(missing)
+        print(f"  Resolved {len(records)} packages from {len(index)} in the archive")
+        records = [{key: value for key, value in record.items()
+                    if key not in ('depends', 'pre_depends', 'provides')} for record in records]
+        closures[arch] = records
+
+        if closure_cache is not None and not missing and not unsatisfied:
+            closure_cache.mkdir(parents=True, exist_ok=True)
+            with open(closure_cache / f"{fingerprint}.json", 'w') as f:
+                json.dump({'packages': records}, f)
+    print("")
+    return closures, failures
+
+
+def link_architecture(arch_dir, paths):
+    """Point packages/<arch>/ at the pool files of one closure; drop other entries."""
+    arch_dir.mkdir(parents=True, exist_ok=True)
+    wanted = {path.name: Path(os.path.relpath(path, arch_dir)) for path in paths}
+    for entry in arch_dir.iterdir():
+        if entry.name not in wanted or not entry.is_symlink() \
+                or Path(os.readlink(entry)) != wanted[entry.name]:
+            entry.unlink()
+    for name, target in wanted.items():
+        link = arch_dir / name
+        if not link.is_symlink():
+            os.symlink(target, link)
+
+
+def remove_stale(pool_dir, paths):
+    """Remove pool files no closure references; return how many were removed."""
+    removed = 0
+    for path in sorted(pool_dir.rglob('*'), reverse=True):
+        if path.is_dir():
+            if not any(path.iterdir()):
+                path.rmdir()
+        elif path not in paths:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def collect(config, output_dir, workers=DEFAULT_WORKERS, refresh=False):
+    """Resolve every configured architecture and download the union of the closures.
+
+    With a snapshot and the artifact cache enabled, an architecture whose
+    closure was resolved before for the same inputs reuses it instead of
+    resolving again, unless refresh is set.
+
+    Returns the number of packages that could not be collected.
+    """
+    settings = source_settings(config, 'debian')
+    distribution = settings['distribution']
+    release = str(settings['release'])
+    rows = plan_rows(config, 'debian')
+    names = [name for name, _ in rows]
+    pins = {name: version for name, version in rows if version != 'latest'}
+    codename = release_codename(distribution, release)
+
+    output_dir = Path(output_dir)
+    resolutions_dir = output_dir / 'resolutions'
+    resolutions_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / 'packages.txt', 'w') as f:
+        for name in sorted(set(names)):
+            f.write(f"{name}={pins[name]}\n" if name in pins else f"{name}\n")
+
+    # Without a snapshot the archive moves on, so only snapshot closures are cached
+    store = store_from_config(config) if (config.get('cache') or {}).get('enabled') else None
+    closure_cache = store.root / 'locks' / 'debian' if store is not None and settings['snapshot'] else None
+    with Downloader(workers) as downloader:
+        closures, failures = resolve_architectures(downloader, settings, codename, names, pins,
+                                                   closure_cache, refresh)
+
+        # One file per pool path, so Architecture: all packages are shared
+        wanted = {}
+        for arch, records in closures.items():
+            with open(resolutions_dir / f"{arch}.json", 'w') as f:
+                json.dump({'distribution': distribution, 'release': release, 'codename': codename,
+                           'snapshot': settings['snapshot'] or None, 'architecture': arch,
+                           'requested': names, 'pins': pins, 'packages': records}, f, indent=2)
+                f.write('\n')
+            for record in records:
+                path = pool_path(record['filename'])
+                if path is None:
+                    print(f"Warning: Skipping {record['package']}: unusable path {record['filename']}")
+                    failures += 1
+                    continue
+                previous = wanted.setdefault(output_dir / path, record)
+                if previous['sha256'] != record['sha256']:
+                    print(f"Warning: {record['filename']} has different hashes across architectures")
+
+        # Files already in the pool or in the artifact cache are not downloaded
+        # if they hash as the index says; cache objects are named by their sha256
+        pending = []
+        present = cached = 0
+        for dest, record in sorted(wanted.items()):
+            if dest.exists() and dest.stat().st_size == record['size'] \
+                    and sha256_file(dest) == record['sha256']:
+                present += 1
+                continue
+            platform = f"{distribution}-{release}-{record['architecture']}"
+            members = store.lookup('debian', record['package'], record['version'], platform) \
+                if store else None
+            if members and members[0][1].name != record['sha256']:
+                print(f"  Note: The cached {dest.name} does not match the index, downloading it again")
+                members = None
+            if members:
+                dest.parent.mkdir(parents=True, exist_ok=True)
+                link_or_copy(members[0][1], dest)
+                cached += 1
+                continue
+            pending.append((dest, record))
+        total = sum(len(records) for records in closures.values())
+        print(f"{total} packages needed, {len(wanted)} distinct files: {present} already present, "
+              f"{cached} from cache, {len(pending)} to download")
+
+        jobs = [(record['url'], dest, record['sha256']) for dest, record in pending]
+        for (dest, record), (_, error) in zip(pending, downloader.fetch_all(jobs)):
+            if error is not None:
+                print(f"  Warning: Failed to download {record['package']}: {error}")
+                failures += 1
+                continue
+            print(f"  Downloaded: {dest.name}")
+            if store is not None:
+                platform = f"{distribution}-{release}-{record['architecture']}"
+                store.store('debian', record['package'], record['version'], platform, [dest])
+    if store is not None:
+        store.close()
+
+    # The per-architecture view is only an index: symlinks into the pool
+    for arch, records in closures.items():
+        paths = [output_dir / path for path in map(pool_path, (r['filename'] for r in records))
+                 if path is not None and (output_dir / path).exists()]
+        link_architecture(output_dir / 'packages' / arch, paths)
+
+    # Stale files are only removed once the pool is known to be complete
+    pool_dir = output_dir / 'pool'
+    if not failures and pool_dir.is_dir():
+        removed = remove_stale(pool_dir, set(wanted))
+        if removed:
+            print(f"Removed {removed} packages no architecture needs any more")
+    return failures
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Collect Debian/Ubuntu packages and their dependencies')
+    parser.add_argument('config_file', help='Configuration file (YAML or the exported JSON)')
+    parser.add_argument('output_dir', help='debian output directory')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Packages downloaded at once (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Resolve again even if a cached closure matches the config')
+
+    args = parser.parse_args()
+
+    config = load_config(args.config_file)
+    try:
+        failures = collect(config, args.output_dir, args.workers, args.refresh)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if failures:
+        print(f"Warning: {failures} packages could not be collected")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,94 +12,53 @@ echo "=== Debian/Ubuntu Package Collector ==="
 echo "Config: $CONFIG_JSON"
 echo "Output: $OUTPUT_DIR"
 
+# Parse configuration: settings with defaults applied, then one package
+# name per row
+SETTINGS=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" debian --settings)
+eval "$SETTINGS"
+
 # Check if debian is enabled
-DEBIAN_ENABLED=$(jq -r '.debian.enabled // false' "$CONFIG_JSON")
-if [ "$DEBIAN_ENABLED" != "true" ]; then
+if [ "$ENABLED" != "true" ]; then
     echo "Debian collection is disabled in config"
     exit 0
 fi
 
-# Create output directory
-mkdir -p "$OUTPUT_DIR"
-cd "$OUTPUT_DIR"
-
-# Parse configuration
-DISTRIBUTION=$(jq -r '.debian.distribution // "ubuntu"' "$CONFIG_JSON")
-RELEASE=$(jq -r '.debian.release // "22.04"' "$CONFIG_JSON")
-INCLUDE_DEPS=$(jq -r '.debian.include_dependencies // true' "$CONFIG_JSON")
-ARCHITECTURES=$(jq -r '.debian.architectures[]? // "amd64"' "$CONFIG_JSON" | tr '\n' ' ')
-PACKAGES=$(jq -r '.debian.packages[]' "$CONFIG_JSON")
-
 echo "Distribution: $DISTRIBUTION"
 echo "Release: $RELEASE"
 echo "Architectures: $ARCHITECTURES"
 echo "Include dependencies: $INCLUDE_DEPS"
+if [ -n "$SNAPSHOT" ]; then
+    echo "Snapshot: $SNAPSHOT"
+fi
+if [ -n "$MIRROR" ]; then
+    echo "Mirror: $MIRROR"
+fi
+if [ -n "$KEYRING" ]; then
+    echo "Keyring: $KEYRING"
+fi
 echo ""
 
-# Create packages directory
-mkdir -p packages
-
-# Initialize package list
-> packages.txt
-
-# Download packages using apt-get (in download-only mode)
-echo "Updating package index..."
-echo "Note: This requires running on a Debian/Ubuntu system or in a container"
+# Resolve the dependency closure of all packages from the archive's
+# Packages indexes and download every .deb it lists concurrently, checking
+# each against its SHA256; apt on this host is not used
+mkdir -p "$OUTPUT_DIR"
+python3 "$SCRIPT_DIR/collect_debian.py" "$CONFIG_JSON" "$OUTPUT_DIR"
 echo ""
 
-# For each architecture
-for arch in $ARCHITECTURES; do
-    echo "Processing architecture: $arch"
-    ARCH_DIR="packages/$arch"
-    mkdir -p "$ARCH_DIR"
-
-    for pkg in $PACKAGES; do
-        echo "  Downloading: $pkg"
-
-        if [ "$INCLUDE_DEPS" = "true" ]; then
-            # Download package with dependencies
-            apt-get download "$pkg" 2>/dev/null && mv *.deb "$ARCH_DIR/" 2>/dev/null || {
-                echo "  Warning: Failed to download $pkg for $arch"
-                continue
-            }
-
-            # Get dependencies
-            DEPS=$(apt-cache depends "$pkg" | grep "Depends:" | awk '{print $2}' | grep -v "<" || true)
-            for dep in $DEPS; do
-                echo "    Dependency: $dep"
-                apt-get download "$dep" 2>/dev/null && mv *.deb "$ARCH_DIR/" 2>/dev/null || echo "    Warning: Failed to download dependency $dep"
-            done
-        else
-            # Download package only
-            apt-get download "$pkg" 2>/dev/null && mv *.deb "$ARCH_DIR/" 2>/dev/null || {
-                echo "  Warning: Failed to download $pkg for $arch"
-                continue
-            }
-        fi
-
-        # Record package
-        echo "$pkg" >> packages.txt
-    done
-    echo ""
-done
-
-# Remove duplicate entries in packages.txt
-sort -u packages.txt -o packages.txt
+cd "$OUTPUT_DIR"
+OUTPUT_DIR="$(pwd)"
 
-# Count downloaded packages
-PACKAGE_COUNT=$(find packages -name "*.deb" 2>/dev/null | wc -l)
+# Count downloaded packages (packages/<arch>/ only links into pool/)
+PACKAGE_COUNT=$(find pool -name "*.deb" 2>/dev/null | wc -l)
 echo "Downloaded $PACKAGE_COUNT .deb packages"
 
-# Create package index for each architecture
-for arch in $ARCHITECTURES; do
-    ARCH_DIR="packages/$arch"
-    if [ -d "$ARCH_DIR" ]; then
-        cd "$ARCH_DIR"
-        dpkg-scanpackages . /dev/null | gzip -9c > Packages.gz 2>/dev/null || \
-            echo "Note: dpkg-scanpackages not available, skipping index generation"
-        cd "$OUTPUT_DIR"
-    fi
-done
+# Build the APT repository indexes (dists/) from the control stanzas
+# captured at resolution time; only changed indexes are rewritten
+if [ -n "$SIGNING_KEY" ]; then
+    python3 "$SCRIPT_DIR/apt_repo.py" . --sign-key "$SIGNING_KEY"
+else
+    python3 "$SCRIPT_DIR/apt_repo.py" .
+fi
 
 # Generate README for deployment
 cat > README.md << 'EOF'
@@ -109,7 +68,14 @@ This directory contains Debian/Ubuntu packages (.deb files) and their dependenci
 
 ## Contents
 
-- `packages/<arch>/` - DEB packages organized by architecture
+- `pool/` - Every DEB package, stored once at its path in the archive
+  (`Architecture: all` packages are shared by all architectures)
+- `packages/<arch>/` - Symlinks into `pool/` for the packages of each architecture
+- `dists/<codename>/` - APT repository indexes (`Release` and
+  `main/binary-<arch>/Packages`) for `pool/`
+- `archive-keyring.gpg` - Public key `Release` is signed with (signed bundles only)
+- `resolutions/<arch>.json` - Resolved dependency closure for each architecture
+  (package, version, SHA256 and archive path of every .deb)
 - `packages.txt` - List of requested packages
 - `README.md` - This file
 
@@ -133,26 +99,31 @@ Fix broken dependencies (if any):
 sudo apt-get install -f
 ```
 
-### Method 2: Using apt with local repository
+### Method 2: Using apt with the bundled repository
 
-1. Copy packages to a local directory:
+This directory is already an APT repository: `dists/` holds the indexes
+for the packages in `pool/`, and apt resolves dependencies from it.
+
+1. Copy the directory to its final location:
 ```bash
 sudo mkdir -p /var/local-repo
-sudo cp -r packages/amd64/*.deb /var/local-repo/
+sudo cp -r . /var/local-repo/
 ```
 
-2. Create package index:
+2. Add it to apt sources, using the codename under `dists/` (for example
+`jammy`). If the bundle was signed (`archive-keyring.gpg` is present):
 ```bash
-cd /var/local-repo
-dpkg-scanpackages . /dev/null | gzip -9c > Packages.gz
+echo "deb [signed-by=/var/local-repo/archive-keyring.gpg] file:/var/local-repo $(ls /var/local-repo/dists) main" | \
+    sudo tee /etc/apt/sources.list.d/local.list
 ```
 
-3. Add to apt sources:
+Otherwise the repository has to be trusted explicitly:
 ```bash
-echo "deb [trusted=yes] file:/var/local-repo ./" | sudo tee /etc/apt/sources.list.d/local.list
+echo "deb [trusted=yes] file:/var/local-repo $(ls /var/local-repo/dists) main" | \
+    sudo tee /etc/apt/sources.list.d/local.list
 ```
 
-4. Update and install:
+3. Update and install:
 ```bash
 sudo apt-get update
 sudo apt-get install package-name
@@ -217,7 +188,11 @@ sudo dpkg -i packages/amd64/*.deb
 
 ## Handling Dependencies
 
-Dependencies are included if configured during download. However, you may encounter:
+Dependencies are included if configured during download. They are resolved
+from the archive's own Packages indexes for the configured release and
+architecture, following Depends and Pre-Depends, so the bundle holds the
+complete closure of every requested package; `resolutions/<arch>.json` lists
+it. You may still encounter:
 
 ### Missing dependencies
 ```bash
@@ -251,39 +226,14 @@ Verify package integrity:
 dpkg-deb --validate packages/amd64/package-name.deb
 ```
 
-## Setting Up Local Repository
-
-For a proper local repository:
-
-1. Create repository structure:
-```bash
-sudo mkdir -p /var/local-apt-repo/dists/stable/main/binary-amd64
-sudo cp packages/amd64/*.deb /var/local-apt-repo/dists/stable/main/binary-amd64/
-```
-
-2. Generate Packages file:
-```bash
-cd /var/local-apt-repo
-dpkg-scanpackages dists/stable/main/binary-amd64 | gzip > dists/stable/main/binary-amd64/Packages.gz
-```
+## Serving the Repository Over HTTP
 
-3. Create Release file:
-```bash
-cat > dists/stable/Release << 'RELEASE'
-Origin: Local Repository
-Label: Local Repository
-Suite: stable
-Codename: stable
-Architectures: amd64
-Components: main
-Description: Local APT Repository
-RELEASE
-```
+To install on several machines, serve this directory with any static web
+server and point their sources at it instead:
 
-4. Add to sources.list:
 ```bash
-echo "deb [trusted=yes] file:/var/local-apt-repo stable main" | sudo tee /etc/apt/sources.list.d/local.list
-sudo apt-get update
+python3 -m http.server 8080
+echo "deb [trusted=yes] http://repo-host:8080/ jammy main" | sudo tee /etc/apt/sources.list.d/local.list
 ```
 
 ## Troubleshooting
@@ -339,7 +289,3 @@ EOF
 
 echo "Debian collection complete!"
 echo "Output directory: $OUTPUT_DIR"
-echo ""
-echo "Note: This script works best when run on a Debian/Ubuntu system."
-echo "For other systems, consider using a Docker container:"
-echo "  docker run --rm -v \$(pwd):/output ubuntu:22.04 bash /output/scripts/collect_debian.sh"
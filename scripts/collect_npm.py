@@ -0,0 +1,386 @@
+#!/usr/bin/env python3
+"""
+npm collector that resolves all packages into one lockfile.
+
+All configured packages are added as dependencies of one temporary
+project and resolved together by a single `npm install --package-lock-only
+--ignore-scripts` run, which writes package-lock.json without installing
+anything. With `resolver: native`, npm_resolver.py builds the same lock
+from registry packuments instead, fetching them concurrently through a
+revalidating cache. Either way, with the cache enabled, packuments are kept
+in the cache directory between runs. Every tarball the lock resolves to,
+scoped and nested dependencies included, is then downloaded once,
+concurrently, and checked against the lock's `integrity` hash.
+
+Tarballs are kept once, in a flat content-addressed store:
+tarballs/<algorithm>-<hex digest>.tgz, named after the strongest hash in
+their integrity value. A dependency shared by many packages is stored and
+downloaded once, and a store entry that exists needs no re-check.
+packages/<name>.json is the per-package index: the tarballs a configured
+package needs, with their versions, integrity and store paths. If the
+packages cannot be resolved together, each is resolved on its own.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import subprocess
+import tempfile
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from artifact_cache import link_or_copy, store_from_config
+from downloader import DEFAULT_WORKERS as DEFAULT_DOWNLOAD_WORKERS, Downloader, parse_integrity
+from npm_resolver import DEFAULT_CONCURRENCY, RegistryClient, lookup, resolve
+from parse_config import load_config, plan_rows, source_settings
+
+
+# npm processes resolving at once when packages are resolved one by one
+DEFAULT_JOBS = 4
+
+NPM_LOCK_ARGS = ['install', '--package-lock-only', '--ignore-scripts', '--legacy-peer-deps',
+                 '--no-audit', '--no-fund']
+
+DEPENDENCY_FIELDS = ['dependencies', 'optionalDependencies', 'peerDependencies']
+
+
+def tarball_name(name, version):
+    """Return the file name `npm pack` gives a package: @scope/pkg -> scope-pkg-1.0.0.tgz."""
+    return f"{name.lstrip('@').replace('/', '-')}-{version}.tgz"
+
+
+def npm_lock(dependencies, cache_dir=None, concurrency=DEFAULT_CONCURRENCY):
+    """Resolve {name: version spec} with npm; return the parsed package-lock.json.
+
+    npm keeps its HTTP cache, which revalidates packuments by ETag, in
+    cache_dir when one is given and opens at most concurrency connections.
+    Raises RuntimeError with npm's first error line if resolution fails.
+    """
+    env = dict(os.environ, npm_config_maxsockets=str(concurrency))
+    if cache_dir is not None:
+        env['npm_config_cache'] = str(cache_dir)
+    with tempfile.TemporaryDirectory(prefix='npm-resolve-') as tmp:
+        with open(Path(tmp) / 'package.json', 'w') as f:
+            json.dump({'name': 'disconnected-resources-npm', 'version': '1.0.0', 'private': True,
+                       'dependencies': dependencies}, f, indent=2)
+        result = subprocess.run(['npm'] + NPM_LOCK_ARGS, cwd=tmp, stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE, text=True, env=env)
+        lock_path = Path(tmp) / 'package-lock.json'
+        if result.returncode != 0 or not lock_path.exists():
+            raise RuntimeError(npm_error(result.stderr) or f"npm exited with {result.returncode}")
+        with open(lock_path, 'r') as f:
+            return json.load(f)
+
+
+def npm_error(stderr):
+    """Return the first meaningful line of npm's error output, or None."""
+    for line in stderr.splitlines():
+        for prefix in ('npm error ', 'npm ERR! '):
+            if line.startswith(prefix):
+                line = line[len(prefix):]
+        line = line.strip()
+        if line and not line.startswith('code ') and 'complete log' not in line:
+            return line
+    return None
+
+
+def closure(entries, name, include_deps):
+    """Return the lock paths a top-level package needs, itself first."""
+    root = f"node_modules/{name}"
+    if root not in entries:
+        return []
+    if not include_deps:
+        return [root]
+    seen = [root]
+    queue = [root]
+    while queue:
+        path = queue.pop()
+        for field in DEPENDENCY_FIELDS:
+            for dependency in entries[path].get(field) or {}:
+                found = lookup(entries, path, dependency)
+                if found is not None and found not in seen:
+                    seen.append(found)
+                    queue.append(found)
+    return seen
+
+
+def lock_records(lock, names, include_deps):
+    """Turn a package-lock.json into {top-level name: [tarball records]}."""
+    entries = {path: entry for path, entry in (lock.get('packages') or {}).items()
+               if path and not entry.get('link')}
+    result = {}
+    for top in names:
+        records = []
+        for path in closure(entries, top, include_deps):
+            entry = entries[path]
+            name = entry.get('name') or path.rsplit('node_modules/', 1)[1]
+            if not entry.get('resolved'):
+                # Bundled dependencies ship inside their parent's tarball
+                if not entry.get('inBundle'):
+                    print(f"  Warning: {name}@{entry.get('version')} has no resolved tarball")
+                continue
+            records.append({
+                'name': name,
+                'version': entry['version'],
+                'filename': tarball_name(name, entry['version']),
+                'url': entry['resolved'],
+                'integrity': entry.get('integrity'),
+            })
+        result[top] = records
+    return result
+
+
+def resolve_packages(rows, include_deps, jobs=DEFAULT_JOBS, lock_for=npm_lock):
+    """Resolve every configured package; return (lock or None, {name: records}, failed specs).
+
+    lock_for turns {name: version spec} into a package-lock.json dict. The
+    lock is only returned when all packages resolved together.
+    """
+    dependencies = {name: version for name, version, _ in rows}
+    names = list(dependencies)
+    try:
+        lock = lock_for(dependencies)
+        records = lock_records(lock, names, include_deps)
+        tarballs = {record['filename'] for package in records.values() for record in package}
+        print(f"Resolved {len(names)} packages together: {len(tarballs)} tarballs")
+        return lock, records, []
+    except RuntimeError as e:
+        if len(rows) == 1:
+            print(f"  Warning: Failed to resolve {rows[0][2]}: {e}")
+            return None, {}, [rows[0][2]]
+        print(f"  Warning: Resolving all packages together failed ({e}); "
+              f"resolving packages one at a time")
+
+    def resolve_one(row):
+        name, version, spec = row
+        try:
+            return lock_records(lock_for({name: version}), [name], include_deps), None
+        except RuntimeError as e:
+            print(f"  Warning: Failed to resolve {spec}: {e}")
+            return {}, spec
+
+    records = {}
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for result, spec in executor.map(resolve_one, rows):
+            records.update(result)
+            if spec is not None:
+                failed.append(spec)
+    print(f"Resolved {len(records)} packages, {len(failed)} failed")
+    return None, records, failed
+
+
+def store_name(integrity):
+    """Return the content-addressed store name for an SRI string: sha512-<hex>.tgz."""
+    algorithm, digest = parse_integrity(integrity)
+    return f"{algorithm}-{digest.hex()}.tgz"
+
+
+def file_integrity(path):
+    """Return the sha512 SRI string of a file."""
+    digest = hashlib.sha512()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return f"sha512-{base64.b64encode(digest.digest()).decode()}"
+
+
+def matches_integrity(path, integrity):
+    """Return True if a file's digest matches an SRI integrity string."""
+    algorithm, expected = parse_integrity(integrity)
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.digest() == expected
+
+
+def add_to_store(tarballs_dir, record, path):
+    """Move a verified tarball into the store under its content address; return that path.
+
+    Records without an integrity value get one computed from the file.
+    """
+    if not record['integrity']:
+        record['integrity'] = file_integrity(path)
+    dest = tarballs_dir / store_name(record['integrity'])
+    os.replace(path, dest)
+    return dest
+
+
+def write_manifests(packages_dir, rows, per_package):
+    """Write packages/<name>.json for every resolved package, listing the tarballs it needs."""
+    requested = {name: version for name, version, _ in rows}
+    written = set()
+    for name, records in per_package.items():
+        tarballs = [{
+            'name': record['name'],
+            'version': record['version'],
+            'integrity': record['integrity'],
+            'path': f"tarballs/{store_name(record['integrity'])}",
+            'resolved': record['url'],
+        } for record in records if record['integrity']]
+        path = packages_dir / f"{name}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump({'name': name, 'requested': requested.get(name), 'tarballs': tarballs},
+                      f, indent=2)
+            f.write('\n')
+        written.add(path)
+    return written
+
+
+def remove_stale(tarballs_dir, packages_dir, tarballs, manifests):
+    """Remove store entries and manifests (or older per-package directories) nothing references."""
+    removed = 0
+    for path in tarballs_dir.iterdir():
+        if path.is_file() and path.name not in tarballs:
+            path.unlink()
+            removed += 1
+    for path in sorted(packages_dir.rglob('*'), reverse=True):
+        if path.is_dir():
+            if not any(path.iterdir()):
+                path.rmdir()
+        elif path not in manifests:
+            path.unlink()
+    return removed
+
+
+def collect(config, output_dir, jobs=DEFAULT_JOBS, workers=DEFAULT_DOWNLOAD_WORKERS):
+    """Resolve all packages, download their tarballs once and write per-package manifests.
+
+    Returns the number of tarballs that could not be fetched.
+    """
+    settings = source_settings(config, 'npm')
+    include_deps = settings['include_dependencies']
+    concurrency = settings['concurrency']
+    rows = plan_rows(config, 'npm')
+    store = store_from_config(config) if (config.get('cache') or {}).get('enabled') else None
+
+    output_dir = Path(output_dir)
+    tarballs_dir = output_dir / 'tarballs'
+    packages_dir = output_dir / 'packages'
+    tarballs_dir.mkdir(parents=True, exist_ok=True)
+    packages_dir.mkdir(parents=True, exist_ok=True)
+
+    with open(output_dir / 'packages.txt', 'w') as f:
+        for name, version, _ in rows:
+            f.write(f"{name}@{version}\n")
+
+    # Packuments are cached next to the artifacts, so later runs only revalidate them
+    if settings['resolver'] == 'native':
+        print(f"Resolving {len(rows)} packages natively...")
+        cache_dir = store.root / 'packuments' if store else None
+        with Downloader(concurrency) as downloader:
+            client = RegistryClient(downloader, cache_dir=cache_dir, concurrency=concurrency)
+            try:
+                lock, per_package, failed = resolve_packages(
+                    rows, include_deps, jobs,
+                    lambda dependencies: resolve(client, dependencies, include_deps))
+            finally:
+                client.close()
+        print(f"Packuments: {client.stats['fetched']} downloaded, "
+              f"{client.stats['revalidated']} unchanged since the last run")
+    else:
+        print(f"Resolving {len(rows)} packages...")
+        cache_dir = store.root / 'npm' if store else None
+        lock, per_package, failed = resolve_packages(
+            rows, include_deps, jobs,
+            lambda dependencies: npm_lock(dependencies, cache_dir, concurrency))
+    if lock is not None:
+        with open(output_dir / 'package-lock.json', 'w') as f:
+            json.dump(lock, f, indent=2)
+            f.write('\n')
+
+    # Shared dependencies are one record, and one file in the store
+    wanted = {}
+    for records in per_package.values():
+        for record in records:
+            wanted.setdefault((record['name'], record['version']), record)
+    for records in per_package.values():
+        records[:] = [wanted[(record['name'], record['version'])] for record in records]
+
+    # A store entry's name is its hash and only verified files are added,
+    # so one that exists needs no re-check; cached files are checked first
+    pending = []
+    present = cached = failures = 0
+    for (name, version), record in sorted(wanted.items()):
+        if record['integrity'] and (tarballs_dir / store_name(record['integrity'])).exists():
+            present += 1
+            continue
+        members = store.lookup('npm', name, version, record['filename']) if store else None
+        if members and record['integrity'] and \
+                not matches_integrity(members[0][1], record['integrity']):
+            print(f"  Note: Cached {record['filename']} does not match the lock's integrity, "
+                  f"downloading it again")
+            members = None
+        if members:
+            incoming = tarballs_dir / f"{record['filename']}.incoming"
+            link_or_copy(members[0][1], incoming)
+            add_to_store(tarballs_dir, record, incoming)
+            cached += 1
+            continue
+        if urllib.parse.urlsplit(record['url']).scheme not in ('http', 'https', 'file'):
+            print(f"  Warning: Cannot download {name} from {record['url']}")
+            failures += 1
+            continue
+        pending.append(record)
+
+    print(f"{len(wanted)} tarballs needed: {present} already present, {cached} from cache, "
+          f"{len(pending)} to download")
+
+    jobs = [(record['url'], tarballs_dir / f"{record['filename']}.incoming", None, record['integrity'])
+            for record in pending]
+    with Downloader(workers) as downloader:
+        for record, ((_, incoming, _, _), error) in zip(pending, downloader.fetch_all(jobs)):
+            if error is not None:
+                print(f"  Warning: Failed to download {record['filename']}: {error}")
+                failures += 1
+                continue
+            print(f"  Downloaded: {record['filename']}")
+            dest = add_to_store(tarballs_dir, record, incoming)
+            if store is not None:
+                store.store('npm', record['name'], record['version'], record['filename'], [dest])
+    if store is not None:
+        store.close()
+
+    # The per-package view is only an index: manifests that point into the store
+    for records in per_package.values():
+        records[:] = [record for record in records if record['integrity'] and
+                      (tarballs_dir / store_name(record['integrity'])).exists()]
+    manifests = write_manifests(packages_dir, rows, per_package)
+
+    if failed:
+        print(f"Warning: {len(failed)} packages could not be resolved: {', '.join(failed)}")
+    # Stale files are only removed once the store is known to be complete
+    if not failed and not failures:
+        tarballs = {store_name(record['integrity']) for record in wanted.values()
+                    if record['integrity']}
+        removed = remove_stale(tarballs_dir, packages_dir, tarballs, manifests)
+        if removed:
+            print(f"Removed {removed} tarballs no package needs any more")
+    return failures
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Collect npm packages from one resolved lockfile')
+    parser.add_argument('config_file', help='Configuration file (YAML or the exported JSON)')
+    parser.add_argument('output_dir', help='npm output directory')
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                        help=f'npm processes when resolving one package at a time (default: {DEFAULT_JOBS})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help=f'Tarballs downloaded at once (default: {DEFAULT_DOWNLOAD_WORKERS})')
+
+    args = parser.parse_args()
+
+    config = load_config(args.config_file)
+    failures = collect(config, args.output_dir, args.jobs, args.workers)
+    if failures:
+        print(f"Warning: {failures} tarballs could not be downloaded")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,95 +12,37 @@ echo "=== NPM Package Collector ==="
 echo "Config: $CONFIG_JSON"
 echo "Output: $OUTPUT_DIR"
 
+# Parse configuration: settings with defaults applied
+SETTINGS=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" npm --settings)
+eval "$SETTINGS"
+
 # Check if npm is enabled
-NPM_ENABLED=$(jq -r '.npm.enabled // false' "$CONFIG_JSON")
-if [ "$NPM_ENABLED" != "true" ]; then
+if [ "$ENABLED" != "true" ]; then
     echo "NPM collection is disabled in config"
     exit 0
 fi
 
-# Create output directory
-mkdir -p "$OUTPUT_DIR"
-cd "$OUTPUT_DIR"
-
-# Parse configuration
-INCLUDE_DEPS=$(jq -r '.npm.include_dependencies // true' "$CONFIG_JSON")
-PACKAGES=$(jq -c '.npm.packages[]' "$CONFIG_JSON")
-
 echo "Include dependencies: $INCLUDE_DEPS"
+echo "Resolver: $RESOLVER"
 echo ""
 
-# Initialize package list
-> packages.txt
-
-# Download packages
-for pkg in $PACKAGES; do
-    PKG_NAME=$(echo "$pkg" | jq -r '.name')
-    PKG_VERSION=$(echo "$pkg" | jq -r '.version // "latest"')
-
-    echo "Processing: $PKG_NAME@$PKG_VERSION"
-
-    if [ "$PKG_VERSION" = "latest" ]; then
-        PKG_SPEC="$PKG_NAME"
-    else
-        PKG_SPEC="$PKG_NAME@$PKG_VERSION"
-    fi
-
-    # Create package directory
-    PKG_DIR="packages/$PKG_NAME"
-    mkdir -p "$PKG_DIR"
-
-    if [ "$INCLUDE_DEPS" = "true" ]; then
-        echo "  Downloading package with dependencies..."
-
-        # Create temp directory for this package
-        TEMP_DIR=$(mktemp -d)
-        cd "$TEMP_DIR"
-
-        # Initialize package.json and install
-        npm init -y > /dev/null 2>&1
-        npm install --save "$PKG_SPEC" --legacy-peer-deps > /dev/null 2>&1 || {
-            echo "  Warning: Failed to download $PKG_SPEC"
-            cd "$OUTPUT_DIR"
-            rm -rf "$TEMP_DIR"
-            continue
-        }
-
-        # Pack all node_modules
-        cd node_modules
-        for module in */; do
-            module_name="${module%/}"
-            echo "  Packing: $module_name"
-            npm pack "$module_name" > /dev/null 2>&1 || echo "  Warning: Failed to pack $module_name"
-        done
-
-        # Move tarballs to output
-        mv *.tgz "$OUTPUT_DIR/$PKG_DIR/" 2>/dev/null || true
-
-        # Cleanup
-        cd "$OUTPUT_DIR"
-        rm -rf "$TEMP_DIR"
-    else
-        echo "  Downloading package only (no dependencies)..."
-        cd "$PKG_DIR"
-        npm pack "$PKG_SPEC" > /dev/null 2>&1 || {
-            echo "  Warning: Failed to download $PKG_SPEC"
-            cd "$OUTPUT_DIR"
-            continue
-        }
-        cd "$OUTPUT_DIR"
-    fi
-
-    # Record package
-    echo "$PKG_NAME@$PKG_VERSION" >> packages.txt
-    echo "  Done"
-    echo ""
-done
+# Resolve all packages into one package-lock.json and download every
+# tarball it lists concurrently, checking each against its integrity hash
+mkdir -p "$OUTPUT_DIR"
+python3 "$SCRIPT_DIR/collect_npm.py" "$CONFIG_JSON" "$OUTPUT_DIR"
+echo ""
+
+cd "$OUTPUT_DIR"
 
 # Count downloaded packages
-TARBALL_COUNT=$(find packages -name "*.tgz" 2>/dev/null | wc -l)
+TARBALL_COUNT=$(find tarballs -name "*.tgz" 2>/dev/null | wc -l)
 echo "Downloaded $TARBALL_COUNT package tarballs"
 
+# Generate static registry metadata (one packument per package) and bundle
+# the read-only server that serves it; only changed packuments are rewritten
+python3 "$SCRIPT_DIR/npm_registry.py" .
+cp "$SCRIPT_DIR/serve_registry.py" .
+
 # Generate README for deployment
 cat > README.md << 'EOF'
 # NPM Packages for Disconnected Environment
@@ -109,7 +51,12 @@ This directory contains npm packages and their dependencies for offline installa
 
 ## Contents
 
-- `packages/` - Directory containing all npm package tarballs
+- `tarballs/` - Every npm package tarball, stored once and named by its hash
+- `packages/` - One `<name>.json` manifest per requested package listing the
+  tarballs it needs (name, version, integrity and path in `tarballs/`)
+- `registry/` - npm registry metadata (`<name>/index.json`) for every tarball
+- `serve_registry.py` - Read-only npm registry serving `registry/` and `tarballs/`
+- `package-lock.json` - Lockfile all requested packages were resolved into
 - `packages.txt` - List of requested packages
 - `README.md` - This file
 
@@ -117,40 +64,35 @@ This directory contains npm packages and their dependencies for offline installa
 
 ### Method 1: Using npm install with local tarballs
 
-For each package you need, install from the tarball:
+Each manifest lists the tarballs a package needs. Install them all:
 
 ```bash
-npm install /path/to/packages/package-name/*.tgz
+npm install $(node -p "require('/path/to/packages/express.json').tarballs.map(t => '/path/to/' + t.path).join(' ')")
 ```
 
-### Method 2: Setting up a local npm registry
+### Method 2: Using the bundled registry
 
-1. Install Verdaccio (if not already in disconnected environment):
-```bash
-npm install -g verdaccio
-```
+`registry/` holds a packument for every bundled package, pointing at the
+tarballs in `tarballs/`. Serve it with the bundled server (Python 3 only, no
+publishing step) and install as usual; npm resolves dependencies itself:
 
-2. Start Verdaccio:
 ```bash
-verdaccio
+python3 serve_registry.py --port 4873
+npm install --registry http://localhost:4873/ express react
 ```
 
-3. Configure npm to use local registry:
+Or make it the default:
 ```bash
-npm set registry http://localhost:4873
+npm set registry http://localhost:4873/
 ```
 
-4. Publish all packages to local registry:
-```bash
-for tarball in packages/*/*.tgz; do
-  npm publish "$tarball" --registry http://localhost:4873
-done
-```
+To use any other static file server (nginx, S3, ...), rewrite the tarball
+URLs once for the URL this directory will be served at, have the server
+answer directory requests with `index.json`, and point npm at `registry/`:
 
-5. Now you can install packages normally:
 ```bash
-npm install express
-npm install react
+python3 serve_registry.py --rebase https://mirror.example.com/npm/
+npm install --registry https://mirror.example.com/npm/registry/ express
 ```
 
 ### Method 3: Direct file installation
@@ -158,8 +100,8 @@ npm install react
 Copy packages to your project and install directly:
 
 ```bash
-# In your project directory
-npm install file:/path/to/packages/express/express-*.tgz
+# In your project directory; the path is listed in packages/express.json
+npm install file:/path/to/tarballs/sha512-<hash>.tgz
 ```
 
 ### Method 4: Manual node_modules setup
@@ -172,7 +114,7 @@ For a specific project:
 cd your-project
 mkdir -p node_modules
 cd node_modules
-for tarball in /path/to/packages/*/*.tgz; do
+for tarball in $(node -p "require('/path/to/packages/your-package.json').tarballs.map(t => '/path/to/' + t.path).join(' ')"); do
   tar -xzf "$tarball"
   # npm tarballs extract to 'package' directory, need to rename
   if [ -d "package" ]; then
@@ -184,20 +126,20 @@ done
 
 ## Verifying Packages
 
-List all downloaded packages:
+List the tarballs a package needs:
 ```bash
-ls -R packages/
+node -p "require('./packages/package-name.json').tarballs.map(t => t.name + '@' + t.version).join('\n')"
 ```
 
 Check package contents:
 ```bash
-tar -tzf packages/package-name/package-name-*.tgz
+tar -tzf tarballs/sha512-<hash>.tgz
 ```
 
 ## Troubleshooting
 
 ### Issue: Package not found
-- Verify the tarball exists in the packages directory
+- Verify the package has a manifest in `packages/` and its tarballs exist in `tarballs/`
 - Check the tarball is not corrupted: `tar -tzf package.tgz`
 
 ### Issue: Dependency conflicts
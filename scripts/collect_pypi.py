@@ -0,0 +1,461 @@
+#!/usr/bin/env python3
+"""
+PyPI collector that resolves each target once.
+
+All configured packages are resolved together, once per (python_version,
+platform) target. By default pip resolves them (`pip install --dry-run
+--report`); with pypi.resolver: native, pypi_resolver.py resolves them
+from index metadata alone. The files the targets need are then downloaded once each into packages/
+by downloader.py. Files already there, or held by the artifact cache, are
+not fetched again. Each target's resolution is written to
+resolutions/<target>.json, and as a hash-pinned requirements file to
+locks/<target>.txt for `pip install --require-hashes`.
+
+When a target cannot be resolved as a whole, its packages are resolved one
+at a time so a single bad pin does not drop everything else.
+
+Afterwards packages/ is pruned to the fewest files that still satisfy every
+target (pypi.prune, on by default).
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from artifact_cache import format_size, link_or_copy, parse_duration, sha256_file, store_from_config
+from downloader import DEFAULT_WORKERS as DEFAULT_DOWNLOAD_WORKERS, Downloader
+from parse_config import load_config, plan_rows, source_settings
+from pypi_resolver import DEFAULT_INDEX_URL, IndexClient, resolve as native_resolve
+from simple_index import normalize_name, parse_filename
+from wheel_tags import file_rank, target_tags
+
+
+# pip processes resolving at once
+DEFAULT_JOBS = 4
+
+# Bump to invalidate resolutions cached by earlier versions
+LOCK_VERSION = 1
+
+# Targets are resolved on several threads; one line is printed at a time
+_print_lock = threading.Lock()
+
+
+def log(message):
+    """Print one line without interleaving with other resolver threads."""
+    with _print_lock:
+        print(message, flush=True)
+
+
+def target_name(python_version, platform):
+    return f"py{python_version}-{platform}"
+
+
+def resolved_file(item):
+    """Turn one 'install' entry of a pip report into a file record, or None."""
+    info = item.get('download_info') or {}
+    archive = info.get('archive_info')
+    if archive is None:
+        return None
+    sha256 = (archive.get('hashes') or {}).get('sha256')
+    if not sha256 and archive.get('hash', '').startswith('sha256='):
+        sha256 = archive['hash'][len('sha256='):]
+    url = info['url']
+    return {
+        'name': item['metadata']['name'],
+        'version': item['metadata']['version'],
+        'filename': urllib.parse.unquote(urllib.parse.urlsplit(url).path.rsplit('/', 1)[-1]),
+        'url': url,
+        'sha256': sha256,
+        'requested': item.get('requested', False),
+    }
+
+
+def pip_resolve(specs, python_version, platform, include_deps, index_url=None):
+    """Resolve specs for one target with pip; return the file records.
+
+    Raises RuntimeError with pip's last error line if resolution fails.
+    """
+    with tempfile.TemporaryDirectory(prefix='pypi-resolve-') as tmp:
+        report = Path(tmp) / 'report.json'
+        command = [
+            sys.executable, '-m', 'pip', 'install',
+            '--dry-run', '--ignore-installed', '--quiet', '--disable-pip-version-check',
+            '--report', str(report),
+            '--target', str(Path(tmp) / 'target'),
+            '--python-version', python_version,
+            '--platform', platform,
+        ]
+        # pip only allows foreign platforms with wheels only or without dependencies
+        command += ['--only-binary=:all:'] if include_deps else ['--no-deps']
+        if index_url:
+            command += ['--index-url', index_url]
+        command += specs
+        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                text=True)
+        if result.returncode != 0 or not report.exists():
+            lines = [line for line in result.stderr.splitlines() if line.strip()]
+            raise RuntimeError(lines[-1].strip() if lines else f"pip exited with {result.returncode}")
+        with open(report, 'r') as f:
+            items = json.load(f).get('install', [])
+
+    files = []
+    for item in items:
+        record = resolved_file(item)
+        if record is None:
+            log(f"  Warning: {item['metadata']['name']} does not resolve to a downloadable file")
+        else:
+            files.append(record)
+    return files
+
+
+def resolve_target(resolve, specs, python_version, platform):
+    """Resolve all specs for one target; return (files, failed specs).
+
+    resolve(specs, python_version, platform) returns file records and
+    raises RuntimeError when the specs cannot be resolved.
+    """
+    name = target_name(python_version, platform)
+    try:
+        files = resolve(specs, python_version, platform)
+        log(f"Resolved {name}: {len(files)} files")
+        return files, []
+    except RuntimeError as e:
+        if len(specs) == 1:
+            log(f"  Warning: Failed to resolve {specs[0]} for {name}: {e}")
+            return [], specs
+        log(f"  Warning: Resolving {name} as a whole failed ({e}); "
+            f"resolving packages one at a time")
+
+    files = {}
+    failed = []
+    for spec in specs:
+        try:
+            for record in resolve([spec], python_version, platform):
+                files.setdefault(record['filename'], record)
+        except RuntimeError as e:
+            log(f"  Warning: Failed to resolve {spec} for {name}: {e}")
+            failed.append(spec)
+    log(f"Resolved {name}: {len(files)} files, {len(failed)} packages failed")
+    return list(files.values()), failed
+
+
+def prune(packages_dir, resolutions):
+    """Keep the fewest files in packages_dir that still satisfy every target.
+
+    resolutions maps (python_version, platform) to (files, failed) as
+    returned by resolve_target. Each resolved (target, release) needs one
+    file: a wheel whose tags the target accepts, or the file pip picked for
+    it. Within each release the files covering the most targets are kept
+    first (greedy set cover), so a pure-Python or abi3 wheel replaces
+    per-version wheels and manylinux aliases collapse to one file. Files no
+    target needs are removed too, except files of projects no resolution
+    mentions when a target had failures.
+
+    Returns (resolutions pointing at the kept files, files removed, bytes saved).
+    """
+    sizes = {}
+    releases = {}
+    with os.scandir(packages_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.endswith('.part'):
+                continue
+            parsed = parse_filename(entry.name)
+            if parsed is None:
+                continue
+            sizes[entry.name] = entry.stat().st_size
+            releases.setdefault((parsed['project'], parsed['version'].lower()), []).append(entry.name)
+
+    ranks = {target: target_tags(*target) for target in resolutions}
+    records = {}
+    # needs[release] = [(target, record, files that satisfy it)]
+    needs = {}
+    unmatched = []
+    for target, (files, _) in resolutions.items():
+        for record in files:
+            records.setdefault(record['filename'], record)
+            release = (normalize_name(record['name']), record['version'].lower())
+            candidates = set(releases.get(release, []))
+            if record['filename'] in sizes:
+                candidates.add(record['filename'])
+            covering = {filename for filename in candidates
+                        if filename == record['filename']
+                        or (filename.endswith('.whl') and file_rank(filename, ranks[target]) is not None)}
+            if covering:
+                needs.setdefault(release, []).append((target, record, covering))
+            else:
+                # Nothing on disk for it, most likely a failed download
+                unmatched.append((target, record))
+
+    keep = set()
+    for release_needs in needs.values():
+        uncovered = set(range(len(release_needs)))
+        while uncovered:
+            coverage = {}
+            for index in uncovered:
+                for filename in release_needs[index][2]:
+                    coverage.setdefault(filename, set()).add(index)
+            best = max(coverage, key=lambda filename: (
+                len(coverage[filename]), filename.endswith('.whl'), -sizes[filename], filename))
+            keep.add(best)
+            uncovered -= coverage[best]
+
+    # Point each target's records at the best kept file for it
+    pruned = {target: ([], failed) for target, (_, failed) in resolutions.items()}
+    for target, record in unmatched:
+        pruned[target][0].append(record)
+    for release_needs in needs.values():
+        for target, record, covering in release_needs:
+            filename = min(covering & keep, key=lambda name: (
+                file_rank(name, ranks[target]) if name.endswith('.whl') else len(ranks[target]), name))
+            kept = dict(records.get(filename, record), name=record['name'],
+                        version=record['version'], requested=record['requested'])
+            if filename not in records:
+                kept.update(filename=filename, url=None, sha256=sha256_file(packages_dir / filename))
+            pruned[target][0].append(kept)
+
+    keep_unknown = any(failed for _, failed in resolutions.values())
+    needed_projects = {project for project, _ in needs}
+    removed = saved = 0
+    for (project, _), filenames in releases.items():
+        if keep_unknown and project not in needed_projects:
+            continue
+        for filename in filenames:
+            if filename not in keep:
+                (packages_dir / filename).unlink()
+                removed += 1
+                saved += sizes[filename]
+    return pruned, removed, saved
+
+
+def lock_fingerprint(settings, specs, python_version, platform):
+    """Return a digest of everything a target's resolution depends on in the config."""
+    inputs = {
+        'version': LOCK_VERSION,
+        'specs': sorted(specs),
+        'python_version': python_version,
+        'platform': platform,
+        'include_dependencies': settings['include_dependencies'],
+        'resolver': settings['resolver'],
+        'index_url': settings['index_url'],
+    }
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+
+
+def write_lockfile(path, python_version, platform, files, packages_dir):
+    """Write a target's resolution as a hash-pinned requirements file."""
+    lines = [
+        f"# Python {python_version} on {platform}, generated by collect_pypi.py",
+        "# Install offline with:",
+        f"#   pip install --no-index --find-links packages --require-hashes -r locks/{path.name}",
+    ]
+    for record in sorted(files, key=lambda record: normalize_name(record['name'])):
+        sha256 = record['sha256']
+        if not sha256 and (packages_dir / record['filename']).exists():
+            sha256 = sha256_file(packages_dir / record['filename'])
+        if not sha256:
+            lines.append(f"# {record['name']}=={record['version']}: not collected")
+            continue
+        lines.append(f"{normalize_name(record['name'])}=={record['version']} \\")
+        lines.append(f"    --hash=sha256:{sha256}")
+    path.write_text('\n'.join(lines) + '\n')
+
+
+def collect(config, output_dir, jobs=DEFAULT_JOBS, workers=DEFAULT_DOWNLOAD_WORKERS,
+            refresh=False):
+    """Resolve every target, then download the union of files into output_dir/packages.
+
+    With the artifact cache enabled, a target whose config fingerprint
+    matches an earlier run reuses that run's resolution from the cache
+    instead of resolving again, unless refresh is set. When some package
+    is not pinned, the resolution is only reused until it is older than
+    pypi.lock_max_age, so new releases are still picked up.
+
+    Returns the number of files that could not be fetched.
+    """
+    settings = source_settings(config, 'pypi')
+    include_deps = settings['include_dependencies']
+    specs = [spec for _, _, spec in plan_rows(config, 'pypi')]
+    targets = [(str(python_version), platform)
+               for python_version in settings['python_versions']
+               for platform in settings['platforms']]
+
+    output_dir = Path(output_dir)
+    packages_dir = output_dir / 'packages'
+    resolutions_dir = output_dir / 'resolutions'
+    locks_dir = output_dir / 'locks'
+    packages_dir.mkdir(parents=True, exist_ok=True)
+    resolutions_dir.mkdir(exist_ok=True)
+    locks_dir.mkdir(exist_ok=True)
+
+    with open(output_dir / 'packages.txt', 'w') as f:
+        for name, version, _ in plan_rows(config, 'pypi'):
+            f.write(f"{name}@{version}\n")
+
+    downloader = Downloader(workers)
+    if settings['resolver'] == 'native':
+        client = IndexClient(downloader, settings['index_url'] or DEFAULT_INDEX_URL, packages_dir)
+
+        def resolve(specs, python_version, platform):
+            return native_resolve(client, specs, python_version, platform, include_deps)
+    else:
+        def resolve(specs, python_version, platform):
+            return pip_resolve(specs, python_version, platform, include_deps,
+                               settings['index_url'] or None)
+
+    # Resolutions are reused while the config is unchanged; with unpinned
+    # packages only until they are lock_max_age old
+    store = store_from_config(config) if (config.get('cache') or {}).get('enabled') else None
+    pinned = all(version != 'latest' for _, version, _ in plan_rows(config, 'pypi'))
+    max_age = None if pinned else parse_duration(settings['lock_max_age'])
+    lock_cache = store.root / 'locks' / 'pypi' if store is not None and max_age != 0 else None
+    fingerprints = {target: lock_fingerprint(settings, specs, *target) for target in targets}
+    reused = {}
+    if lock_cache is not None and not refresh:
+        for target in targets:
+            try:
+                with open(lock_cache / f"{fingerprints[target]}.json", 'r') as f:
+                    lock = json.load(f)
+                if max_age is None or time.time() - lock['resolved'] < max_age:
+                    reused[target] = (lock['files'], [])
+            except (OSError, ValueError, KeyError):
+                pass
+    if reused:
+        print(f"Reusing the cached resolution of {len(reused)} of {len(targets)} targets"
+              + ("" if pinned else f" (unpinned packages: resolved again after "
+                                   f"{settings['lock_max_age']})"))
+
+    to_resolve = [target for target in targets if target not in reused]
+    if to_resolve:
+        print(f"Resolving {len(specs)} packages for {len(to_resolve)} targets "
+              f"with the {settings['resolver']} resolver...")
+    with ThreadPoolExecutor(max_workers=max(1, min(jobs, len(to_resolve)))) as executor:
+        resolved = dict(zip(to_resolve, executor.map(
+            lambda target: resolve_target(resolve, specs, target[0], target[1]), to_resolve)))
+    results = [reused.get(target) or resolved[target] for target in targets]
+
+    if lock_cache is not None:
+        lock_cache.mkdir(parents=True, exist_ok=True)
+        for target, (files, failed) in resolved.items():
+            if not failed:
+                with open(lock_cache / f"{fingerprints[target]}.json", 'w') as f:
+                    json.dump({'resolved': time.time(), 'files': files}, f, indent=2)
+
+    if to_resolve and settings['resolver'] == 'native':
+        stats = client.stats
+        print(f"Metadata read from {stats['sidecar']} .metadata files, {stats['range']} range "
+              f"reads, {stats['local']} local wheels and {stats['full']} full downloads")
+
+    wanted = {}
+    wanted_by = {}
+    for target, (files, _) in zip(targets, results):
+        for record in files:
+            wanted.setdefault(record['filename'], record)
+            wanted_by.setdefault(record['filename'], []).append(target)
+
+    # A wheel kept by an earlier prune may already cover a file pip picked
+    on_disk = {}
+    for filename in os.listdir(packages_dir):
+        parsed = parse_filename(filename)
+        if parsed is not None and parsed['tags'] is not None:
+            on_disk.setdefault((parsed['project'], parsed['version'].lower()), []).append(filename)
+    ranks = {target: target_tags(*target) for target in targets}
+
+    def covered(record):
+        release = (normalize_name(record['name']), record['version'].lower())
+        return any(all(file_rank(filename, ranks[target]) is not None
+                       for target in wanted_by[record['filename']])
+                   for filename in on_disk.get(release, []))
+
+    # Files already in place or in the artifact cache are not downloaded
+    pending = []
+    present = cached = 0
+    for filename, record in sorted(wanted.items()):
+        dest = packages_dir / filename
+        if dest.exists() and (not record['sha256'] or sha256_file(dest) == record['sha256']):
+            present += 1
+            continue
+        if settings['prune'] and covered(record):
+            present += 1
+            continue
+        members = store.lookup('pypi', record['name'], record['version'], filename) if store else None
+        # Cache objects are named by their sha256
+        if members and record['sha256'] and members[0][1].name != record['sha256']:
+            print(f"  Note: The cached {filename} does not match the index, downloading it again")
+            members = None
+        if members:
+            link_or_copy(members[0][1], dest)
+            cached += 1
+            continue
+        pending.append(record)
+
+    print(f"{len(wanted)} files needed: {present} already present, {cached} from cache, "
+          f"{len(pending)} to download")
+
+    failures = 0
+    jobs = [(record['url'], packages_dir / record['filename'], record['sha256']) for record in pending]
+    with downloader:
+        for record, (_, error) in zip(pending, downloader.fetch_all(jobs)):
+            if error is not None:
+                print(f"  Warning: Failed to download {record['filename']}: {error}")
+                failures += 1
+                continue
+            print(f"  Downloaded: {record['filename']}")
+            if store is not None:
+                store.store('pypi', record['name'], record['version'], record['filename'],
+                            [packages_dir / record['filename']])
+    if store is not None:
+        store.close()
+
+    resolutions = dict(zip(targets, results))
+    if settings['prune']:
+        resolutions, removed, saved = prune(packages_dir, resolutions)
+        print(f"Pruned {removed} redundant files, saving {format_size(saved)}")
+
+    for (python_version, platform), (files, failed) in resolutions.items():
+        name = target_name(python_version, platform)
+        with open(resolutions_dir / f"{name}.json", 'w') as f:
+            json.dump({
+                'python_version': python_version,
+                'platform': platform,
+                'include_dependencies': include_deps,
+                'requested': specs,
+                'failed': failed,
+                'fingerprint': fingerprints[(python_version, platform)],
+                'files': sorted(files, key=lambda record: record['filename']),
+            }, f, indent=2)
+            f.write('\n')
+        write_lockfile(locks_dir / f"{name}.txt", python_version, platform, files, packages_dir)
+    return failures
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Collect PyPI packages for every configured target')
+    parser.add_argument('config_file', help='Configuration file (YAML or the exported JSON)')
+    parser.add_argument('output_dir', help='PyPI output directory')
+    parser.add_argument('--jobs', '-j', type=int, default=DEFAULT_JOBS,
+                        help=f'Targets resolved at once (default: {DEFAULT_JOBS})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_DOWNLOAD_WORKERS,
+                        help=f'Files downloaded at once (default: {DEFAULT_DOWNLOAD_WORKERS})')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Resolve again even if a cached resolution matches the config')
+
+    args = parser.parse_args()
+
+    config = load_config(args.config_file)
+    failures = collect(config, args.output_dir, args.jobs, args.workers, args.refresh)
+    if failures:
+        print(f"Warning: {failures} files could not be downloaded")
+
+
+if __name__ == '__main__':
+    main()
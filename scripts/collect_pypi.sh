@@ -12,87 +12,28 @@ echo "=== PyPI Package Collector ==="
 echo "Config: $CONFIG_JSON"
 echo "Output: $OUTPUT_DIR"
 
+# Parse configuration: settings with defaults applied
+SETTINGS=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" pypi --settings)
+eval "$SETTINGS"
+
 # Check if pypi is enabled
-PYPI_ENABLED=$(jq -r '.pypi.enabled // false' "$CONFIG_JSON")
-if [ "$PYPI_ENABLED" != "true" ]; then
+if [ "$ENABLED" != "true" ]; then
     echo "PyPI collection is disabled in config"
     exit 0
 fi
 
-# Create output directory
-mkdir -p "$OUTPUT_DIR"
-cd "$OUTPUT_DIR"
-
-# Parse configuration
-INCLUDE_DEPS=$(jq -r '.pypi.include_dependencies // true' "$CONFIG_JSON")
-PYTHON_VERSIONS=$(jq -r '.pypi.python_versions[]? // "3.11"' "$CONFIG_JSON" | tr '\n' ' ')
-PLATFORMS=$(jq -r '.pypi.platforms[]? // "manylinux2014_x86_64"' "$CONFIG_JSON" | tr '\n' ' ')
-PACKAGES=$(jq -c '.pypi.packages[]' "$CONFIG_JSON")
-
 echo "Include dependencies: $INCLUDE_DEPS"
 echo "Python versions: $PYTHON_VERSIONS"
 echo "Platforms: $PLATFORMS"
 echo ""
 
-# Create packages directory
-mkdir -p packages
-
-# Initialize package list
-> packages.txt
-
-# Download packages
-for pkg in $PACKAGES; do
-    PKG_NAME=$(echo "$pkg" | jq -r '.name')
-    PKG_VERSION=$(echo "$pkg" | jq -r '.version // "latest"')
-
-    echo "Processing: $PKG_NAME@$PKG_VERSION"
-
-    if [ "$PKG_VERSION" = "latest" ]; then
-        PKG_SPEC="$PKG_NAME"
-    else
-        PKG_SPEC="$PKG_NAME==$PKG_VERSION"
-    fi
-
-    # Download for each Python version
-    for py_ver in $PYTHON_VERSIONS; do
-        echo "  Downloading for Python $py_ver..."
-
-        # Build platform arguments
-        PLATFORM_ARGS=""
-        for platform in $PLATFORMS; do
-            PLATFORM_ARGS="$PLATFORM_ARGS --platform $platform"
-        done
-
-        # Download package
-        if [ "$INCLUDE_DEPS" = "true" ]; then
-            pip download \
-                --dest packages \
-                --python-version "$py_ver" \
-                $PLATFORM_ARGS \
-                --no-deps \
-                "$PKG_SPEC" 2>/dev/null || echo "  Warning: Failed to download $PKG_SPEC for Python $py_ver"
-
-            # Download dependencies separately
-            pip download \
-                --dest packages \
-                --python-version "$py_ver" \
-                $PLATFORM_ARGS \
-                "$PKG_SPEC" 2>/dev/null || echo "  Warning: Some dependencies may be missing"
-        else
-            pip download \
-                --dest packages \
-                --python-version "$py_ver" \
-                $PLATFORM_ARGS \
-                --no-deps \
-                "$PKG_SPEC" 2>/dev/null || echo "  Warning: Failed to download $PKG_SPEC for Python $py_ver"
-        fi
-    done
-
-    # Record package
-    echo "$PKG_NAME@$PKG_VERSION" >> packages.txt
-    echo "  Done"
-    echo ""
-done
+# Resolve all packages once per (python version, platform) target and
+# download the files they need concurrently
+mkdir -p "$OUTPUT_DIR"
+python3 "$SCRIPT_DIR/collect_pypi.py" "$CONFIG_JSON" "$OUTPUT_DIR"
+echo ""
+
+cd "$OUTPUT_DIR"
 
 # Remove duplicates
 cd packages
@@ -103,19 +44,8 @@ cd ..
 PACKAGE_COUNT=$(ls -1 packages 2>/dev/null | wc -l)
 echo "Downloaded $PACKAGE_COUNT package files"
 
-# Generate simple index for pip (optional)
-mkdir -p simple
-cd packages
-for wheel_or_tar in *; do
-    # Extract package name (before version)
-    pkg_base=$(echo "$wheel_or_tar" | sed -E 's/[-_]([0-9]+\..*)$//')
-    pkg_name=$(echo "$pkg_base" | tr '_' '-' | tr '[:upper:]' '[:lower:]')
-
-    mkdir -p "../simple/$pkg_name"
-    ln -sf "../../packages/$wheel_or_tar" "../simple/$pkg_name/" 2>/dev/null || \
-        cp "../../packages/$wheel_or_tar" "../simple/$pkg_name/" 2>/dev/null || true
-done
-cd ..
+# Generate a PEP 503/691 simple index for pip; only changed projects are rewritten
+python3 "$SCRIPT_DIR/simple_index.py" packages simple
 
 # Generate README for deployment
 cat > README.md << 'EOF'
@@ -126,8 +56,10 @@ This directory contains Python packages and their dependencies for offline insta
 ## Contents
 
 - `packages/` - All downloaded wheel files and source distributions
-- `simple/` - Simple package index structure for pip
+- `simple/` - Simple package index (PEP 503 HTML and PEP 691 JSON) for pip
 - `packages.txt` - List of requested packages
+- `resolutions/` - Files resolved for each Python version and platform
+- `locks/` - Hash-pinned requirements file for each Python version and platform
 - `all_packages.txt` - All downloaded packages (including dependencies)
 - `README.md` - This file
 
@@ -146,7 +78,18 @@ Example:
 pip install --no-index --find-links=packages requests flask pandas
 ```
 
-### Method 2: Using requirements file
+### Method 2: Using the lock file for your platform
+
+Each file in `locks/` pins every package resolved for one Python version and
+platform, with its sha256. pip installs exactly that set, verifying every
+file, without resolving anything:
+
+```bash
+pip install --no-index --find-links packages --require-hashes \
+    -r locks/py3.11-manylinux2014_x86_64.txt
+```
+
+### Method 3: Using requirements file
 
 If you have a requirements.txt:
 
@@ -154,7 +97,7 @@ If you have a requirements.txt:
 pip install --no-index --find-links=packages -r requirements.txt
 ```
 
-### Method 3: Setting up a local PyPI server
+### Method 4: Setting up a local PyPI server
 
 Install pypiserver (if available in your disconnected environment):
 
@@ -178,15 +121,23 @@ Or add to pip.conf:
 index-url = http://localhost:8080/simple/
 ```
 
-### Method 4: Using pip with simple index
+### Method 5: Using pip with simple index
 
-Use the simple directory as a local index:
+Use the simple directory as a local index. Its pages link to the files in
+`packages/` with sha256 hashes, so pip resolves dependencies as usual:
 
 ```bash
-pip install --index-url=file://$(pwd)/simple --no-deps package-name
+pip install --index-url=file://$(pwd)/simple package-name
+```
+
+To share it over HTTP, serve this directory and point pip at `/simple/`:
+
+```bash
+python3 -m http.server 8080
+pip install --index-url http://localhost:8080/simple/ package-name
 ```
 
-### Method 5: Manual installation
+### Method 6: Manual installation
 
 Install a specific wheel file:
 
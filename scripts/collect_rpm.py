@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+RPM collector that resolves dependencies from repository metadata.
+
+For each configured architecture, the repodata of the distribution's
+repositories for the configured release is read by rpm_resolver.py, and
+all requested packages are resolved together in one pass. dnf, yum and rpm
+are not used, so no RHEL-based host or container is needed, and the
+host's own release and architecture do not matter.
+
+The closures of all architectures are then downloaded in one concurrent
+batch, each .rpm checked against the checksum the primary metadata gives
+for it, into one packages/ directory that createrepo_c turns into a
+repository. A noarch package needed by several architectures has the same
+file name for all of them, so it is downloaded and stored once.
+
+The download list of each architecture is written to
+resolutions/<arch>.json. rpm.repositories replaces the default
+repositories; {release} and {arch} in them are filled in, and a file://
+directory with repodata/ can stand in for a mirror.
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import sys
+from pathlib import Path, PurePosixPath
+
+from artifact_cache import link_or_copy, store_from_config
+from downloader import DEFAULT_WORKERS, DownloadError, Downloader
+from parse_config import load_config, plan_rows, source_settings
+from rpm_resolver import fetch_index, repositories, resolve
+
+
+# Checksum types downloader.py checks as integrity strings; sha256 is checked directly
+SRI_ALGORITHMS = ('sha512', 'sha384', 'sha1')
+
+
+def download_job(record, dest):
+    """Return the fetch_all job for a record, or None if its checksum type cannot be checked."""
+    if record['checksum_type'] == 'sha256':
+        return (record['url'], dest, record['pkgid'])
+    if record['checksum_type'] in SRI_ALGORITHMS:
+        digest = base64.b64encode(bytes.fromhex(record['pkgid'])).decode()
+        return (record['url'], dest, None, f"{record['checksum_type']}-{digest}")
+    return None
+
+
+def matches_checksum(path, record):
+    """Return True if a file hashes to the record's pkgid; False for unknown checksum types."""
+    if record['checksum_type'] not in ('sha256',) + SRI_ALGORITHMS:
+        return False
+    digest = hashlib.new(record['checksum_type'])
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest() == record['pkgid']
+
+
+def resolve_architectures(downloader, settings, names):
+    """Resolve every architecture; return ({arch: records}, failures)."""
+    closures = {}
+    failures = 0
+    for arch in settings['architectures']:
+        print(f"Resolving architecture: {arch}")
+        bases = repositories(settings['distribution'], settings['release'], arch,
+                             settings['repositories'] or None)
+        try:
+            index = fetch_index(downloader, bases, arch)
+            records, missing, unsatisfied = resolve(index, names, settings['include_dependencies'])
+        except (RuntimeError, DownloadError) as e:
+            print(f"  Warning: Cannot read the repository metadata for {arch}: {e}")
+            failures += len(names)
+            continue
+        for name in missing:
+            print(f"  Warning: {name} is not available for {arch}")
+        for description in unsatisfied:
+            print(f"  Warning: Unsatisfied dependency {description}")
+        failures += len(missing)
+        print(f"  Resolved {len(records)} packages from {len(index)} in the repositories")
+        closures[arch] = [{key: value for key, value in record.items()
+                           if key not in ('evr', 'requires', 'recommends', 'provides', 'files')}
+                          for record in records]
+    print("")
+    return closures, failures
+
+
+def remove_stale(packages_dir, paths):
+    """Remove .rpm files no closure references; return how many were removed."""
+    removed = 0
+    for path in packages_dir.glob('*.rpm'):
+        if path not in paths:
+            path.unlink()
+            removed += 1
+    return removed
+
+
+def collect(config, output_dir, workers=DEFAULT_WORKERS):
+    """Resolve every configured architecture and download the union of the closures.
+
+    Returns the number of packages that could not be collected.
+    """
+    settings = source_settings(config, 'rpm')
+    distribution = settings['distribution']
+    release = str(settings['release'])
+    names = [row[0] for row in plan_rows(config, 'rpm')]
+
+    output_dir = Path(output_dir)
+    packages_dir = output_dir / 'packages'
+    resolutions_dir = output_dir / 'resolutions'
+    packages_dir.mkdir(parents=True, exist_ok=True)
+    resolutions_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / 'packages.txt', 'w') as f:
+        for name in sorted(set(names)):
+            f.write(f"{name}\n")
+
+    store = store_from_config(config) if (config.get('cache') or {}).get('enabled') else None
+    with Downloader(workers) as downloader:
+        closures, failures = resolve_architectures(downloader, settings, names)
+
+        # One file per .rpm name, so noarch packages are shared
+        wanted = {}
+        for arch, records in closures.items():
+            with open(resolutions_dir / f"{arch}.json", 'w') as f:
+                json.dump({'distribution': distribution, 'release': release, 'architecture': arch,
+                           'requested': names, 'packages': records}, f, indent=2)
+                f.write('\n')
+            for record in records:
+                filename = PurePosixPath(record['filename']).name
+                if not filename.endswith('.rpm'):
+                    print(f"Warning: Skipping {record['name']}: unusable path {record['filename']}")
+                    failures += 1
+                    continue
+                previous = wanted.setdefault(packages_dir / filename, record)
+                if previous['pkgid'] != record['pkgid']:
+                    print(f"Warning: {filename} has different checksums across repositories")
+
+        # Files already in packages/ or in the artifact cache are not downloaded
+        # if they match the checksum the metadata gives
+        pending = []
+        present = cached = 0
+        for dest, record in sorted(wanted.items()):
+            if dest.exists() and dest.stat().st_size == record['size'] and matches_checksum(dest, record):
+                present += 1
+                continue
+            platform = f"{distribution}-{release}-{record['arch']}"
+            members = store.lookup('rpm', record['name'], record['version'], platform) \
+                if store else None
+            if members and not matches_checksum(members[0][1], record):
+                print(f"  Note: The cached {dest.name} does not match the metadata, downloading it again")
+                members = None
+            if members:
+                link_or_copy(members[0][1], dest)
+                cached += 1
+                continue
+            pending.append((dest, record))
+        total = sum(len(records) for records in closures.values())
+        print(f"{total} packages needed, {len(wanted)} distinct files: {present} already present, "
+              f"{cached} from cache, {len(pending)} to download")
+
+        checkable = []
+        for dest, record in pending:
+            if download_job(record, dest) is None:
+                print(f"  Warning: Skipping {dest.name}: cannot check a "
+                      f"{record['checksum_type']} checksum")
+                failures += 1
+            else:
+                checkable.append((dest, record))
+        jobs = [download_job(record, dest) for dest, record in checkable]
+        for (dest, record), (_, error) in zip(checkable, downloader.fetch_all(jobs)):
+            if error is not None:
+                print(f"  Warning: Failed to download {record['name']}: {error}")
+                failures += 1
+                continue
+            print(f"  Downloaded: {dest.name}")
+            if store is not None:
+                platform = f"{distribution}-{release}-{record['arch']}"
+                store.store('rpm', record['name'], record['version'], platform, [dest])
+    if store is not None:
+        store.close()
+
+    # Stale files are only removed once packages/ is known to be complete
+    if not failures:
+        removed = remove_stale(packages_dir, set(wanted))
+        if removed:
+            print(f"Removed {removed} packages no architecture needs any more")
+    return failures
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Collect RPM packages and their dependencies')
+    parser.add_argument('config_file', help='Configuration file (YAML or the exported JSON)')
+    parser.add_argument('output_dir', help='rpm output directory')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Packages downloaded at once (default: {DEFAULT_WORKERS})')
+
+    args = parser.parse_args()
+
+    config = load_config(args.config_file)
+    try:
+        failures = collect(config, args.output_dir, args.workers)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    if failures:
+        print(f"Warning: {failures} packages could not be collected")
+
+
+if __name__ == '__main__':
+    main()
@@ -12,77 +12,33 @@ echo "=== RPM Package Collector ==="
 echo "Config: $CONFIG_JSON"
 echo "Output: $OUTPUT_DIR"
 
+# Parse configuration: settings with defaults applied
+SETTINGS=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" rpm --settings)
+eval "$SETTINGS"
+
 # Check if rpm collection is enabled
-RPM_ENABLED=$(jq -r '.rpm.enabled // false' "$CONFIG_JSON")
-if [ "$RPM_ENABLED" != "true" ]; then
+if [ "$ENABLED" != "true" ]; then
     echo "RPM collection is disabled in config"
     exit 0
 fi
 
-# Create output directory
-mkdir -p "$OUTPUT_DIR"
-cd "$OUTPUT_DIR"
-
-# Parse configuration
-DISTRIBUTION=$(jq -r '.rpm.distribution // "rhel"' "$CONFIG_JSON")
-RELEASE=$(jq -r '.rpm.release // "9"' "$CONFIG_JSON")
-INCLUDE_DEPS=$(jq -r '.rpm.include_dependencies // true' "$CONFIG_JSON")
-ARCHITECTURES=$(jq -r '.rpm.architectures[]? // "x86_64"' "$CONFIG_JSON" | tr '\n' ' ')
-PACKAGES=$(jq -r '.rpm.packages[]' "$CONFIG_JSON")
-
 echo "Distribution: $DISTRIBUTION"
 echo "Release: $RELEASE"
 echo "Architectures: $ARCHITECTURES"
 echo "Include dependencies: $INCLUDE_DEPS"
-echo ""
-
-# Create packages directory
-mkdir -p packages
-
-# Initialize package list
-> packages.txt
-
-# Detect available package manager
-if command -v dnf &> /dev/null; then
-    PKG_MGR="dnf"
-elif command -v yum &> /dev/null; then
-    PKG_MGR="yum"
-else
-    echo "Error: Neither dnf nor yum found. RPM collection requires RHEL-based system."
-    echo "Consider using a container: docker run --rm -v \$(pwd):/output rockylinux:9 bash /output/scripts/collect_rpm.sh"
-    exit 1
+if [ -n "$REPOSITORIES" ]; then
+    echo "Repositories: $REPOSITORIES"
 fi
-
-echo "Using package manager: $PKG_MGR"
 echo ""
 
-# Download packages
-for pkg in $PACKAGES; do
-    echo "Downloading: $pkg"
-
-    if [ "$INCLUDE_DEPS" = "true" ]; then
-        # Download with dependencies using downloadonly plugin
-        $PKG_MGR install --downloadonly --downloaddir=packages "$pkg" -y 2>/dev/null || {
-            echo "  Warning: Failed to download $pkg"
-            continue
-        }
-    else
-        # Download package only
-        $PKG_MGR download --downloaddir=packages "$pkg" 2>/dev/null || {
-            echo "  Warning: Failed to download $pkg"
-            continue
-        }
-    fi
-
-    # Record package
-    echo "$pkg" >> packages.txt
-    echo "  Done"
-done
-
+# Resolve all packages in one pass from the repositories' repodata and
+# download every .rpm in the closure concurrently, checking each against
+# its checksum; dnf and yum on this host are not used
+mkdir -p "$OUTPUT_DIR"
+python3 "$SCRIPT_DIR/collect_rpm.py" "$CONFIG_JSON" "$OUTPUT_DIR"
 echo ""
 
-# Remove duplicate entries in packages.txt
-sort -u packages.txt -o packages.txt
+cd "$OUTPUT_DIR"
 
 # Count downloaded packages
 PACKAGE_COUNT=$(find packages -name "*.rpm" 2>/dev/null | wc -l)
@@ -99,7 +55,7 @@ if command -v createrepo &> /dev/null || command -v createrepo_c &> /dev/null; t
     echo "Repository metadata created"
 else
     echo "Note: createrepo not available, skipping metadata generation"
-    echo "Install with: yum install createrepo_c"
+    echo "Install with: apt-get install createrepo-c (or dnf install createrepo_c)"
 fi
 
 # Generate README for deployment
@@ -110,8 +66,10 @@ This directory contains RPM packages and their dependencies for offline installa
 
 ## Contents
 
-- `packages/` - All RPM packages
+- `packages/` - All RPM packages (noarch packages are shared by all architectures)
 - `packages/repodata/` - Repository metadata (if generated)
+- `resolutions/<arch>.json` - Resolved dependency closure for each architecture
+  (name, version, checksum and repository path of every .rpm)
 - `packages.txt` - List of requested packages
 - `README.md` - This file
 
@@ -408,7 +366,3 @@ EOF
 
 echo "RPM collection complete!"
 echo "Output directory: $OUTPUT_DIR"
-echo ""
-echo "Note: This script works best when run on a RHEL-based system."
-echo "For other systems, consider using a Docker container:"
-echo "  docker run --rm -v \$(pwd):/output rockylinux:9 bash /output/scripts/collect_rpm.sh"
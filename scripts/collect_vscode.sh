@@ -12,20 +12,26 @@ echo "=== VSCode Extensions Collector ==="
 echo "Config: $CONFIG_JSON"
 echo "Output: $OUTPUT_DIR"
 
+# Parse configuration: settings with defaults applied, then one
+# extension id/version row per extension
+SETTINGS=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" vscode --settings)
+eval "$SETTINGS"
+
 # Check if vscode collection is enabled
-VSCODE_ENABLED=$(jq -r '.vscode.enabled // false' "$CONFIG_JSON")
-if [ "$VSCODE_ENABLED" != "true" ]; then
+if [ "$ENABLED" != "true" ]; then
     echo "VSCode collection is disabled in config"
     exit 0
 fi
 
+# Shared artifact cache
+source "$SCRIPT_DIR/cache_functions.sh"
+
+PLAN=$(python3 "$SCRIPT_DIR/parse_config.py" plan "$CONFIG_JSON" vscode)
+
 # Create output directory
 mkdir -p "$OUTPUT_DIR"
 cd "$OUTPUT_DIR"
 
-# Parse configuration
-EXTENSIONS=$(jq -r '.vscode.extensions[]' "$CONFIG_JSON")
-
 echo "Downloading VSCode extensions..."
 echo ""
 
@@ -39,19 +45,33 @@ mkdir -p extensions
 MARKETPLACE_URL="https://marketplace.visualstudio.com/_apis/public/gallery/publishers"
 
 # Function to download extension
+# Extensions may be pinned as publisher.extension@version
 download_extension() {
     local ext_id="$1"
+    local version="$2"
+    local ext_spec="$ext_id"
+    if [ "$version" != "latest" ]; then
+        ext_spec="$ext_id@$version"
+    fi
     local publisher="${ext_id%%.*}"
     local extension="${ext_id#*.}"
 
-    echo "Processing: $ext_id"
+    echo "Processing: $ext_spec"
 
     # Download using VSCode marketplace URL pattern
-    # Format: https://marketplace.visualstudio.com/_apis/public/gallery/publishers/{publisher}/vsextensions/{extension}/latest/vspackage
+    # Format: https://marketplace.visualstudio.com/_apis/public/gallery/publishers/{publisher}/vsextensions/{extension}/{version}/vspackage
 
-    local download_url="${MARKETPLACE_URL}/${publisher}/vsextensions/${extension}/latest/vspackage"
+    local download_url="${MARKETPLACE_URL}/${publisher}/vsextensions/${extension}/${version}/vspackage"
     local output_file="extensions/${publisher}.${extension}.vsix"
 
+    # Pinned versions can be restored from the artifact cache
+    if [ "$version" != "latest" ] && cache_get vscode "$ext_id" "$version" "" extensions; then
+        echo "  Restored from cache: $output_file"
+        echo "$ext_id" >> extensions.txt
+        echo ""
+        return
+    fi
+
     echo "  Downloading from marketplace..."
     if curl -L -f -o "$output_file" "$download_url" 2>/dev/null; then
         echo "  Success: $output_file"
@@ -59,11 +79,16 @@ download_extension() {
 
         # Get version info from VSIX
         if command -v unzip &> /dev/null; then
-            VERSION=$(unzip -p "$output_file" extension.vsixmanifest 2>/dev/null | grep -oP '(?<=Version=")[^"]*' | head -1 || echo "unknown")
+            VERSION=$(unzip -p "$output_file" extension.vsixmanifest 2>/dev/null | grep -oP '<Identity[^>]*\sVersion="\K[^"]*' | head -1 || echo "unknown")
             echo "  Version: $VERSION"
+
+            # Cache under the actual version so a later pin on it is a hit
+            if [ -n "$VERSION" ] && [ "$VERSION" != "unknown" ]; then
+                cache_put vscode "$ext_id" "$VERSION" "" "$output_file"
+            fi
         fi
     else
-        echo "  Warning: Failed to download $ext_id"
+        echo "  Warning: Failed to download $ext_spec"
         rm -f "$output_file"
     fi
 
@@ -71,9 +96,9 @@ download_extension() {
 }
 
 # Download each extension
-for ext in $EXTENSIONS; do
-    download_extension "$ext"
-done
+while IFS=$'\t' read -r -u 3 EXT_ID EXT_VERSION; do
+    download_extension "$EXT_ID" "$EXT_VERSION"
+done 3<<< "$PLAN"
 
 # Count downloaded extensions
 EXT_COUNT=$(ls -1 extensions/*.vsix 2>/dev/null | wc -l || echo "0")
@@ -0,0 +1,249 @@
+"""
+Schema validation for resources-config.yaml.
+
+resources-config.schema.json describes the configuration as JSON Schema so
+editors can use it as well. It is compiled once into a tree of small check
+functions, so validating many configs in one process only walks the data.
+Only the keywords the schema uses are supported; anything else is rejected
+when the schema is compiled rather than silently ignored.
+
+Configs read with read_config keep their YAML node tree, so every error can
+be reported with its path (npm.packages[2].version) and line number.
+"""
+
+import json
+import re
+from pathlib import Path
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+
+SCHEMA_PATH = Path(__file__).resolve().parent / 'resources-config.schema.json'
+
+# Keywords that only document the schema
+ANNOTATIONS = {'$schema', '$id', 'title', 'description', 'default', 'examples'}
+
+JSON_TYPES = {
+    'object': lambda value: isinstance(value, dict),
+    'array': lambda value: isinstance(value, list),
+    'string': lambda value: isinstance(value, str),
+    'boolean': lambda value: isinstance(value, bool),
+    'integer': lambda value: isinstance(value, int) and not isinstance(value, bool),
+    'number': lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    'null': lambda value: value is None,
+}
+
+
+class ConfigError(Exception):
+    """A configuration file could not be read or is not valid.
+
+    errors holds every problem found as a formatted message.
+    """
+
+    def __init__(self, path, errors):
+        self.path = path
+        self.errors = errors
+        super().__init__(f"{path}: " + '; '.join(errors))
+
+
+def format_path(path):
+    """Format a path of keys and indexes as npm.packages[2].version."""
+    text = ''
+    for part in path:
+        if isinstance(part, int):
+            text += f'[{part}]'
+        else:
+            text += f'.{part}' if text else str(part)
+    return text or '(top level)'
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def compile_schema(schema):
+    """Compile a schema into check(value, path, errors)."""
+    unsupported = set(schema) - ANNOTATIONS - {
+        'type', 'enum', 'minimum', 'maximum', 'minLength', 'pattern', 'minItems',
+        'items', 'properties', 'required', 'additionalProperties'}
+    if unsupported:
+        raise ValueError(f"Unsupported schema keywords: {', '.join(sorted(unsupported))}")
+
+    checks = []
+
+    types = schema.get('type')
+    if types is not None:
+        types = [types] if isinstance(types, str) else types
+        type_checks = [JSON_TYPES[name] for name in types]
+        expected = ' or '.join(types)
+
+    if 'enum' in schema:
+        allowed = schema['enum']
+
+        def check_enum(value, path, errors):
+            if value not in allowed:
+                errors.append((path, f"must be one of {', '.join(map(str, allowed))}, got {value!r}"))
+        checks.append(check_enum)
+
+    if 'minimum' in schema or 'maximum' in schema:
+        low = schema.get('minimum')
+        high = schema.get('maximum')
+
+        def check_range(value, path, errors):
+            if _is_number(value) and ((low is not None and value < low)
+                                      or (high is not None and value > high)):
+                if low is not None and high is not None:
+                    errors.append((path, f"must be between {low} and {high}, got {value}"))
+                elif low is not None:
+                    errors.append((path, f"must be at least {low}, got {value}"))
+                else:
+                    errors.append((path, f"must be at most {high}, got {value}"))
+        checks.append(check_range)
+
+    if 'minLength' in schema:
+        min_length = schema['minLength']
+
+        def check_length(value, path, errors):
+            if isinstance(value, str) and len(value) < min_length:
+                errors.append((path, "must not be empty" if min_length == 1
+                               else f"must be at least {min_length} characters"))
+        checks.append(check_length)
+
+    if 'pattern' in schema:
+        pattern = re.compile(schema['pattern'])
+
+        def check_pattern(value, path, errors):
+            if isinstance(value, str) and not pattern.search(value):
+                errors.append((path, f"{value!r} does not match {pattern.pattern}"))
+        checks.append(check_pattern)
+
+    if 'minItems' in schema:
+        min_items = schema['minItems']
+
+        def check_min_items(value, path, errors):
+            if isinstance(value, list) and len(value) < min_items:
+                errors.append((path, f"must have at least {min_items} item(s)"))
+        checks.append(check_min_items)
+
+    if 'items' in schema:
+        check_item = compile_schema(schema['items'])
+
+        def check_items(value, path, errors):
+            if isinstance(value, list):
+                for index, item in enumerate(value):
+                    check_item(item, path + (index,), errors)
+        checks.append(check_items)
+
+    if 'properties' in schema or 'required' in schema or 'additionalProperties' in schema:
+        properties = {name: compile_schema(sub)
+                      for name, sub in schema.get('properties', {}).items()}
+        required = schema.get('required', [])
+        additional = schema.get('additionalProperties', True)
+        check_additional = compile_schema(additional) if isinstance(additional, dict) else None
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                return
+            for name in required:
+                if name not in value:
+                    errors.append((path, f"missing required key '{name}'"))
+            for name, item in value.items():
+                check = properties.get(name)
+                if check is not None:
+                    check(item, path + (name,), errors)
+                elif check_additional is not None:
+                    check_additional(item, path + (name,), errors)
+                elif additional is False:
+                    errors.append((path + (name,), "unknown key"))
+        checks.append(check_object)
+
+    def check(value, path, errors):
+        if types is not None and not any(type_check(value) for type_check in type_checks):
+            message = f"must be {expected}, got {type(value).__name__}"
+            if 'string' in types and _is_number(value):
+                message += " (quote the value in YAML)"
+            errors.append((path, message))
+            return
+        for sub_check in checks:
+            sub_check(value, path, errors)
+
+    return check
+
+
+_validator = None
+
+
+def config_validator():
+    """Return the compiled validator for the configuration schema."""
+    global _validator
+    if _validator is None:
+        with open(SCHEMA_PATH, 'r') as f:
+            _validator = compile_schema(json.load(f))
+    return _validator
+
+
+def schema_errors(config):
+    """Return [(path, message)] for everything in config the schema rejects."""
+    errors = []
+    config_validator()(config, (), errors)
+    return errors
+
+
+def read_config(config_path):
+    """Parse a YAML config file; return (config, node tree).
+
+    Raises ConfigError if the file cannot be read or parsed.
+    """
+    try:
+        with open(config_path, 'r') as f:
+            loader = SafeLoader(f)
+            try:
+                node = loader.get_single_node()
+                config = loader.construct_document(node) if node is not None else None
+            finally:
+                loader.dispose()
+    except FileNotFoundError:
+        raise ConfigError(config_path, ["Configuration file not found"]) from None
+    except OSError as e:
+        raise ConfigError(config_path, [f"Cannot read configuration file: {e.strerror}"]) from None
+    except yaml.YAMLError as e:
+        mark = getattr(e, 'problem_mark', None)
+        where = f"line {mark.line + 1}: " if mark is not None else ''
+        problem = getattr(e, 'problem', None) or str(e)
+        raise ConfigError(config_path, [f"{where}Invalid YAML: {problem}"]) from None
+    return config, node
+
+
+def node_line(node, path):
+    """Return the 1-based line of the value at path, or of its nearest parent."""
+    if node is None:
+        return None
+    line = node.start_mark.line + 1
+    for part in path:
+        if isinstance(node, yaml.MappingNode):
+            for key_node, value_node in node.value:
+                if key_node.value == part:
+                    node = value_node
+                    break
+            else:
+                return line
+        elif isinstance(node, yaml.SequenceNode) and isinstance(part, int) \
+                and part < len(node.value):
+            node = node.value[part]
+        else:
+            return line
+        line = node.start_mark.line + 1
+    return line
+
+
+def format_errors(errors, node=None):
+    """Format [(path, message)] as 'line N: path: message' strings, in file order."""
+    located = [(node_line(node, path), format_path(path), message) for path, message in errors]
+    located.sort(key=lambda item: item[0] or 0)
+    return [f"line {line}: {path}: {message}" if line else f"{path}: {message}"
+            for line, path, message in located]
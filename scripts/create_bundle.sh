@@ -7,6 +7,8 @@ set -euo pipefail
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 CONFIG_JSON="${1:-config.json}"
 OUTPUT_BASE_DIR="${2:-output}"
+# Optional manifest of the last delivered bundle; builds a delta bundle
+DELTA_BASE_MANIFEST="${3:-}"
 
 echo "=== Bundle Creator ==="
 echo "Config: $CONFIG_JSON"
@@ -16,7 +18,15 @@ echo ""
 # Parse output configuration
 TARBALL_NAME=$(jq -r '.output.tarball_name // "resources-bundle"' "$CONFIG_JSON")
 COMPRESSION=$(jq -r '.output.compression // "gzip"' "$CONFIG_JSON")
+COMPRESSION_LEVEL=$(jq -r '.output.compression_level // ""' "$CONFIG_JSON")
+COMPRESSION_THREADS=$(jq -r '.output.compression_threads // 0' "$CONFIG_JSON")
+ZSTD_LONG=$(jq -r 'if .output.zstd_long == true then 27 else (.output.zstd_long // "") end | tostring' "$CONFIG_JSON")
 SPLIT_SIZE=$(jq -r '.output.split_size // "0"' "$CONFIG_JSON")
+LAYOUT=$(jq -r '.output.layout // "solid"' "$CONFIG_JSON")
+STAGING_MODE=$(jq -r '.output.staging // "link"' "$CONFIG_JSON")
+if [ -z "$DELTA_BASE_MANIFEST" ]; then
+    DELTA_BASE_MANIFEST=$(jq -r '.output.delta_base_manifest // ""' "$CONFIG_JSON")
+fi
 
 # Parse security configuration
 GENERATE_CHECKSUMS=$(jq -r '.security.generate_checksums // true' "$CONFIG_JSON")
@@ -27,8 +37,11 @@ ENV_NAME=$(jq -r '.metadata.environment_name // "default"' "$CONFIG_JSON")
 ENV_DESC=$(jq -r '.metadata.description // ""' "$CONFIG_JSON")
 
 echo "Bundle name: $TARBALL_NAME"
-echo "Compression: $COMPRESSION"
+echo "Compression: $COMPRESSION (level: ${COMPRESSION_LEVEL:-default}, threads: $COMPRESSION_THREADS)"
+echo "Layout: $LAYOUT"
+echo "Staging: $STAGING_MODE"
 echo "Split size: $SPLIT_SIZE"
+echo "Delta base manifest: ${DELTA_BASE_MANIFEST:-none (full bundle)}"
 echo "Generate checksums: $GENERATE_CHECKSUMS"
 echo "Checksum algorithm: $CHECKSUM_ALGORITHM"
 echo ""
@@ -43,14 +56,31 @@ mkdir -p "$STAGING_DIR"
 
 echo "Creating bundle staging area: $STAGING_DIR"
 
-# Copy collected resources to staging
+# Stage collected resources, hashing each file once. Files are hardlinked
+# (or reflinked) by default and copied only across filesystems; with
+# "reference" they stay in place and the bundler reads them from the file list
+FILE_LIST="$(cd "$OUTPUT_BASE_DIR" && pwd)/bundle-files.json"
+rm -f "$FILE_LIST"
+STAGE_SOURCES=()
 for source in npm pypi debian rpm containers vscode; do
     SOURCE_DIR="$OUTPUT_BASE_DIR/$source"
     if [ -d "$SOURCE_DIR" ]; then
         echo "  Including: $source"
-        cp -r "$SOURCE_DIR" "$STAGING_DIR/"
+        STAGE_SOURCES+=(--source "$source=$SOURCE_DIR")
     fi
 done
+if [ "${#STAGE_SOURCES[@]}" -gt 0 ]; then
+    python3 "$SCRIPT_DIR/bundle_manifest.py" stage \
+        --staging-dir "$STAGING_DIR" \
+        --bundle-name "$BUNDLE_NAME" \
+        --mode "$STAGING_MODE" \
+        --file-list "$FILE_LIST" \
+        "${STAGE_SOURCES[@]}"
+fi
+FILE_LIST_ARGS=()
+if [ -f "$FILE_LIST" ]; then
+    FILE_LIST_ARGS=(--file-list "$FILE_LIST")
+fi
 
 # Create bundle metadata file
 cat > "$STAGING_DIR/BUNDLE_INFO.txt" << EOF
@@ -69,7 +99,7 @@ EOF
 # List contents
 for source in npm pypi debian rpm containers vscode; do
     if [ -d "$STAGING_DIR/$source" ]; then
-        echo "  - $source: $(du -sh "$STAGING_DIR/$source" | cut -f1)" >> "$STAGING_DIR/BUNDLE_INFO.txt"
+        echo "  - $source: $(du -sh "$OUTPUT_BASE_DIR/$source" | cut -f1)" >> "$STAGING_DIR/BUNDLE_INFO.txt"
     fi
 done
 
@@ -267,96 +297,98 @@ If you encounter issues:
 For more information, see individual component README files.
 EOF
 
-echo "Staging complete. Bundle size: $(du -sh "$STAGING_DIR" | cut -f1)"
+echo "Staging complete. Bundle size: $(jq '[.files[].size] | add // 0' "$STAGING_DIR/MANIFEST.json" | numfmt --to=iec)"
 echo ""
 
-# Create tarball
-cd "$OUTPUT_BASE_DIR"
-TARBALL_FILE="${BUNDLE_NAME}.tar"
+# Complete the per-file manifest with the files written above (staged files
+# were hashed while copying); keep a copy next to the bundle so the next run
+# can build a delta against it
+echo "Generating bundle manifest..."
+python3 "$SCRIPT_DIR/bundle_manifest.py" generate "$STAGING_DIR" \
+    --bundle-name "$BUNDLE_NAME" \
+    --reuse "$STAGING_DIR/MANIFEST.json" \
+    "${FILE_LIST_ARGS[@]}"
+cp "$STAGING_DIR/MANIFEST.json" "$OUTPUT_BASE_DIR/${BUNDLE_NAME}.manifest.json"
+echo "Manifest: $OUTPUT_BASE_DIR/${BUNDLE_NAME}.manifest.json"
+echo ""
 
-echo "Creating tarball: $TARBALL_FILE"
+# Pack only new or changed files when a base manifest is given
+PACK_DIR="bundle-staging"
+TARBALL_FILE="${BUNDLE_NAME}.tar"
+if [ -n "$DELTA_BASE_MANIFEST" ]; then
+    echo "Creating delta against: $DELTA_BASE_MANIFEST"
+    python3 "$SCRIPT_DIR/bundle_manifest.py" delta \
+        --staging-dir "$STAGING_DIR" \
+        --base-manifest "$DELTA_BASE_MANIFEST" \
+        --manifest "$STAGING_DIR/MANIFEST.json" \
+        "${FILE_LIST_ARGS[@]}" \
+        --output "$OUTPUT_BASE_DIR/bundle-delta" \
+        --bundle-name "$BUNDLE_NAME"
+    echo "Delta size: $(du -sh "$OUTPUT_BASE_DIR/bundle-delta" | cut -f1)"
+    echo ""
+    PACK_DIR="bundle-delta"
+    TARBALL_FILE="${BUNDLE_NAME}-delta.tar"
+    # The delta tree holds its own files; nothing is referenced in place
+    FILE_LIST_ARGS=()
+fi
 
-tar -cf "$TARBALL_FILE" bundle-staging/
+# Create the bundle in a single streaming pass: tar, compression, splitting
+# and checksums happen together, without an intermediate uncompressed tarball
+cd "$OUTPUT_BASE_DIR"
 
-# Apply compression
 case "$COMPRESSION" in
-    gzip)
-        echo "Compressing with gzip..."
-        gzip -f "$TARBALL_FILE"
-        FINAL_FILE="${TARBALL_FILE}.gz"
-        ;;
-    bzip2)
-        echo "Compressing with bzip2..."
-        bzip2 -f "$TARBALL_FILE"
-        FINAL_FILE="${TARBALL_FILE}.bz2"
-        ;;
-    xz)
-        echo "Compressing with xz..."
-        xz -f "$TARBALL_FILE"
-        FINAL_FILE="${TARBALL_FILE}.xz"
-        ;;
-    none)
-        echo "No compression applied"
-        FINAL_FILE="$TARBALL_FILE"
-        ;;
+    gzip) FINAL_FILE="${TARBALL_FILE}.gz" ;;
+    bzip2) FINAL_FILE="${TARBALL_FILE}.bz2" ;;
+    xz) FINAL_FILE="${TARBALL_FILE}.xz" ;;
+    zstd) FINAL_FILE="${TARBALL_FILE}.zst" ;;
+    none) FINAL_FILE="$TARBALL_FILE" ;;
     *)
         echo "Unknown compression: $COMPRESSION, using gzip"
-        gzip -f "$TARBALL_FILE"
+        COMPRESSION="gzip"
         FINAL_FILE="${TARBALL_FILE}.gz"
         ;;
 esac
 
-echo "Bundle created: $FINAL_FILE"
-echo "Size: $(du -sh "$FINAL_FILE" | cut -f1)"
+case "$CHECKSUM_ALGORITHM" in
+    sha256|sha512|md5) ;;
+    *)
+        echo "Unknown checksum algorithm: $CHECKSUM_ALGORITHM, using sha256"
+        CHECKSUM_ALGORITHM="sha256"
+        ;;
+esac
 
-# Generate checksums
-if [ "$GENERATE_CHECKSUMS" = "true" ]; then
-    echo ""
-    echo "Generating checksums..."
-
-    case "$CHECKSUM_ALGORITHM" in
-        sha256)
-            sha256sum "$FINAL_FILE" > "${FINAL_FILE}.sha256"
-            echo "SHA256: $(cat "${FINAL_FILE}.sha256")"
-            ;;
-        sha512)
-            sha512sum "$FINAL_FILE" > "${FINAL_FILE}.sha512"
-            echo "SHA512: $(cat "${FINAL_FILE}.sha512")"
-            ;;
-        md5)
-            md5sum "$FINAL_FILE" > "${FINAL_FILE}.md5"
-            echo "MD5: $(cat "${FINAL_FILE}.md5")"
-            ;;
-        *)
-            echo "Unknown checksum algorithm: $CHECKSUM_ALGORITHM, using sha256"
-            sha256sum "$FINAL_FILE" > "${FINAL_FILE}.sha256"
-            echo "SHA256: $(cat "${FINAL_FILE}.sha256")"
-            ;;
-    esac
+if [ "$SPLIT_SIZE" = "" ]; then
+    SPLIT_SIZE="0"
 fi
 
-# Handle splitting if requested
-if [ "$SPLIT_SIZE" != "0" ] && [ "$SPLIT_SIZE" != "" ]; then
-    echo ""
-    echo "Splitting bundle into $SPLIT_SIZE chunks..."
+BUNDLER_ARGS=(
+    --output "$FINAL_FILE"
+    --compression "$COMPRESSION"
+    --threads "$COMPRESSION_THREADS"
+    --split-size "$SPLIT_SIZE"
+    --layout "$LAYOUT"
+    "${FILE_LIST_ARGS[@]}"
+    --checksum-algorithm "$CHECKSUM_ALGORITHM"
+)
+if [ -n "$COMPRESSION_LEVEL" ]; then
+    BUNDLER_ARGS+=(--level "$COMPRESSION_LEVEL")
+fi
+if [ "$COMPRESSION" = "zstd" ] && [ -n "$ZSTD_LONG" ] && [ "$ZSTD_LONG" != "false" ]; then
+    BUNDLER_ARGS+=(--zstd-long "$ZSTD_LONG")
+fi
+if [ "$GENERATE_CHECKSUMS" != "true" ]; then
+    BUNDLER_ARGS+=(--no-checksums)
+fi
 
-    split -b "$SPLIT_SIZE" -d "$FINAL_FILE" "${FINAL_FILE}.part-"
+echo "Creating bundle: $FINAL_FILE"
+python3 "$SCRIPT_DIR/bundler.py" "$PACK_DIR" "${BUNDLER_ARGS[@]}"
 
+# Handle splitting if requested
+if [ "$SPLIT_SIZE" != "0" ]; then
+    echo ""
     echo "Split files created:"
     ls -lh "${FINAL_FILE}.part-"*
 
-    # Generate checksums for split files
-    if [ "$GENERATE_CHECKSUMS" = "true" ]; then
-        echo "Generating checksums for split files..."
-        for part in "${FINAL_FILE}.part-"*; do
-            case "$CHECKSUM_ALGORITHM" in
-                sha256) sha256sum "$part" >> "${FINAL_FILE}.parts.sha256" ;;
-                sha512) sha512sum "$part" >> "${FINAL_FILE}.parts.sha512" ;;
-                md5) md5sum "$part" >> "${FINAL_FILE}.parts.md5" ;;
-            esac
-        done
-    fi
-
     # Create reassembly instructions
     cat > "${BUNDLE_NAME}-reassemble.sh" << 'REASSEMBLE_EOF'
 #!/bin/bash
@@ -397,7 +429,7 @@ else
     echo "Warning: No checksum file found for verification"
 fi
 
-echo "Done! You can now extract: tar -xzf $BASE_NAME"
+echo "Done! You can now extract: tar -xf $BASE_NAME"
 REASSEMBLE_EOF
 
     chmod +x "${BUNDLE_NAME}-reassemble.sh"
@@ -412,13 +444,24 @@ echo "Bundle file: $OUTPUT_BASE_DIR/$FINAL_FILE"
 if [ "$GENERATE_CHECKSUMS" = "true" ]; then
     echo "Checksum file: $OUTPUT_BASE_DIR/${FINAL_FILE}.${CHECKSUM_ALGORITHM}"
 fi
-if [ "$SPLIT_SIZE" != "0" ] && [ "$SPLIT_SIZE" != "" ]; then
+if [ "$SPLIT_SIZE" != "0" ]; then
     echo "Split files: $OUTPUT_BASE_DIR/${FINAL_FILE}.part-*"
     echo "Reassembly script: $OUTPUT_BASE_DIR/${BUNDLE_NAME}-reassemble.sh"
 fi
 echo ""
-echo "Total size: $(du -sh "$FINAL_FILE" | cut -f1)"
+if [ "$SPLIT_SIZE" != "0" ]; then
+    echo "Total size: $(du -ch "${FINAL_FILE}.part-"* | tail -1 | cut -f1)"
+else
+    echo "Total size: $(du -sh "$FINAL_FILE" | cut -f1)"
+fi
 echo ""
 echo "To extract on disconnected system:"
-echo "  tar -xzf $FINAL_FILE"
+echo "  tar -xf $FINAL_FILE"
+if [ "$COMPRESSION" = "zstd" ] && [ -n "$ZSTD_LONG" ] && [ "$ZSTD_LONG" != "false" ] && [ "$ZSTD_LONG" -gt 27 ]; then
+    echo "  (or: zstd -d --long=$ZSTD_LONG -c $FINAL_FILE | tar -xf -)"
+fi
+if [ "$PACK_DIR" = "bundle-delta" ]; then
+    echo "Then rebuild the full tree from the previous bundle:"
+    echo "  python3 bundle-delta/apply_delta.py apply --base bundle-staging --delta bundle-delta"
+fi
 echo ""
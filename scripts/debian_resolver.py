@@ -0,0 +1,564 @@
+#!/usr/bin/env python3
+"""
+Debian/Ubuntu dependency resolution from the archive's Packages indexes.
+
+The Release file of each suite (<codename>, -updates, -security) is read
+first, from InRelease (or Release and Release.gpg) checked with gpgv
+against the distribution's archive keyring, as apt does. Then every
+Packages index it lists for the configured components and architecture is
+fetched concurrently and checked against the Release SHA256, so every
+.deb is tied to the archive signature whatever the transport. The
+packages are parsed into an in-memory index: every version of every
+package, and which packages Provide each virtual name.
+
+From the requested packages, Depends and Pre-Depends are followed to their
+full transitive closure. For each dependency:
+
+- an alternative (a | b) that is already selected satisfies it;
+- otherwise the first alternative that can be satisfied is picked;
+- a virtual name resolves to one of the packages that provides it;
+- versioned constraints compare versions as dpkg does, and the highest
+  satisfying version is chosen, as apt does with default pins.
+
+The result is one download list: pool path, size and SHA256 of every .deb,
+for a single batch fetch. Conflicts and Breaks are not evaluated; the
+closure is solved in one pass. Nothing on the host (apt, dpkg or its
+sources.list) is used, so any release and architecture can be resolved
+from any machine:
+
+    python3 debian_resolver.py --distribution ubuntu --release 22.04 \\
+        --architecture arm64 curl git
+
+A mirror signed with another key is read with --keyring. Packages can be
+pinned to one version (name=version). With a snapshot
+timestamp the indexes are read from snapshot.ubuntu.com or
+snapshot.debian.org as they were at that time, so the same request always
+resolves to the same closure:
+
+    python3 debian_resolver.py --distribution debian --release 12 \\
+        --snapshot 20240601T000000Z curl=7.88.1-10+deb12u5
+"""
+
+import argparse
+import gzip
+import hashlib
+import lzma
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from downloader import DownloadError, Downloader
+
+
+# Release numbers as configured, and the codename their suites are named after
+RELEASE_CODENAMES = {
+    'ubuntu': {'18.04': 'bionic', '20.04': 'focal', '22.04': 'jammy', '24.04': 'noble',
+               '24.10': 'oracular', '25.04': 'plucky'},
+    'debian': {'10': 'buster', '11': 'bullseye', '12': 'bookworm', '13': 'trixie'},
+}
+
+DEFAULT_MIRRORS = {
+    'ubuntu': 'http://archive.ubuntu.com/ubuntu/',
+    'debian': 'https://deb.debian.org/debian/',
+}
+
+# Keyrings the Release files are checked against (ubuntu-keyring, debian-archive-keyring)
+DEFAULT_KEYRINGS = {
+    'ubuntu': '/usr/share/keyrings/ubuntu-archive-keyring.gpg',
+    'debian': '/usr/share/keyrings/debian-archive-keyring.gpg',
+}
+
+# Ubuntu only carries these on the main archive; the rest are on ports
+UBUNTU_PORTS_MIRROR = 'http://ports.ubuntu.com/ubuntu-ports/'
+UBUNTU_ARCHIVE_ARCHITECTURES = ('amd64', 'i386')
+
+DEBIAN_SECURITY_MIRROR = 'https://deb.debian.org/debian-security/'
+
+# The archives as they were at a point in time (YYYYMMDDTHHMMSSZ)
+SNAPSHOT_MIRRORS = {
+    'ubuntu': 'https://snapshot.ubuntu.com/ubuntu/{snapshot}/',
+    'debian': 'https://snapshot.debian.org/archive/debian/{snapshot}/',
+}
+UBUNTU_PORTS_SNAPSHOT_MIRROR = 'https://snapshot.ubuntu.com/ubuntu-ports/{snapshot}/'
+DEBIAN_SECURITY_SNAPSHOT_MIRROR = 'https://snapshot.debian.org/archive/debian-security/{snapshot}/'
+
+COMPONENTS = {
+    'ubuntu': ['main', 'restricted', 'universe', 'multiverse'],
+    'debian': ['main'],
+}
+
+# Index variants in order of preference
+INDEX_COMPRESSIONS = [('.xz', lzma.decompress), ('.gz', gzip.decompress), ('', bytes)]
+
+# Fields kept for every package; the raw paragraph is kept too
+INDEX_FIELDS = ('Package', 'Version', 'Architecture', 'Filename', 'Size', 'SHA256',
+                'Depends', 'Pre-Depends', 'Provides', 'Priority', 'Multi-Arch')
+
+PRIORITY_RANK = {'required': 0, 'important': 1, 'standard': 2, 'optional': 3, 'extra': 4}
+
+RELATION_RE = re.compile(
+    r'^([a-z0-9][a-z0-9+.-]*)(?::[a-z0-9-]+)?\s*'
+    r'(?:\(\s*(<<|<=|=|>=|>>|<|>)\s*([^)\s]+)\s*\))?\s*'
+    r'(?:\[([^\]]*)\])?\s*(?:<.*>)?$')
+
+
+def release_codename(distribution, release):
+    """Map a configured release ('22.04', 12, 'bookworm') to its suite codename.
+
+    Raises ValueError for release numbers that are not known.
+    """
+    release = str(release).strip()
+    if re.match(r'^[a-z]+$', release):
+        return release
+    codenames = RELEASE_CODENAMES.get(distribution, {})
+    if distribution == 'debian':
+        release = release.split('.')[0]
+    if release not in codenames:
+        raise ValueError(f"Unknown {distribution} release {release}; "
+                         f"known: {', '.join(sorted(codenames))} or a codename")
+    return codenames[release]
+
+
+def default_sources(distribution, codename, architecture, mirror=None, snapshot=None):
+    """Return [(archive base URL, suite)] to read for one architecture.
+
+    With a snapshot, the archives are read as they were at that time from
+    snapshot.ubuntu.com or snapshot.debian.org. With a mirror, every suite
+    is read from it instead, and suites it lacks are skipped; {snapshot} in
+    the mirror URL is replaced with the snapshot.
+    """
+    suites = [codename, f"{codename}-updates", f"{codename}-security"]
+    if mirror:
+        base = mirror.replace('{snapshot}', snapshot or '')
+        base = base if base.endswith('/') else base + '/'
+        return [(base, suite) for suite in suites]
+    if distribution == 'ubuntu':
+        if architecture in UBUNTU_ARCHIVE_ARCHITECTURES:
+            base = SNAPSHOT_MIRRORS['ubuntu'] if snapshot else DEFAULT_MIRRORS['ubuntu']
+        else:
+            base = UBUNTU_PORTS_SNAPSHOT_MIRROR if snapshot else UBUNTU_PORTS_MIRROR
+        base = base.format(snapshot=snapshot)
+        return [(base, suite) for suite in suites]
+    base = SNAPSHOT_MIRRORS['debian'] if snapshot else DEFAULT_MIRRORS['debian']
+    security = DEBIAN_SECURITY_SNAPSHOT_MIRROR if snapshot else DEBIAN_SECURITY_MIRROR
+    base, security = base.format(snapshot=snapshot), security.format(snapshot=snapshot)
+    return [(base, codename), (base, f"{codename}-updates"), (security, f"{codename}-security")]
+
+
+def _order(char):
+    if char.isdigit():
+        return 0
+    if char.isalpha():
+        return ord(char)
+    if char == '~':
+        return -1
+    return ord(char) + 256
+
+
+def _verrevcmp(a, b):
+    """dpkg's comparison of one upstream version or revision string."""
+    i = j = 0
+    while i < len(a) or j < len(b):
+        first_diff = 0
+        while (i < len(a) and not a[i].isdigit()) or (j < len(b) and not b[j].isdigit()):
+            ac = _order(a[i]) if i < len(a) else 0
+            bc = _order(b[j]) if j < len(b) else 0
+            if ac != bc:
+                return ac - bc
+            i += 1
+            j += 1
+        while i < len(a) and a[i] == '0':
+            i += 1
+        while j < len(b) and b[j] == '0':
+            j += 1
+        while i < len(a) and a[i].isdigit() and j < len(b) and b[j].isdigit():
+            if not first_diff:
+                first_diff = ord(a[i]) - ord(b[j])
+            i += 1
+            j += 1
+        if i < len(a) and a[i].isdigit():
+            return 1
+        if j < len(b) and b[j].isdigit():
+            return -1
+        if first_diff:
+            return first_diff
+    return 0
+
+
+def _split_version(version):
+    epoch, _, rest = version.partition(':') if ':' in version else ('0', '', version)
+    upstream, _, revision = rest.rpartition('-') if '-' in rest else (rest, '', '')
+    return int(epoch or 0), upstream, revision
+
+
+def compare_versions(a, b):
+    """Compare two Debian versions as dpkg does: negative, zero or positive."""
+    a_epoch, a_upstream, a_revision = _split_version(a)
+    b_epoch, b_upstream, b_revision = _split_version(b)
+    if a_epoch != b_epoch:
+        return a_epoch - b_epoch
+    return _verrevcmp(a_upstream, b_upstream) or _verrevcmp(a_revision, b_revision)
+
+
+def version_satisfies(version, operator, wanted):
+    """Return True if version meets a relation such as (>= 1.2)."""
+    if operator is None:
+        return True
+    result = compare_versions(version, wanted)
+    return {'<<': result < 0, '<=': result <= 0, '<': result <= 0, '=': result == 0,
+            '>=': result >= 0, '>': result >= 0, '>>': result > 0}[operator]
+
+
+def parse_relations(value, architecture):
+    """Parse a Depends-style field into OR-groups of (name, operator, version).
+
+    Alternatives restricted to other architectures ([!amd64], [arm64]) are dropped.
+    """
+    groups = []
+    for group in (value or '').split(','):
+        alternatives = []
+        for alternative in group.split('|'):
+            alternative = alternative.strip()
+            match = RELATION_RE.match(alternative) if alternative else None
+            if match is None:
+                continue
+            name, operator, version, architectures = match.groups()
+            if architectures:
+                listed = architectures.split()
+                negated = all(item.startswith('!') for item in listed)
+                if negated == (f"!{architecture}" in listed or architecture in listed):
+                    continue
+            alternatives.append((name, operator, version))
+        if alternatives:
+            groups.append(alternatives)
+    return groups
+
+
+def parse_packages(text, base_url):
+    """Yield one record per paragraph of a Packages index."""
+    for paragraph in text.split('\n\n'):
+        paragraph = paragraph.strip('\n')
+        if not paragraph:
+            continue
+        fields = {}
+        key = None
+        for line in paragraph.split('\n'):
+            if line[:1] in (' ', '\t'):
+                continue
+            key, _, value = line.partition(':')
+            if key in INDEX_FIELDS:
+                fields[key] = value.strip()
+        if 'Package' not in fields or 'Version' not in fields or 'Filename' not in fields:
+            continue
+        yield {
+            'package': fields['Package'],
+            'version': fields['Version'],
+            'architecture': fields.get('Architecture', ''),
+            'filename': fields['Filename'],
+            'size': int(fields.get('Size') or 0),
+            'sha256': fields.get('SHA256'),
+            'depends': fields.get('Depends', ''),
+            'pre_depends': fields.get('Pre-Depends', ''),
+            'provides': fields.get('Provides', ''),
+            'priority': fields.get('Priority', 'optional'),
+            'url': base_url + fields['Filename'],
+            'control': paragraph + '\n',
+        }
+
+
+def parse_release(text):
+    """Return {path: (sha256, size)} from a Release file's SHA256 section."""
+    files = {}
+    in_sha256 = False
+    for line in text.splitlines():
+        if not line[:1].isspace():
+            in_sha256 = line.startswith('SHA256:')
+            continue
+        if in_sha256:
+            parts = line.split()
+            if len(parts) == 3:
+                files[parts[2]] = (parts[0], int(parts[1]))
+    return files
+
+
+def verify_release(keyring, signed, signature=None):
+    """Check a Release file's signature with gpgv; return the signed text.
+
+    signed is an InRelease file, or with signature a Release file and its
+    detached Release.gpg. Raises RuntimeError if gpgv or the keyring is
+    missing or the signature is not good.
+    """
+    if shutil.which('gpgv') is None:
+        raise RuntimeError("gpgv is required to check the archive's Release signatures")
+    if not os.path.isfile(keyring):
+        raise RuntimeError(f"Keyring {keyring} not found; install the distribution's "
+                           f"archive keyring or set debian.keyring")
+    with tempfile.TemporaryDirectory() as tmp:
+        signed_path = os.path.join(tmp, 'Release')
+        with open(signed_path, 'wb') as f:
+            f.write(signed)
+        command = ['gpgv', '--quiet', '--keyring', os.path.abspath(keyring)]
+        if signature is None:
+            output = os.path.join(tmp, 'Release.verified')
+            command += ['--output', output, signed_path]
+        else:
+            output = signed_path
+            with open(signed_path + '.gpg', 'wb') as f:
+                f.write(signature)
+            command += [signed_path + '.gpg', signed_path]
+        result = subprocess.run(command, capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"Bad or unknown signature: {result.stderr.strip()}")
+        with open(output, 'rb') as f:
+            return f.read()
+
+
+class PackageIndex:
+    """Every package version of one architecture, with its virtual Provides."""
+
+    def __init__(self, architecture):
+        self.architecture = architecture
+        self.packages = {}
+        self.provides = {}
+        self.seen = set()
+
+    def add(self, record):
+        key = (record['package'], record['version'], record['architecture'])
+        if key in self.seen or record['architecture'] not in (self.architecture, 'all'):
+            return
+        self.seen.add(key)
+        self.packages.setdefault(record['package'], []).append(record)
+        for group in parse_relations(record['provides'], self.architecture):
+            name, _, version = group[0]
+            self.provides.setdefault(name, []).append((record, version))
+
+    def __len__(self):
+        return len(self.seen)
+
+    def candidates(self, name, operator=None, version=None):
+        """Versions of a real package meeting a relation, highest first."""
+        matching = [record for record in self.packages.get(name, [])
+                    if version_satisfies(record['version'], operator, version)]
+        return sorted(matching, key=_version_sort_key, reverse=True)
+
+    def providers(self, name, operator=None, version=None):
+        """Packages providing a virtual name; versioned relations need versioned Provides."""
+        matching = [record for record, provided in self.provides.get(name, [])
+                    if operator is None or (provided and version_satisfies(provided, operator, version))]
+        return sorted(matching, key=lambda record: (
+            PRIORITY_RANK.get(record['priority'], len(PRIORITY_RANK)), record['package']))
+
+
+class _Version:
+    __slots__ = ('version',)
+
+    def __init__(self, version):
+        self.version = version
+
+    def __lt__(self, other):
+        return compare_versions(self.version, other.version) < 0
+
+
+def _version_sort_key(record):
+    return _Version(record['version'])
+
+
+def fetch_index(downloader, sources, architecture, components, keyring):
+    """Read every Packages index for one architecture into a PackageIndex.
+
+    The Release file of each suite is checked against keyring. Suites
+    whose Release file is missing are skipped with a note. Raises
+    RuntimeError if a Release signature is bad or no index could be read
+    at all.
+    """
+    def fetch(url):
+        try:
+            status, _, body = downloader.request(url)
+        except DownloadError:
+            # file:// mirrors report a missing suite as an error rather than a 404
+            return None
+        return body if status == 200 else None
+
+    def fetch_release(source):
+        base, suite = source
+        signed = fetch(f"{base}dists/{suite}/InRelease")
+        if signed is not None:
+            text = verify_release(keyring, signed)
+        else:
+            release = fetch(f"{base}dists/{suite}/Release")
+            if release is None:
+                return None
+            signature = fetch(f"{base}dists/{suite}/Release.gpg")
+            if signature is None:
+                raise RuntimeError(f"{base}dists/{suite} has neither InRelease nor Release.gpg")
+            text = verify_release(keyring, release, signature)
+        return parse_release(text.decode('utf-8', 'replace'))
+
+    def fetch_packages(job):
+        url, compression, expected = job
+        status, _, body = downloader.request(url)
+        if status != 200:
+            raise DownloadError(f"{url}: HTTP {status}")
+        if expected and hashlib.sha256(body).hexdigest() != expected:
+            raise DownloadError(f"{url}: SHA256 does not match the Release file")
+        return dict(INDEX_COMPRESSIONS)[compression](body).decode('utf-8', 'replace')
+
+    with ThreadPoolExecutor(max_workers=max(1, len(sources))) as executor:
+        releases = list(executor.map(fetch_release, sources))
+
+    jobs = []
+    for (base, suite), release in zip(sources, releases):
+        if release is None:
+            print(f"  Note: {base}dists/{suite} has no Release file, skipping")
+            continue
+        for component in components:
+            for arch in (architecture, 'all'):
+                path = f"{component}/binary-{arch}/Packages"
+                for compression, _ in INDEX_COMPRESSIONS:
+                    if path + compression in release:
+                        jobs.append((f"{base}dists/{suite}/{path}{compression}", compression,
+                                     release[path + compression][0]))
+                        break
+
+    if not jobs:
+        raise RuntimeError(f"No Packages indexes found for {architecture}")
+
+    index = PackageIndex(architecture)
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        texts = list(executor.map(fetch_packages, jobs))
+    for (url, _, _), text in zip(jobs, texts):
+        base = url[:url.index('dists/')]
+        for record in parse_packages(text, base):
+            index.add(record)
+    return index
+
+
+def resolve(index, names, include_deps=True, pins=None):
+    """Compute the closure of the requested packages.
+
+    pins maps package names to the only version that may be selected for
+    them, whether they are requested or pulled in as a dependency.
+
+    Returns (records sorted by package name, requested names not found,
+    [unsatisfied dependency descriptions]).
+    """
+    pins = pins or {}
+    selected = {}
+    provided = {}
+    queue = deque()
+    missing = []
+    unsatisfied = []
+
+    def select(record):
+        selected[record['package']] = record
+        for group in parse_relations(record['provides'], index.architecture):
+            name, _, version = group[0]
+            provided.setdefault(name, []).append(version)
+        queue.append(record)
+
+    def satisfied(name, operator, version):
+        record = selected.get(name)
+        if record is not None and version_satisfies(record['version'], operator, version):
+            return True
+        return any(operator is None or (provided_version and
+                                        version_satisfies(provided_version, operator, version))
+                   for provided_version in provided.get(name, []))
+
+    def allowed(record):
+        pin = pins.get(record['package'])
+        return pin is None or compare_versions(record['version'], pin) == 0
+
+    def pick(name, operator, version):
+        if name in selected:
+            # Another version of an already selected package cannot be added
+            return None
+        candidates = [record for record in index.candidates(name, operator, version)
+                      if allowed(record)]
+        if candidates:
+            return candidates[0]
+        providers = [record for record in index.providers(name, operator, version)
+                     if record['package'] not in selected and allowed(record)]
+        return providers[0] if providers else None
+
+    for name in names:
+        if name in selected:
+            continue
+        record = pick(name, None, None)
+        if record is None:
+            missing.append(f"{name}={pins[name]}" if name in pins else name)
+            continue
+        select(record)
+
+    while include_deps and queue:
+        record = queue.popleft()
+        groups = parse_relations(record['pre_depends'], index.architecture) + \
+            parse_relations(record['depends'], index.architecture)
+        for group in groups:
+            if any(satisfied(*alternative) for alternative in group):
+                continue
+            for alternative in group:
+                choice = pick(*alternative)
+                if choice is not None:
+                    select(choice)
+                    break
+            else:
+                unsatisfied.append(f"{record['package']}: " + ' | '.join(
+                    f"{name} ({operator} {version})" if operator else name
+                    for name, operator, version in group))
+
+    return sorted(selected.values(), key=lambda record: record['package']), missing, unsatisfied
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Resolve Debian/Ubuntu packages from Packages indexes')
+    parser.add_argument('packages', nargs='+', metavar='PACKAGE',
+                        help='Package name, or name=version to pin it')
+    parser.add_argument('--distribution', default='ubuntu', choices=sorted(RELEASE_CODENAMES),
+                        help='Distribution (default: ubuntu)')
+    parser.add_argument('--release', default='22.04', help='Release number or codename (default: 22.04)')
+    parser.add_argument('--architecture', default='amd64', help='Architecture (default: amd64)')
+    parser.add_argument('--mirror', help='Archive URL (http(s) or file://) to read instead of the default')
+    parser.add_argument('--keyring',
+                        help='Keyring the Release files are checked against '
+                             '(default: the distribution archive keyring)')
+    parser.add_argument('--snapshot', help='Read the archive as it was at this time (YYYYMMDDTHHMMSSZ)')
+    parser.add_argument('--no-deps', action='store_true', help='Do not resolve dependencies')
+
+    args = parser.parse_args()
+
+    try:
+        codename = release_codename(args.distribution, args.release)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+    sources = default_sources(args.distribution, codename, args.architecture, args.mirror, args.snapshot)
+    with Downloader() as downloader:
+        try:
+            index = fetch_index(downloader, sources, args.architecture, COMPONENTS[args.distribution],
+                                args.keyring or DEFAULT_KEYRINGS[args.distribution])
+        except (RuntimeError, DownloadError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    names = [spec.partition('=')[0] for spec in args.packages]
+    pins = {name: version for name, _, version in (spec.partition('=') for spec in args.packages)
+            if version}
+    records, missing, unsatisfied = resolve(index, names, not args.no_deps, pins)
+
+    for record in records:
+        print(f"{record['package']} {record['version']} {record['architecture']}  {record['filename']}")
+    for name in missing:
+        print(f"Warning: {name} not found", file=sys.stderr)
+    for description in unsatisfied:
+        print(f"Warning: unsatisfied dependency {description}", file=sys.stderr)
+    print(f"{len(records)} packages from an index of {len(index)}, "
+          f"{sum(record['size'] for record in records)} bytes", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
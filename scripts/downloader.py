@@ -0,0 +1,388 @@
+#!/usr/bin/env python3
+"""
+Concurrent file downloader for the collectors.
+
+Downloads run on a bounded thread pool. HTTP(S) connections are kept alive
+and reused per host, so fetching hundreds of files from one index does not
+pay a TCP and TLS handshake per file. Each file is written to <dest>.part
+and hashed as it streams. An interrupted transfer is resumed with an HTTP
+Range request on the next attempt, and the file is only moved into place
+once its sha256 matches the hash the index published. A resumed transfer
+starts over if the server answers with a different range, or says the
+range is unsatisfiable when there is no hash to check the file against.
+
+file:// URLs are supported, so a directory laid out as a simple index can
+stand in for the real one in tests:
+
+    python3 downloader.py --dest /tmp/out \\
+        'file:///srv/simple/files/pkg-1.0-py3-none-any.whl#sha256=<digest>'
+"""
+
+import argparse
+import base64
+import gzip
+import hashlib
+import http.client
+import os
+import re
+import ssl
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+
+DEFAULT_WORKERS = 8
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 60
+CHUNK_SIZE = 1024 * 1024
+MAX_REDIRECTS = 5
+USER_AGENT = 'disconnected-resources-downloader/1'
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-\d+/(?:\d+|\*)$')
+
+# SRI hash algorithms, strongest first
+INTEGRITY_ALGORITHMS = ['sha512', 'sha384', 'sha256', 'sha1']
+
+
+class DownloadError(Exception):
+    """A file could not be downloaded or failed verification."""
+
+
+def split_hash(url):
+    """Split a '#sha256=<digest>' fragment off a URL; return (url, digest or None)."""
+    base, _, fragment = url.partition('#')
+    if fragment.startswith('sha256='):
+        return base, fragment[len('sha256='):]
+    return base, None
+
+
+def content_range_start(value):
+    """Return the first byte offset of a Content-Range header, or None if it has none."""
+    match = CONTENT_RANGE_RE.match((value or '').strip())
+    return int(match.group(1)) if match else None
+
+
+def parse_integrity(integrity):
+    """Return (algorithm, digest bytes) for the strongest hash in an SRI string.
+
+    Raises DownloadError if it names no supported algorithm.
+    """
+    hashes = {}
+    for item in integrity.split():
+        algorithm, _, value = item.partition('-')
+        if algorithm in INTEGRITY_ALGORITHMS:
+            hashes[algorithm] = base64.b64decode(value.split('?', 1)[0])
+    for algorithm in INTEGRITY_ALGORITHMS:
+        if algorithm in hashes:
+            return algorithm, hashes[algorithm]
+    raise DownloadError(f"Unsupported integrity value: {integrity}")
+
+
+class ConnectionPool:
+    """Idle keep-alive connections, reused per (scheme, host, port)."""
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT):
+        self.timeout = timeout
+        self.context = ssl.create_default_context()
+        self.proxies = urllib.request.getproxies()
+        self.idle = {}
+        self.lock = threading.Lock()
+
+    def _proxy_for(self, scheme, host):
+        proxy = self.proxies.get(scheme)
+        if not proxy or urllib.request.proxy_bypass(host):
+            return None
+        return urllib.parse.urlsplit(proxy if '://' in proxy else f'http://{proxy}')
+
+    def connect(self, scheme, host, port):
+        """Return (connection, key, absolute_form) for a host, reusing an idle one."""
+        key = (scheme, host, port)
+        proxy = self._proxy_for(scheme, host)
+        with self.lock:
+            idle = self.idle.get(key)
+            if idle:
+                return idle.pop(), key, proxy is not None and scheme == 'http'
+
+        if scheme == 'https':
+            if proxy:
+                conn = http.client.HTTPSConnection(proxy.hostname, proxy.port or 8080,
+                                                   timeout=self.timeout, context=self.context)
+                conn.set_tunnel(host, port)
+            else:
+                conn = http.client.HTTPSConnection(host, port, timeout=self.timeout,
+                                                   context=self.context)
+            return conn, key, False
+        if proxy:
+            # Plain HTTP through a proxy sends the absolute URL to the proxy
+            conn = http.client.HTTPConnection(proxy.hostname, proxy.port or 8080,
+                                              timeout=self.timeout)
+            return conn, key, True
+        return http.client.HTTPConnection(host, port, timeout=self.timeout), key, False
+
+    def release(self, key, conn):
+        """Return a connection whose response was read completely."""
+        with self.lock:
+            self.idle.setdefault(key, []).append(conn)
+
+    def close(self):
+        with self.lock:
+            for conns in self.idle.values():
+                for conn in conns:
+                    conn.close()
+            self.idle.clear()
+
+
+class Downloader:
+    """Download files concurrently with pooled connections and resumable transfers."""
+
+    def __init__(self, workers=DEFAULT_WORKERS, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+        self.workers = workers
+        self.retries = retries
+        self.pool = ConnectionPool(timeout)
+
+    def close(self):
+        self.pool.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def fetch_all(self, jobs):
+        """Download (url, dest, sha256[, integrity]) jobs; yield (job, error or None) in order."""
+        def run(job):
+            try:
+                self.fetch(*job)
+                return job, None
+            except DownloadError as e:
+                return job, e
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            yield from executor.map(run, jobs)
+
+    def fetch(self, url, dest, sha256=None, integrity=None):
+        """Download url to dest, resuming a partial download.
+
+        The file is checked against sha256 (hex) or an SRI integrity string
+        such as npm's 'sha512-<base64>' before it is moved into place.
+        """
+        dest = Path(dest)
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        part = dest.with_name(dest.name + '.part')
+        algorithm, expected = parse_integrity(integrity) if integrity else ('sha256', None)
+
+        for attempt in range(self.retries + 1):
+            try:
+                if url.startswith('file:'):
+                    digest = self._copy_file(url, part, algorithm)
+                else:
+                    digest = self._download_http(url, part, algorithm, bool(expected or sha256))
+                break
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"{url}: {e}") from None
+                time.sleep(2 ** attempt)
+
+        if expected is not None and digest.digest() != expected:
+            part.unlink(missing_ok=True)
+            raise DownloadError(f"{dest.name}: integrity mismatch (expected {integrity})")
+        if expected is None and sha256 and digest.hexdigest() != sha256:
+            part.unlink(missing_ok=True)
+            raise DownloadError(f"{dest.name}: sha256 mismatch "
+                                f"(expected {sha256}, got {digest.hexdigest()})")
+        os.replace(part, dest)
+
+    def _copy_file(self, url, part, algorithm='sha256'):
+        """Copy a file:// URL into part; return its hash object."""
+        path = urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+        digest = hashlib.new(algorithm)
+        with open(path, 'rb') as fin, open(part, 'wb') as fout:
+            while True:
+                chunk = fin.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                fout.write(chunk)
+        return digest
+
+    def request(self, url, headers=None):
+        """GET a URL and return (status, headers, body), retrying transient errors.
+
+        Redirects are followed and any status below 500 is returned for the
+        caller to check. file:// URLs return the file's content. A gzip
+        body, sent when the caller asked for one with Accept-Encoding, is
+        decompressed.
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                if url.startswith('file:'):
+                    path = urllib.request.url2pathname(urllib.parse.urlsplit(url).path)
+                    with open(path, 'rb') as f:
+                        return 200, {}, f.read()
+                response, conn, key, url = self._open(url, headers or {})
+                try:
+                    body = response.read()
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    raise
+                self._finish(response, conn, key)
+                if response.status >= 500:
+                    raise ConnectionError(f"HTTP {response.status} {response.reason}")
+                if response.getheader('Content-Encoding') == 'gzip':
+                    body = gzip.decompress(body)
+                return response.status, response.headers, body
+            except FileNotFoundError as e:
+                raise DownloadError(f"{url}: {e.strerror}") from None
+            except (OSError, http.client.HTTPException) as e:
+                if attempt == self.retries:
+                    raise DownloadError(f"{url}: {e}") from None
+                time.sleep(2 ** attempt)
+
+    def _open(self, url, headers):
+        """Send a GET on a pooled connection, following redirects.
+
+        Returns (response, connection, pool key, final url); pass the first
+        three to _finish once the body has been read.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urllib.parse.urlsplit(url)
+            port = parts.port or (443 if parts.scheme == 'https' else 80)
+            conn, key, absolute = self.pool.connect(parts.scheme, parts.hostname, port)
+            target = url if absolute else (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+            try:
+                conn.request('GET', target, headers={'User-Agent': USER_AGENT,
+                                                     'Accept-Encoding': 'identity', **headers})
+                response = conn.getresponse()
+            except (OSError, http.client.HTTPException):
+                # A kept-alive connection may have been closed by the server
+                conn.close()
+                raise
+
+            if response.status in (301, 302, 303, 307, 308):
+                response.read()
+                self._finish(response, conn, key)
+                location = response.getheader('Location')
+                if not location:
+                    raise DownloadError(f"{url}: HTTP {response.status} redirect without a Location")
+                url = urllib.parse.urljoin(url, location)
+                continue
+            return response, conn, key, url
+
+        raise DownloadError(f"{url}: too many redirects")
+
+    def _finish(self, response, conn, key):
+        """Return a connection to the pool after its response was read."""
+        if response.will_close:
+            conn.close()
+        else:
+            self.pool.release(key, conn)
+
+    def _download_http(self, url, part, algorithm='sha256', verified=False):
+        """Download an http(s) URL into part, resuming what is already there.
+
+        verified tells whether the caller checks the result against a hash;
+        without one, a partial file the server will not extend is fetched
+        again rather than trusted. Returns the hash object of the whole file.
+        """
+        digest = hashlib.new(algorithm)
+        offset = 0
+        if part.exists():
+            # Hash what is already on disk so the digest covers the whole file
+            with open(part, 'rb') as f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    offset += len(chunk)
+
+        response, conn, key, url = self._open(url, {'Range': f'bytes={offset}-'} if offset else {})
+
+        # A range other than the one asked for cannot be appended, and a
+        # 416 for a file that is stale or too long is only safe with a hash
+        start = content_range_start(response.getheader('Content-Range'))
+        if offset and ((response.status == 416 and not verified) or
+                       (response.status == 206 and start != offset)):
+            conn.close()
+            part.unlink()
+            digest = hashlib.new(algorithm)
+            offset = 0
+            response, conn, key, url = self._open(url, {})
+
+        if response.status == 416 and offset:
+            # Nothing left to fetch: the partial file should be complete, which fetch checks
+            response.read()
+            self._finish(response, conn, key)
+            return digest
+
+        if response.status == 206 and content_range_start(response.getheader('Content-Range')) != offset:
+            conn.close()
+            raise DownloadError(f"{url}: unexpected Content-Range "
+                                f"{response.getheader('Content-Range')} for offset {offset}")
+
+        if response.status not in (200, 206):
+            response.read()
+            self._finish(response, conn, key)
+            if response.status >= 500:
+                # Server errors are often transient, so let fetch retry
+                raise ConnectionError(f"HTTP {response.status} {response.reason}")
+            raise DownloadError(f"{url}: HTTP {response.status} {response.reason}")
+
+        if response.status == 200 and offset:
+            # The server ignored the Range header; start over
+            digest = hashlib.new(algorithm)
+            offset = 0
+
+        try:
+            with open(part, 'ab' if offset else 'wb') as f:
+                while True:
+                    chunk = response.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    f.write(chunk)
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            raise
+        self._finish(response, conn, key)
+        return digest
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Download files concurrently and verify them')
+    parser.add_argument('urls', nargs='+', metavar='URL',
+                        help="URL to fetch; a '#sha256=<digest>' fragment is verified")
+    parser.add_argument('--dest', required=True, help='Directory to download into')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Files downloaded at once (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f'Attempts per file after the first (default: {DEFAULT_RETRIES})')
+
+    args = parser.parse_args()
+
+    jobs = []
+    for url in args.urls:
+        url, sha256 = split_hash(url)
+        filename = urllib.parse.unquote(urllib.parse.urlsplit(url).path.rsplit('/', 1)[-1])
+        jobs.append((url, Path(args.dest) / filename, sha256))
+
+    failures = 0
+    with Downloader(args.workers, args.retries) as downloader:
+        for (url, dest, _), error in downloader.fetch_all(jobs):
+            if error is None:
+                print(f"Downloaded: {dest.name}")
+            else:
+                print(f"Error: {error}", file=sys.stderr)
+                failures += 1
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
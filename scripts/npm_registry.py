@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Static, read-only npm registry metadata for the collected tarballs.
+
+Every tarball in the content-addressed store (tarballs/) is opened once to
+read its package.json, and one packument is written per package:
+
+    registry/<name>/index.json     (registry/@scope/name/index.json)
+
+Each lists the bundled versions with their dependencies, dist.tarball and
+dist.integrity, in the form npm reads from a registry. Tarball URLs are
+<base URL>tarballs/<store name>. serve_registry.py serves this layout and
+rewrites those URLs to whatever host it is reached on, so npm can install
+from the bundle without publishing anything.
+
+What was read from each tarball is kept in registry/.registry-state.json.
+Store entries never change, so a rebuild only opens new tarballs and only
+rewrites the packuments of packages that gained or lost versions.
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import shutil
+import sys
+import tarfile
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from artifact_cache import write_if_changed
+from npm_semver import version_key
+
+
+STATE_FILE = '.registry-state.json'
+STATE_VERSION = 1
+
+DEFAULT_BASE_URL = 'http://localhost:4873/'
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+# package.json fields npm needs to resolve and install a version
+VERSION_FIELDS = [
+    'name', 'version', 'description', 'license', 'deprecated',
+    'dependencies', 'optionalDependencies', 'peerDependencies', 'peerDependenciesMeta',
+    'bundleDependencies', 'bundledDependencies', 'bin', 'directories', 'engines', 'os', 'cpu',
+]
+
+INSTALL_SCRIPTS = ('preinstall', 'install', 'postinstall')
+
+STORE_NAME_RE = re.compile(r'^(sha512|sha384|sha256|sha1)-([0-9a-f]+)\.tgz$')
+
+
+def store_integrity(filename):
+    """Return the SRI integrity string a store file name encodes, or None."""
+    match = STORE_NAME_RE.match(filename)
+    if match is None:
+        return None
+    digest = bytes.fromhex(match.group(2))
+    return f"{match.group(1)}-{base64.b64encode(digest).decode()}"
+
+
+def read_package(path):
+    """Return the registry version entry for a tarball, without dist, or None."""
+    manifest = None
+    shrinkwrap = False
+    try:
+        with tarfile.open(path, 'r:gz') as archive:
+            for member in archive:
+                # npm tarballs hold one top-level directory, usually package/
+                parts = member.name.lstrip('./').split('/')
+                if len(parts) != 2 or not member.isfile():
+                    continue
+                if parts[1] == 'package.json' and manifest is None:
+                    manifest = json.load(archive.extractfile(member))
+                elif parts[1] == 'npm-shrinkwrap.json':
+                    shrinkwrap = True
+    except (OSError, tarfile.TarError, ValueError, EOFError):
+        return None
+    if not isinstance(manifest, dict) or not manifest.get('name') or not manifest.get('version'):
+        return None
+
+    entry = {field: manifest[field] for field in VERSION_FIELDS if field in manifest}
+    if isinstance(entry.get('bin'), str):
+        entry['bin'] = {entry['name'].split('/')[-1]: entry['bin']}
+    scripts = manifest.get('scripts') or {}
+    entry['hasInstallScript'] = any(script in scripts for script in INSTALL_SCRIPTS)
+    entry['_hasShrinkwrap'] = shrinkwrap
+    return entry
+
+
+def packument(name, versions, base_url):
+    """Return the packument for one package, given {version: (store name, entry)}."""
+    document = {'name': name, 'dist-tags': {}, 'versions': {}}
+    for version in sorted(versions, key=version_key):
+        filename, entry = versions[version]
+        document['versions'][version] = dict(entry, dist={
+            'tarball': f"{base_url}tarballs/{filename}",
+            'integrity': store_integrity(filename),
+        })
+    releases = [version for version in document['versions'] if '-' not in version]
+    document['dist-tags']['latest'] = (releases or list(document['versions']))[-1]
+    return json.dumps(document, indent=2) + '\n'
+
+
+def build_registry(npm_dir, base_url=DEFAULT_BASE_URL, workers=DEFAULT_WORKERS):
+    """Build or update registry/ for the tarballs under npm_dir.
+
+    Returns (tarballs, packages, packages rewritten).
+    """
+    npm_dir = Path(npm_dir)
+    tarballs_dir = npm_dir / 'tarballs'
+    registry_dir = npm_dir / 'registry'
+    registry_dir.mkdir(parents=True, exist_ok=True)
+    state_path = registry_dir / STATE_FILE
+    if not base_url.endswith('/'):
+        base_url += '/'
+
+    previous = {}
+    rewrite_all = True
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            previous = state['files']
+            rewrite_all = state.get('base_url') != base_url
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Store entries are named by their hash, so a known one is never read again
+    current = {}
+    stale = []
+    for path in sorted(tarballs_dir.glob('*.tgz')):
+        if store_integrity(path.name) is None:
+            print(f"  Warning: Skipping {path.name}: not a store entry")
+        elif path.name in previous:
+            current[path.name] = previous[path.name]
+        else:
+            stale.append(path.name)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for filename, entry in zip(stale, executor.map(
+                lambda name: read_package(tarballs_dir / name), stale)):
+            if entry is None:
+                print(f"  Warning: Skipping {filename}: no usable package.json")
+                continue
+            current[filename] = entry
+
+    packages = {}
+    for filename, entry in current.items():
+        packages.setdefault(entry['name'], {})[entry['version']] = (filename, entry)
+
+    changed = {current[name]['name'] for name in stale if name in current}
+    changed |= {entry['name'] for name, entry in previous.items() if name not in current}
+    changed |= {name for name in packages
+                if rewrite_all or not (registry_dir / name / 'index.json').exists()}
+
+    for name in sorted(changed):
+        package_dir = registry_dir / name
+        if name not in packages:
+            shutil.rmtree(package_dir, ignore_errors=True)
+            continue
+        package_dir.mkdir(parents=True, exist_ok=True)
+        write_if_changed(package_dir / 'index.json', packument(name, packages[name], base_url))
+
+    tmp = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': STATE_VERSION, 'base_url': base_url, 'files': current},
+                  f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+
+    return len(current), len(packages), len(changed)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Build static npm registry metadata')
+    parser.add_argument('npm_dir', help='npm output directory holding tarballs/')
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL,
+                        help=f'URL the npm directory will be served at (default: {DEFAULT_BASE_URL})')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Tarballs read at once (default: {DEFAULT_WORKERS})')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(os.path.join(args.npm_dir, 'tarballs')):
+        print(f"Error: {args.npm_dir} has no tarballs/ directory", file=sys.stderr)
+        sys.exit(1)
+    tarballs, packages, rewritten = build_registry(args.npm_dir, args.base_url, args.workers)
+    print(f"Registry metadata for {tarballs} tarballs in {packages} packages "
+          f"({rewritten} packuments updated)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+npm dependency resolution from registry packuments, without npm.
+
+Every package's packument is fetched at most once per run, and
+concurrently: as soon as a version is picked, the packuments of its
+dependencies are requested in the background, up to a concurrency limit,
+while the tree is built in order. Packuments are kept in a cache directory
+with their ETag and Last-Modified headers. A later run revalidates them
+with If-None-Match / If-Modified-Since, and an unchanged packument costs a
+304 response instead of a download.
+
+The tree is laid out the way npm lays out node_modules: each dependency is
+placed as high as it can go without shadowing a version another package
+already resolved to, and nested under its dependent otherwise. The result
+is a lockfileVersion 3 package-lock.json, so collect_npm.py treats it
+exactly like one written by `npm install --package-lock-only
+--legacy-peer-deps`. Only registry dependencies (ranges, tags and npm:
+aliases) are supported.
+
+Any directory or server with one packument per package can stand in for
+the registry, for example the output of npm_registry.py served by
+serve_registry.py:
+
+    python3 npm_resolver.py --registry http://localhost:4873/ express@^4
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import sys
+import threading
+import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from downloader import DownloadError, Downloader
+from npm_registry import VERSION_FIELDS
+from npm_semver import is_range, parse_range, parse_version, satisfies, version_key
+
+
+DEFAULT_REGISTRY = 'https://registry.npmjs.org/'
+
+DEFAULT_CONCURRENCY = 16
+
+# The abbreviated packument npm itself installs from, falling back to the full one
+PACKUMENT_ACCEPT = 'application/vnd.npm.install-v1+json; q=1.0, application/json; q=0.8, */*'
+
+CACHE_VERSION = 1
+
+
+def registry_url():
+    """Return the registry npm would use: $npm_config_registry or the public one."""
+    url = (os.environ.get('npm_config_registry') or os.environ.get('NPM_CONFIG_REGISTRY')
+           or DEFAULT_REGISTRY)
+    return url if url.endswith('/') else url + '/'
+
+
+def slim_packument(packument):
+    """Keep only what resolution needs from a packument."""
+    versions = {}
+    for version, manifest in (packument.get('versions') or {}).items():
+        entry = {field: manifest[field] for field in VERSION_FIELDS if field in manifest}
+        for field in ('hasInstallScript', '_hasShrinkwrap'):
+            if field in manifest:
+                entry[field] = manifest[field]
+        dist = manifest.get('dist') or {}
+        entry['dist'] = {key: dist[key] for key in ('tarball', 'integrity', 'shasum') if key in dist}
+        versions[version] = entry
+    return {'name': packument.get('name'), 'dist-tags': packument.get('dist-tags') or {},
+            'versions': versions}
+
+
+class RegistryClient:
+    """Fetches packuments concurrently, once each, through an on-disk revalidating cache."""
+
+    def __init__(self, downloader, registry=None, cache_dir=None, concurrency=DEFAULT_CONCURRENCY):
+        self.downloader = downloader
+        self.registry = registry or registry_url()
+        if not self.registry.endswith('/'):
+            self.registry += '/'
+        self.cache_dir = None
+        if cache_dir is not None:
+            # One directory per registry, so stand-ins never mix with the real one
+            key = hashlib.sha256(self.registry.encode()).hexdigest()[:16]
+            self.cache_dir = Path(cache_dir) / key
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=max(1, concurrency))
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.stats = {'fetched': 0, 'revalidated': 0}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    def prefetch(self, names):
+        """Start fetching packuments that have not been requested yet."""
+        with self.lock:
+            for name in names:
+                if name not in self.futures:
+                    self.futures[name] = self.executor.submit(self._load, name)
+
+    def packument(self, name):
+        """Return a package's slimmed packument, or None if the registry has no such package.
+
+        Raises RuntimeError if it cannot be fetched.
+        """
+        self.prefetch([name])
+        try:
+            return self.futures[name].result()
+        except DownloadError as e:
+            raise RuntimeError(f"Cannot fetch {name}: {e}") from None
+
+    def _load(self, name):
+        url = self.registry + urllib.parse.quote(name, safe='@')
+        path = self.cache_dir / f"{urllib.parse.quote(name, safe='@')}.json" if self.cache_dir else None
+        cached = None
+        if path is not None:
+            try:
+                with open(path, 'r') as f:
+                    cached = json.load(f)
+                if cached.get('version') != CACHE_VERSION:
+                    cached = None
+            except (OSError, ValueError):
+                pass
+
+        headers = {'Accept': PACKUMENT_ACCEPT, 'Accept-Encoding': 'gzip'}
+        if cached and cached.get('etag'):
+            headers['If-None-Match'] = cached['etag']
+        if cached and cached.get('last_modified'):
+            headers['If-Modified-Since'] = cached['last_modified']
+        status, response_headers, body = self.downloader.request(url, headers)
+
+        if status == 304 and cached:
+            with self.lock:
+                self.stats['revalidated'] += 1
+            return cached['packument']
+        if status == 404:
+            return None
+        if status != 200:
+            raise DownloadError(f"{url}: HTTP {status}")
+        try:
+            packument = slim_packument(json.loads(body))
+        except ValueError:
+            raise DownloadError(f"{url}: not a packument") from None
+        with self.lock:
+            self.stats['fetched'] += 1
+
+        if path is not None:
+            tmp = path.with_name(f"{path.name}.tmp-{threading.get_ident()}")
+            with open(tmp, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'etag': response_headers.get('ETag'),
+                           'last_modified': response_headers.get('Last-Modified'),
+                           'packument': packument}, f)
+            os.replace(tmp, path)
+        return packument
+
+
+def parse_spec(alias, spec):
+    """Return (registry name, range or tag) for a dependency spec.
+
+    Raises RuntimeError for git, URL, file and other non-registry specs.
+    """
+    spec = (spec or '').strip()
+    if spec.startswith('npm:'):
+        target = spec[len('npm:'):]
+        at = target.find('@', 1)
+        return (target, '*') if at < 0 else (target[:at], target[at + 1:] or '*')
+    if ':' in spec or (not spec.startswith('@') and '/' in spec and not is_range(spec)):
+        raise RuntimeError(f"{alias}@{spec}: only registry dependencies can be resolved natively")
+    return alias, spec or '*'
+
+
+def pick_version(packument, spec):
+    """Pick the version npm would install for a range or dist-tag, or None.
+
+    As npm does, the 'latest' tag wins when it satisfies the range, then the
+    highest matching version that is not deprecated, then any match.
+    """
+    versions = packument['versions']
+    tags = packument['dist-tags']
+    if not is_range(spec):
+        return versions.get(tags.get(spec))
+    ranges = parse_range(spec)
+    latest = tags.get('latest')
+    if latest in versions and satisfies(parse_version(latest), ranges):
+        return versions[latest]
+    matching = [version for version in versions
+                if parse_version(version) and satisfies(parse_version(version), ranges)]
+    if not matching:
+        return None
+    best = max(matching, key=lambda version: (not versions[version].get('deprecated'),
+                                              version_key(version)))
+    return versions[best]
+
+
+def lookup(entries, from_path, name):
+    """Find the lock entry Node would load for name from from_path, or None."""
+    current = from_path
+    while True:
+        candidate = f"{current}/node_modules/{name}" if current else f"node_modules/{name}"
+        if candidate in entries:
+            return candidate
+        if not current:
+            return None
+        current = current.rsplit('/node_modules/', 1)[0] if '/node_modules/' in current else ''
+
+
+def _location(path):
+    """The directory whose node_modules holds a lock path: '' for the top level."""
+    return path.rsplit('/node_modules/', 1)[0] if '/node_modules/' in path else ''
+
+
+def _ancestors(path):
+    """path, its parent package, ... up to '' (the project root)."""
+    chain = [path]
+    while chain[-1]:
+        chain.append(_location(chain[-1]))
+    return chain
+
+
+def _within(path, location):
+    return not location or path == location or path.startswith(location + '/node_modules/')
+
+
+def integrity_of(manifest):
+    """Return a version's SRI integrity, falling back to its sha1 shasum."""
+    dist = manifest.get('dist') or {}
+    if dist.get('integrity'):
+        return dist['integrity']
+    if dist.get('shasum'):
+        return f"sha1-{base64.b64encode(bytes.fromhex(dist['shasum'])).decode()}"
+    return None
+
+
+def lock_entry(alias, manifest):
+    """Build a package-lock.json 'packages' entry for a picked version."""
+    entry = {'version': manifest['version']}
+    if manifest.get('name') and manifest['name'] != alias:
+        entry['name'] = manifest['name']
+    entry['resolved'] = (manifest.get('dist') or {}).get('tarball')
+    entry['integrity'] = integrity_of(manifest)
+    for field in ('license', 'dependencies', 'optionalDependencies', 'peerDependencies',
+                  'peerDependenciesMeta', 'bin', 'engines', 'os', 'cpu', 'deprecated'):
+        if manifest.get(field):
+            entry[field] = manifest[field]
+    if manifest.get('hasInstallScript'):
+        entry['hasInstallScript'] = True
+    return entry
+
+
+def resolve(client, dependencies, include_deps=True):
+    """Resolve {name: spec} into a lockfileVersion 3 package-lock.json dict.
+
+    Raises RuntimeError if a package or a required dependency cannot be resolved.
+    """
+    entries = {}
+    edges = {}          # name -> [(from path, ranges or None, resolved path)]
+    optional_edges = set()
+    queue = deque()
+
+    def place(from_path, alias, spec):
+        name, wanted = parse_spec(alias, spec)
+        ranges = parse_range(wanted) if is_range(wanted) else None
+        found = lookup(entries, from_path, alias)
+        if found is not None and (entries[found].get('name') or alias) == name and (
+                ranges is None or satisfies(parse_version(entries[found]['version']), ranges)):
+            edges.setdefault(alias, []).append((from_path, ranges, found))
+            return found
+
+        packument = client.packument(name)
+        manifest = pick_version(packument, wanted) if packument else None
+        if manifest is None:
+            needed_by = f" (needed by {from_path})" if from_path else ''
+            if packument is None:
+                raise RuntimeError(f"{name} is not in the registry{needed_by}")
+            raise RuntimeError(f"No matching version for {name}@{wanted}{needed_by}")
+        version = parse_version(manifest['version'])
+
+        # As high as possible: below any incompatible copy the lookup would find,
+        # and never above packages that resolved to a version this one does not satisfy
+        chain = _ancestors(from_path)
+        if found is not None:
+            chain = chain[:chain.index(_location(found))]
+            if not chain:
+                raise RuntimeError(f"Cannot place {name}@{manifest['version']} for {from_path}: "
+                                   f"{found} is already {entries[found]['version']}")
+        target = from_path
+        for location in reversed(chain):
+            shadowed = [edge for edge in edges.get(alias, [])
+                        if _within(edge[0], location) and not _within(edge[2], location)
+                        and not (edge[1] and version and satisfies(version, edge[1]))]
+            if not shadowed and (f"{location}/node_modules/{alias}" if location
+                                 else f"node_modules/{alias}") not in entries:
+                target = location
+                break
+
+        path = f"{target}/node_modules/{alias}" if target else f"node_modules/{alias}"
+        entries[path] = lock_entry(alias, manifest)
+        edges.setdefault(alias, []).append((from_path, ranges, path))
+        if include_deps:
+            children = {**(manifest.get('dependencies') or {}),
+                        **(manifest.get('optionalDependencies') or {})}
+            bundled = manifest.get('bundleDependencies') or manifest.get('bundledDependencies') or []
+            # bundleDependencies: true bundles every dependency
+            bundled = set(children) if bundled is True else set(bundled)
+            client.prefetch(sorted({_registry_name(child, children[child]) for child in children
+                                    if child not in bundled} - {None}))
+            queue.append((path, manifest, bundled))
+        return path
+
+    client.prefetch(sorted({_registry_name(name, spec) for name, spec in dependencies.items()} - {None}))
+    roots = {}
+    for name, spec in sorted(dependencies.items()):
+        roots[name] = place('', name, spec)
+
+    while queue:
+        path, manifest, bundled = queue.popleft()
+        optional_names = set(manifest.get('optionalDependencies') or {})
+        children = {**(manifest.get('dependencies') or {}),
+                    **(manifest.get('optionalDependencies') or {})}
+        for child in sorted(children):
+            if child in bundled:
+                continue
+            try:
+                resolved = place(path, child, children[child])
+            except RuntimeError as e:
+                if child not in optional_names:
+                    raise
+                print(f"  Warning: Skipping optional dependency {child}: {e}")
+                continue
+            if child in optional_names:
+                optional_edges.add((path, resolved))
+
+    # A package only reachable through optional dependencies is optional
+    requires = {}
+    for alias_edges in edges.values():
+        for from_path, _, resolved in alias_edges:
+            if (from_path, resolved) not in optional_edges:
+                requires.setdefault(from_path, []).append(resolved)
+    required = set()
+    pending = list(roots.values())
+    while pending:
+        path = pending.pop()
+        if path not in required:
+            required.add(path)
+            pending += requires.get(path, [])
+    for path, entry in entries.items():
+        if path not in required:
+            entry['optional'] = True
+
+    root = {'name': 'disconnected-resources-npm', 'version': '1.0.0', 'dependencies': dependencies}
+    return {'name': root['name'], 'version': root['version'], 'lockfileVersion': 3,
+            'requires': True, 'packages': {'': root, **dict(sorted(entries.items()))}}
+
+
+def _registry_name(alias, spec):
+    try:
+        return parse_spec(alias, spec)[0]
+    except RuntimeError:
+        return None
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Resolve npm packages from registry packuments')
+    parser.add_argument('specs', nargs='+', metavar='SPEC', help='Package, e.g. express@^4 or @types/node')
+    parser.add_argument('--registry', help=f'Registry URL (default: $npm_config_registry or {DEFAULT_REGISTRY})')
+    parser.add_argument('--cache-dir', help='Directory to keep packuments in between runs')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f'Packuments fetched at once (default: {DEFAULT_CONCURRENCY})')
+    parser.add_argument('--no-deps', action='store_true', help='Do not resolve dependencies')
+    parser.add_argument('--lockfile', help='Write the package-lock.json here')
+
+    args = parser.parse_args()
+
+    dependencies = {}
+    for spec in args.specs:
+        at = spec.find('@', 1)
+        dependencies[spec if at < 0 else spec[:at]] = 'latest' if at < 0 else spec[at + 1:]
+
+    with Downloader() as downloader:
+        client = RegistryClient(downloader, args.registry, args.cache_dir, args.concurrency)
+        try:
+            lock = resolve(client, dependencies, not args.no_deps)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        finally:
+            client.close()
+
+    if args.lockfile:
+        with open(args.lockfile, 'w') as f:
+            json.dump(lock, f, indent=2)
+            f.write('\n')
+    for path, entry in lock['packages'].items():
+        if path:
+            print(f"{path}  {entry['version']}")
+    stats = client.stats
+    print(f"Packuments: {stats['fetched']} downloaded, {stats['revalidated']} revalidated from cache",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
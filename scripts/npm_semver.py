@@ -0,0 +1,158 @@
+"""
+npm semver: version parsing, ordering and range matching.
+
+Ranges follow node-semver: `||` alternatives, hyphen ranges (1.2 - 2.3),
+X-ranges (1.x, 1.2.*, ''), tilde (~1.2.3), caret (^0.2.3) and plain
+comparators. Ranges are desugared into sets of (operator, version)
+comparators. A prerelease version only satisfies a set that names a
+prerelease of the same major.minor.patch, as node-semver does without
+includePrerelease.
+"""
+
+import re
+
+
+VERSION_RE = re.compile(
+    r'^\s*[v=]*\s*(\d+)\.(\d+)\.(\d+)'
+    r'(?:-([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?'
+    r'(?:\+[0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*)?\s*$')
+
+PARTIAL = r'[v=]*\s*([0-9]+|[xX*])(?:\.([0-9]+|[xX*])(?:\.([0-9]+|[xX*])' \
+          r'(?:-?([0-9A-Za-z-]+(?:\.[0-9A-Za-z-]+)*))?(?:\+[0-9A-Za-z-.]+)?)?)?'
+
+COMPARATOR_RE = re.compile(r'^(<=|>=|<|>|=|~>|~|\^)?\s*' + PARTIAL + r'$')
+HYPHEN_RE = re.compile(r'^' + PARTIAL + r'\s+-\s+' + PARTIAL + r'$')
+
+# Sentinel for comparators that match every release, like '*'
+ANY = ('>=', (0, 0, 0, ()))
+
+
+def parse_version(text):
+    """Parse a version string into (major, minor, patch, prerelease), or None."""
+    match = VERSION_RE.match(text or '')
+    if match is None:
+        return None
+    prerelease = tuple((0, int(part)) if part.isdigit() else (1, part)
+                       for part in match.group(4).split('.')) if match.group(4) else ()
+    return int(match.group(1)), int(match.group(2)), int(match.group(3)), prerelease
+
+
+def version_key(version):
+    """Sort key for a version string; a release sorts after its prereleases."""
+    parsed = parse_version(version) if isinstance(version, str) else version
+    if parsed is None:
+        return (-1, -1, -1), 0, ()
+    major, minor, patch, prerelease = parsed
+    return (major, minor, patch), 0 if prerelease else 1, prerelease
+
+
+def _is_wild(part):
+    return part is None or part in ('x', 'X', '*')
+
+
+def _pre(text):
+    return tuple((0, int(part)) if part.isdigit() else (1, part) for part in text.split('.')) \
+        if text else ()
+
+
+# The lowest prerelease of a version, as in node-semver's '<2.0.0-0'
+ZERO = ((0, 0),)
+
+
+def _desugar(operator, major, minor, patch, prerelease):
+    """Turn one comparator with a partial version into (operator, version) pairs."""
+    if _is_wild(major):
+        return [] if operator in ('<', '>') else [ANY]
+    major = int(major)
+    if _is_wild(minor):
+        low, high = (major, 0, 0, ()), (major + 1, 0, 0, ZERO)
+        partial = 'major'
+    elif _is_wild(patch):
+        minor = int(minor)
+        low, high = (major, minor, 0, ()), (major, minor + 1, 0, ZERO)
+        partial = 'minor'
+    else:
+        low = (major, int(minor), int(patch), _pre(prerelease))
+        high = None
+        partial = None
+
+    if operator in (None, '', '='):
+        return [('=', low)] if partial is None else [('>=', low), ('<', high)]
+    if operator in ('~', '~>'):
+        if partial == 'major':
+            return [('>=', low), ('<', high)]
+        return [('>=', low), ('<', (low[0], low[1] + 1, 0, ZERO))]
+    if operator == '^':
+        if low[0] > 0 or partial == 'major':
+            return [('>=', low), ('<', (low[0] + 1, 0, 0, ZERO))]
+        if low[1] > 0 or partial == 'minor':
+            return [('>=', low), ('<', (0, low[1] + 1, 0, ZERO))]
+        return [('>=', low), ('<', (0, 0, low[2] + 1, ZERO))]
+    if operator == '>':
+        return [('>=', high[:3] + ((),))] if partial else [('>', low)]
+    if operator == '>=':
+        return [('>=', low)]
+    if operator == '<':
+        return [('<', low[:3] + (ZERO,))] if partial else [('<', low)]
+    if operator == '<=':
+        return [('<', high)] if partial else [('<=', low)]
+    raise ValueError(f"Unknown operator {operator}")
+
+
+def parse_range(text):
+    """Parse a range into a list of comparator sets; raise ValueError if it is not one."""
+    sets = []
+    for alternative in (text or '').split('||'):
+        alternative = alternative.strip()
+        hyphen = HYPHEN_RE.match(alternative)
+        if hyphen:
+            low = _desugar('>=', *hyphen.groups()[:4])
+            major, minor, patch, prerelease = hyphen.groups()[4:]
+            if _is_wild(major):
+                high = []
+            elif _is_wild(minor) or _is_wild(patch):
+                high = [_desugar('<=', major, minor, patch, None)[-1]]
+            else:
+                high = [('<=', (int(major), int(minor), int(patch), _pre(prerelease)))]
+            sets.append(low + high)
+            continue
+        # Operators may be separated from their version by spaces: '>= 1.2'
+        alternative = re.sub(r'(<=|>=|<|>|=|~>|~|\^)\s+', r'\1', alternative)
+        comparators = []
+        for token in alternative.split():
+            match = COMPARATOR_RE.match(token)
+            if match is None:
+                raise ValueError(f"Invalid range: {text}")
+            comparators += _desugar(*match.groups())
+        sets.append(comparators or [ANY])
+    return sets
+
+
+def _compare(version, operator, bound):
+    key, other = version_key(version), version_key(bound)
+    return {'=': key == other, '<': key < other, '<=': key <= other,
+            '>': key > other, '>=': key >= other}[operator]
+
+
+def satisfies(version, ranges):
+    """Return True if a parsed version matches parsed ranges (see parse_range)."""
+    if version is None:
+        return False
+    for comparators in ranges:
+        if not all(_compare(version, operator, bound) for operator, bound in comparators):
+            continue
+        if not version[3]:
+            return True
+        # Prereleases only match a comparator naming the same release's prerelease
+        if any(bound[3] and bound[:3] == version[:3] for _, bound in comparators):
+            return True
+    return False
+
+
+def is_range(text):
+    """Return True if text is a valid semver range, as opposed to a dist-tag."""
+    try:
+        parse_range(text)
+        return True
+    except ValueError:
+        return False
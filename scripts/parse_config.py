@@ -4,74 +4,156 @@ Configuration parser for disconnected resources pipeline.
 Reads YAML configuration and exports it in formats usable by shell scripts.
 """
 
-import yaml
 import json
 import sys
 import os
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
 
+from artifact_cache import cmd_cache, parse_duration, parse_size
+from bundler import COMPRESSION_LEVELS, COMPRESSIONS, MIXED_LAYOUT_COMPRESSIONS
+from config_schema import ConfigError, format_errors, read_config, schema_errors
 
-def load_config(config_path):
-    """Load and parse YAML configuration file."""
-    try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-        return config
-    except FileNotFoundError:
-        print(f"Error: Configuration file not found: {config_path}", file=sys.stderr)
-        sys.exit(1)
-    except yaml.YAMLError as e:
-        print(f"Error: Invalid YAML in configuration file: {e}", file=sys.stderr)
-        sys.exit(1)
 
+SOURCES = ['npm', 'pypi', 'debian', 'rpm', 'containers', 'vscode']
 
-def validate_config(config):
-    """Validate configuration structure and values."""
-    errors = []
+SCRIPT_DIR = Path(__file__).resolve().parent
 
-    # Check required sections
-    if 'metadata' not in config:
-        errors.append("Missing 'metadata' section")
+# Display names used in log lines, matching the workflow step names
+SOURCE_LABELS = {
+    'npm': 'NPM',
+    'pypi': 'PyPI',
+    'debian': 'Debian',
+    'rpm': 'RPM',
+    'containers': 'Container',
+    'vscode': 'VSCode',
+}
 
-    # Check at least one package source is enabled
-    enabled_sources = []
-    for source in ['npm', 'pypi', 'debian', 'rpm', 'containers', 'vscode']:
-        if source in config and config[source].get('enabled', False):
-            enabled_sources.append(source)
+# snapshot.debian.org / snapshot.ubuntu.com timestamp format
+SNAPSHOT_FORMAT = '%Y%m%dT%H%M%SZ'
 
-    if not enabled_sources:
-        errors.append("No package sources are enabled")
 
-    # Validate npm section
-    if config.get('npm', {}).get('enabled'):
-        if 'packages' not in config['npm'] or not config['npm']['packages']:
-            errors.append("npm is enabled but no packages specified")
+# List each enabled source must not leave empty
+SOURCE_ITEMS = {
+    'npm': 'packages',
+    'pypi': 'packages',
+    'debian': 'packages',
+    'rpm': 'packages',
+    'containers': 'images',
+    'vscode': 'extensions',
+}
 
-    # Validate pypi section
-    if config.get('pypi', {}).get('enabled'):
-        if 'packages' not in config['pypi'] or not config['pypi']['packages']:
-            errors.append("pypi is enabled but no packages specified")
 
-    # Validate debian section
-    if config.get('debian', {}).get('enabled'):
-        if 'packages' not in config['debian'] or not config['debian']['packages']:
-            errors.append("debian is enabled but no packages specified")
+def load_config(config_path):
+    """Load and parse YAML configuration file."""
+    return load_config_nodes(config_path)[0]
 
-    # Validate rpm section
-    if config.get('rpm', {}).get('enabled'):
-        if 'packages' not in config['rpm'] or not config['rpm']['packages']:
-            errors.append("rpm is enabled but no packages specified")
 
-    # Validate containers section
-    if config.get('containers', {}).get('enabled'):
-        if 'images' not in config['containers'] or not config['containers']['images']:
-            errors.append("containers is enabled but no images specified")
+def load_config_nodes(config_path):
+    """Load a configuration file; return (config, YAML node tree) for line numbers."""
+    try:
+        return read_config(config_path)
+    except ConfigError as e:
+        for error in e.errors:
+            print(f"Error: {config_path}: {error}", file=sys.stderr)
+        sys.exit(1)
 
-    # Validate vscode section
-    if config.get('vscode', {}).get('enabled'):
-        if 'extensions' not in config['vscode'] or not config['vscode']['extensions']:
-            errors.append("vscode is enabled but no extensions specified")
 
+def config_errors(config, node=None):
+    """Return every problem with a configuration, formatted with path and line."""
+    if not isinstance(config, dict):
+        return format_errors([((), "configuration must be a mapping")], node)
+
+    errors = schema_errors(config)
+
+    # Checks that span several keys and are not expressed in the schema
+    sections = {source: config[source] for source in SOURCES
+                if isinstance(config.get(source), dict)}
+    if not any(section.get('enabled') for section in sections.values()):
+        errors.append(((), "No package sources are enabled"))
+    for source, section in sections.items():
+        items = SOURCE_ITEMS[source]
+        if section.get('enabled') and not section.get(items):
+            errors.append(((source,), f"{source} is enabled but no {items} specified"))
+
+    output_config = config.get('output')
+    if isinstance(output_config, dict):
+        compression = output_config.get('compression', 'gzip')
+        level = output_config.get('compression_level')
+        if level is not None and compression in COMPRESSIONS:
+            if compression not in COMPRESSION_LEVELS:
+                errors.append((('output', 'compression_level'),
+                               f"not supported for compression {compression!r}"))
+            elif isinstance(level, int) and not isinstance(level, bool):
+                low, high, _ = COMPRESSION_LEVELS[compression]
+                if not low <= level <= high:
+                    errors.append((('output', 'compression_level'),
+                                   f"must be between {low} and {high} for {compression}"))
+        if 'zstd_long' in output_config and compression != 'zstd':
+            errors.append((('output', 'zstd_long'), "only valid with compression: zstd"))
+        if output_config.get('layout') == 'mixed' and \
+                compression not in MIXED_LAYOUT_COMPRESSIONS + ['none']:
+            errors.append((('output', 'layout'),
+                           f"mixed needs compression {' or '.join(MIXED_LAYOUT_COMPRESSIONS)}, "
+                           f"got {compression!r}"))
+        if isinstance(output_config.get('split_size'), str):
+            try:
+                parse_size(output_config['split_size'])
+            except ValueError:
+                errors.append((('output', 'split_size'),
+                               f"not a valid size: {output_config['split_size']!r}"))
+
+    pypi_config = sections.get('pypi')
+    if pypi_config is not None and isinstance(pypi_config.get('lock_max_age'), str):
+        try:
+            parse_duration(pypi_config['lock_max_age'])
+        except ValueError:
+            errors.append((('pypi', 'lock_max_age'),
+                           f"not a valid duration: {pypi_config['lock_max_age']!r}"))
+
+    debian_config = sections.get('debian')
+    if debian_config is not None:
+        snapshot = debian_config.get('snapshot')
+        if isinstance(snapshot, str):
+            try:
+                taken = datetime.strptime(snapshot, SNAPSHOT_FORMAT).replace(tzinfo=timezone.utc)
+            except ValueError:
+                errors.append((('debian', 'snapshot'),
+                               f"not a valid time: {snapshot!r} (expected YYYYMMDDTHHMMSSZ)"))
+            else:
+                if taken > datetime.now(timezone.utc):
+                    errors.append((('debian', 'snapshot'), f"{snapshot} is in the future"))
+        mirror = debian_config.get('mirror')
+        if isinstance(mirror, str) and '{snapshot}' in mirror and not snapshot:
+            errors.append((('debian', 'mirror'), "uses {snapshot} but no snapshot is set"))
+        pins = {}
+        for index, package in enumerate(debian_config.get('packages') or []):
+            if not isinstance(package, dict) or not isinstance(package.get('name'), str):
+                continue
+            version = package.get('version')
+            if version is not None and pins.setdefault(package['name'], version) != version:
+                errors.append((('debian', 'packages', index, 'version'),
+                               f"{package['name']} is pinned to {pins[package['name']]} already"))
+
+    cache_config = config.get('cache')
+    if isinstance(cache_config, dict) and isinstance(cache_config.get('max_size'), str):
+        try:
+            parse_size(cache_config['max_size'])
+        except ValueError:
+            errors.append((('cache', 'max_size'),
+                           f"not a valid size: {cache_config['max_size']!r}"))
+
+    return format_errors(errors, node)
+
+
+def validate_config(config, node=None):
+    """Validate configuration structure and values."""
+    errors = config_errors(config, node)
     if errors:
         print("Configuration validation errors:", file=sys.stderr)
         for error in errors:
@@ -103,7 +185,7 @@ def export_env_vars(config):
         env_lines.append(f"export ENV_DESC='{config['metadata'].get('description', '')}'")
 
     # Export package source enablement
-    for source in ['npm', 'pypi', 'debian', 'rpm', 'containers', 'vscode']:
+    for source in SOURCES:
         enabled = config.get(source, {}).get('enabled', False)
         env_lines.append(f"export {source.upper()}_ENABLED={str(enabled).lower()}")
 
@@ -149,6 +231,8 @@ def export_env_vars(config):
         output_config = config['output']
         env_lines.append(f"export OUTPUT_TARBALL_NAME='{output_config.get('tarball_name', 'resources-bundle')}'")
         env_lines.append(f"export OUTPUT_COMPRESSION='{output_config.get('compression', 'gzip')}'")
+        env_lines.append(f"export OUTPUT_COMPRESSION_LEVEL='{output_config.get('compression_level', '')}'")
+        env_lines.append(f"export OUTPUT_COMPRESSION_THREADS='{output_config.get('compression_threads', 0)}'")
         env_lines.append(f"export OUTPUT_SPLIT_SIZE='{output_config.get('split_size', '0')}'")
 
     # Export security config
@@ -160,11 +244,322 @@ def export_env_vars(config):
     return '\n'.join(env_lines)
 
 
+# Collector settings as (shell variable, config key, default)
+SOURCE_SETTINGS = {
+    'npm': [
+        ('INCLUDE_DEPS', 'include_dependencies', True),
+        ('RESOLVER', 'resolver', 'npm'),
+        ('CONCURRENCY', 'concurrency', 16),
+    ],
+    'pypi': [
+        ('INCLUDE_DEPS', 'include_dependencies', True),
+        ('PYTHON_VERSIONS', 'python_versions', ['3.11']),
+        ('PLATFORMS', 'platforms', ['manylinux2014_x86_64']),
+        ('PRUNE', 'prune', True),
+        ('RESOLVER', 'resolver', 'pip'),
+        ('INDEX_URL', 'index_url', ''),
+        ('LOCK_MAX_AGE', 'lock_max_age', '24h'),
+    ],
+    'debian': [
+        ('DISTRIBUTION', 'distribution', 'ubuntu'),
+        ('RELEASE', 'release', '22.04'),
+        ('INCLUDE_DEPS', 'include_dependencies', True),
+        ('ARCHITECTURES', 'architectures', ['amd64']),
+        ('MIRROR', 'mirror', ''),
+        ('KEYRING', 'keyring', ''),
+        ('SIGNING_KEY', 'signing_key', ''),
+        ('SNAPSHOT', 'snapshot', ''),
+    ],
+    'rpm': [
+        ('DISTRIBUTION', 'distribution', 'rhel'),
+        ('RELEASE', 'release', '9'),
+        ('INCLUDE_DEPS', 'include_dependencies', True),
+        ('ARCHITECTURES', 'architectures', ['x86_64']),
+        ('REPOSITORIES', 'repositories', []),
+    ],
+    'containers': [
+        ('EXPORT_FORMAT', 'export_format', 'docker-archive'),
+    ],
+    'vscode': [],
+}
+
+
+def shell_value(value):
+    """Render a config value the way the collectors compare it in shell."""
+    if isinstance(value, bool):
+        return str(value).lower()
+    if isinstance(value, list):
+        return ' '.join(str(item) for item in value)
+    return str(value)
+
+
+def source_settings(config, source):
+    """Return {config key: value} for a source's settings with defaults applied."""
+    section = config.get(source) or {}
+    return {key: section.get(key, default) for _, key, default in SOURCE_SETTINGS[source]}
+
+
+def plan_settings(config, source):
+    """Return the collector settings for a source as shell assignments."""
+    section = config.get(source) or {}
+    values = source_settings(config, source)
+    settings = [('ENABLED', section.get('enabled', False))]
+    settings += [(variable, values[key]) for variable, key, _ in SOURCE_SETTINGS[source]]
+    settings.append(('CACHE_ENABLED', (config.get('cache') or {}).get('enabled', False)))
+    return [(variable, shell_value(value)) for variable, value in settings]
+
+
+def plan_rows(config, source):
+    """Return one row of fully resolved fields per item of a source.
+
+    npm and pypi: name, version, spec (name, name@version or name==version)
+    debian: name, version (a pinned version or latest)
+    rpm: name
+    containers: image, tag, image:tag, file-safe name
+    vscode: extension id, version
+    """
+    section = config.get(source) or {}
+    rows = []
+    if source in ('npm', 'pypi'):
+        separator = '@' if source == 'npm' else '=='
+        for package in section.get('packages') or []:
+            name = package['name']
+            version = str(package.get('version', 'latest'))
+            spec = name if version == 'latest' else f"{name}{separator}{version}"
+            rows.append((name, version, spec))
+    elif source == 'debian':
+        for package in section.get('packages') or []:
+            if isinstance(package, dict):
+                rows.append((package['name'], str(package.get('version', 'latest'))))
+            else:
+                rows.append((str(package), 'latest'))
+    elif source == 'rpm':
+        rows = [(str(name),) for name in section.get('packages') or []]
+    elif source == 'containers':
+        for image in section.get('images') or []:
+            ref = f"{image['image']}:{image.get('tag', 'latest')}"
+            rows.append((image['image'], str(image.get('tag', 'latest')), ref,
+                         re.sub(r'[/:]', '_', ref)))
+    elif source == 'vscode':
+        for spec in section.get('extensions') or []:
+            ext_id, _, version = str(spec).partition('@')
+            rows.append((ext_id, version or 'latest'))
+    return rows
+
+
+def cmd_plan(argv):
+    """Print the pre-resolved collection plan for one source."""
+    import argparse
+    import shlex
+
+    parser = argparse.ArgumentParser(
+        prog='parse_config.py plan',
+        description='Print one tab-separated row per item of a source, with defaults applied, '
+                    'for collectors to read in a single loop')
+    parser.add_argument('config_file', help='Configuration file (YAML or the exported JSON)')
+    parser.add_argument('source', choices=SOURCES)
+    parser.add_argument('--settings', action='store_true',
+                        help='Print the source settings as shell assignments instead')
+
+    args = parser.parse_args(argv)
+    config = load_config(args.config_file) or {}
+
+    if args.settings:
+        for variable, value in plan_settings(config, args.source):
+            print(f"{variable}={shlex.quote(value)}")
+        return
+
+    for row in plan_rows(config, args.source):
+        if any('\t' in field or '\n' in field or not field for field in row):
+            print(f"Error: Cannot plan {args.source} item {row[0]!r}: empty field or "
+                  f"tab/newline in a value", file=sys.stderr)
+            sys.exit(1)
+        print('\t'.join(row))
+
+
+def enabled_sources(config):
+    """Return the enabled package sources in collection order."""
+    return [source for source in SOURCES if config.get(source, {}).get('enabled', False)]
+
+
+def collector_command(source, config_json, output_dir):
+    """Build the command line that runs the collector for a source."""
+    script = SCRIPT_DIR / f'collect_{source}.sh'
+    return ['bash', str(script), str(config_json), str(output_dir)]
+
+
+def run_collector(source, config_json, output_dir, print_lock):
+    """Run a single collector, streaming its output with a source prefix."""
+    prefix = f'[{source}]'
+    os.makedirs(output_dir, exist_ok=True)
+    cmd = collector_command(source, config_json, output_dir)
+
+    start = time.monotonic()
+    try:
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                stdin=subprocess.DEVNULL, text=True, errors='replace',
+                                bufsize=1)
+    except OSError as e:
+        with print_lock:
+            print(f"{prefix} Error: Failed to start collector: {e}", flush=True)
+        return {'source': source, 'returncode': 127, 'duration': 0.0}
+
+    for line in proc.stdout:
+        with print_lock:
+            print(f"{prefix} {line.rstrip()}".rstrip(), flush=True)
+
+    returncode = proc.wait()
+    duration = time.monotonic() - start
+    return {'source': source, 'returncode': returncode, 'duration': duration}
+
+
+def run_collectors(config, config_json, output_dir, jobs=None, sources=None, strict=False):
+    """Run the enabled collectors concurrently and return per-source results.
+
+    A collector exiting non-zero is reported as a warning, as the workflow
+    does, unless strict is set, in which case it counts as a failure.
+    """
+    selected = enabled_sources(config)
+    if sources:
+        selected = [source for source in selected if source in sources]
+
+    if not selected:
+        print("No enabled sources to collect")
+        return []
+
+    jobs = jobs or len(selected)
+    print(f"Running {len(selected)} collector(s) with {jobs} worker(s): {', '.join(selected)}")
+    print("")
+
+    print_lock = threading.Lock()
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(run_collector, source, config_json,
+                            Path(output_dir) / source, print_lock)
+            for source in selected
+        ]
+        results = [future.result() for future in futures]
+    total = time.monotonic() - start
+
+    print("")
+    print("=== Collection Summary ===")
+    for result in results:
+        label = SOURCE_LABELS[result['source']]
+        if result['returncode'] == 0:
+            status = 'ok'
+        elif strict:
+            status = f"FAILED (exit {result['returncode']})"
+        else:
+            status = f"{label} collection had warnings (exit {result['returncode']})"
+        print(f"  {result['source']:<12} {result['duration']:8.1f}s  {status}")
+    print(f"  {'total':<12} {total:8.1f}s  (sum of collectors: "
+          f"{sum(r['duration'] for r in results):.1f}s)")
+
+    return results
+
+
+def cmd_run(argv):
+    """Entry point for the 'run' subcommand."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='parse_config.py run',
+        description='Validate the configuration and run the enabled collectors concurrently')
+    parser.add_argument('config_file', help='Path to YAML configuration file')
+    parser.add_argument('--output-dir', default='output',
+                        help='Base output directory; each source is collected into <dir>/<source> '
+                             '(default: output)')
+    parser.add_argument('--jobs', '-j', type=int, default=None,
+                        help='Maximum number of collectors to run at once '
+                             '(default: one per enabled source)')
+    parser.add_argument('--source', action='append', choices=SOURCES, dest='sources',
+                        help='Only run the given source (may be repeated)')
+    parser.add_argument('--config-json', default=None,
+                        help='Where to write the resolved JSON config passed to collectors '
+                             '(default: <output-dir>/config.json)')
+    parser.add_argument('--strict', action='store_true',
+                        help='Exit non-zero if any collector fails instead of only warning')
+
+    args = parser.parse_args(argv)
+
+    if args.jobs is not None and args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+
+    config, node = load_config_nodes(args.config_file)
+    validate_config(config, node)
+
+    output_dir = Path(args.output_dir).resolve()
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config_json = Path(args.config_json or output_dir / 'config.json').resolve()
+    with open(config_json, 'w') as f:
+        json.dump(config, f, indent=2)
+
+    results = run_collectors(config, config_json, output_dir, jobs=args.jobs,
+                             sources=args.sources, strict=args.strict)
+
+    if args.strict and any(result['returncode'] != 0 for result in results):
+        sys.exit(1)
+
+
+def cmd_validate(argv):
+    """Validate many configuration files in one process."""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog='parse_config.py validate',
+        description='Validate configuration files against the schema and report every error '
+                    'with its line number')
+    parser.add_argument('config_files', nargs='+', help='YAML configuration files')
+    parser.add_argument('--quiet', '-q', action='store_true',
+                        help='Only print files with errors')
+
+    args = parser.parse_args(argv)
+
+    invalid = 0
+    for config_path in args.config_files:
+        try:
+            config, node = read_config(config_path)
+            errors = config_errors(config, node)
+        except ConfigError as e:
+            errors = e.errors
+        if errors:
+            invalid += 1
+            for error in errors:
+                print(f"{config_path}: {error}")
+        elif not args.quiet:
+            print(f"{config_path}: OK")
+
+    total = len(args.config_files)
+    print(f"{total - invalid} of {total} configuration files valid", file=sys.stderr)
+    if invalid:
+        sys.exit(1)
+
+
+# Subcommands dispatched before the legacy "<config> --format ..." interface
+COMMANDS = {
+    'run': cmd_run,
+    'cache': lambda argv: cmd_cache(argv, load_config),
+    'validate': cmd_validate,
+    'plan': cmd_plan,
+}
+
+
 def main():
     """Main entry point."""
     import argparse
 
-    parser = argparse.ArgumentParser(description='Parse disconnected resources configuration')
+    if len(sys.argv) > 1 and sys.argv[1] in COMMANDS:
+        COMMANDS[sys.argv[1]](sys.argv[2:])
+        return
+
+    parser = argparse.ArgumentParser(
+        description='Parse disconnected resources configuration',
+        epilog='Subcommands: run (collect all enabled sources concurrently), '
+               'cache (inspect and prune the shared artifact cache), '
+               'validate (check many configuration files at once), '
+               'plan (pre-resolved per-source rows for the collectors). '
+               'Use "parse_config.py <command> --help" for details.')
     parser.add_argument('config_file', help='Path to YAML configuration file')
     parser.add_argument('--format', choices=['json', 'env'], default='json',
                         help='Output format (default: json)')
@@ -175,10 +570,10 @@ def main():
     args = parser.parse_args()
 
     # Load configuration
-    config = load_config(args.config_file)
+    config, node = load_config_nodes(args.config_file)
 
     # Validate configuration
-    validate_config(config)
+    validate_config(config, node)
 
     if args.validate_only:
         print("Configuration is valid")
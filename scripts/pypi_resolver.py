@@ -0,0 +1,522 @@
+#!/usr/bin/env python3
+"""
+Metadata-only dependency resolution against a PEP 503/691 simple index.
+
+pip's resolver reads a candidate's dependencies from the wheel itself. This
+resolver reads them from the smallest source the index offers, in order:
+
+1. the PEP 658/714 <file>.metadata sidecar the index advertises,
+2. the METADATA member of the wheel, read with HTTP Range requests
+   (the zip central directory, then that one member),
+3. the whole wheel, when the server does not support ranges. It is kept
+   in the download directory so the collector does not fetch it again.
+
+Backtracking is done by resolvelib (pip's own resolver core) and
+versions, specifiers and markers by packaging. Either may come from pip's
+vendored copies, so nothing beyond pip needs to be installed.
+
+Each (python_version, platform) target is resolved separately, with
+markers evaluated for that target and only wheels whose tags it accepts,
+as `pip install --only-binary=:all: --python-version --platform` would.
+A directory written by `simple_index.py --metadata` can stand in for PyPI:
+
+    python3 pypi_resolver.py --index-url file:///tmp/index/simple \\
+        --python-version 3.11 --platform manylinux2014_x86_64 requests
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import sys
+import threading
+import urllib.parse
+import zipfile
+from html.parser import HTMLParser
+from pathlib import Path
+
+try:
+    from packaging.requirements import InvalidRequirement, Requirement
+    from packaging.specifiers import SpecifierSet
+    from packaging.utils import canonicalize_name
+    from packaging.version import InvalidVersion, Version
+except ImportError:
+    from pip._vendor.packaging.requirements import InvalidRequirement, Requirement
+    from pip._vendor.packaging.specifiers import SpecifierSet
+    from pip._vendor.packaging.utils import canonicalize_name
+    from pip._vendor.packaging.version import InvalidVersion, Version
+
+try:
+    import resolvelib
+except ImportError:
+    from pip._vendor import resolvelib
+
+from downloader import DownloadError, Downloader
+from simple_index import parse_filename, parse_metadata, wheel_metadata_name
+from wheel_tags import file_rank, target_tags
+
+
+DEFAULT_INDEX_URL = 'https://pypi.org/simple/'
+
+# Ask for PEP 691 JSON and accept the HTML form from older indexes
+SIMPLE_ACCEPT = ('application/vnd.pypi.simple.v1+json, '
+                 'application/vnd.pypi.simple.v1+html;q=0.2, text/html;q=0.01')
+
+# Bytes fetched per Range request when reading a wheel lazily
+RANGE_BLOCK_SIZE = 64 * 1024
+
+MAX_ROUNDS = 2000
+
+
+class _LinkParser(HTMLParser):
+    """Collect the anchors of a PEP 503 project page."""
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'a':
+            self.links.append(dict(attrs))
+
+
+def _metadata_hash(value):
+    """Turn a core-metadata value (bool, dict or 'sha256=...') into (available, sha256)."""
+    if isinstance(value, dict):
+        return True, value.get('sha256')
+    if isinstance(value, str):
+        name, _, digest = value.partition('=')
+        return value.lower() != 'false', digest if name == 'sha256' else None
+    return bool(value), None
+
+
+class RangeFile(io.RawIOBase):
+    """A read-only file over an HTTP resource, fetched in blocks with Range requests."""
+
+    def __init__(self, fetch, size, blocks):
+        self.fetch = fetch
+        self.size = size
+        self.blocks = blocks
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self.position = max(0, offset)
+        return self.position
+
+    def readinto(self, buffer):
+        end = min(self.position + len(buffer), self.size)
+        if end <= self.position:
+            return 0
+        first = self.position // RANGE_BLOCK_SIZE
+        last = (end - 1) // RANGE_BLOCK_SIZE
+        missing = [block for block in range(first, last + 1) if block not in self.blocks]
+        if missing:
+            # One request for the whole span of missing blocks
+            start = missing[0] * RANGE_BLOCK_SIZE
+            stop = min((missing[-1] + 1) * RANGE_BLOCK_SIZE, self.size)
+            data = self.fetch(start, stop - 1)
+            for block in range(missing[0], missing[-1] + 1):
+                offset = block * RANGE_BLOCK_SIZE - start
+                self.blocks.setdefault(block, data[offset:offset + RANGE_BLOCK_SIZE])
+        data = b''.join(self.blocks[block] for block in range(first, last + 1))
+        offset = self.position - first * RANGE_BLOCK_SIZE
+        count = end - self.position
+        buffer[:count] = data[offset:offset + count]
+        self.position = end
+        return count
+
+
+class IndexClient:
+    """Read project pages and core metadata from a simple index, with caching."""
+
+    def __init__(self, downloader, index_url=DEFAULT_INDEX_URL, download_dir=None):
+        self.downloader = downloader
+        self.index_url = index_url.rstrip('/') + '/'
+        self.download_dir = Path(download_dir) if download_dir else None
+        self.projects = {}
+        self.metadata_cache = {}
+        self.lock = threading.Lock()
+        self.stats = {'sidecar': 0, 'range': 0, 'full': 0, 'local': 0}
+
+    def project_files(self, name):
+        """Return the files of a project as dicts, or [] if the index has no such project."""
+        name = canonicalize_name(name)
+        with self.lock:
+            if name in self.projects:
+                return self.projects[name]
+        files = self._fetch_project(name)
+        with self.lock:
+            self.projects[name] = files
+        return files
+
+    def _get(self, url, headers=None):
+        """GET url and return (headers, body); raise DownloadError unless it succeeded."""
+        status, response_headers, body = self.downloader.request(url, headers)
+        if status >= 300:
+            raise DownloadError(f"{url}: HTTP {status}")
+        return response_headers, body
+
+    def _fetch_project(self, name):
+        url = urllib.parse.urljoin(self.index_url, f'{name}/')
+        if url.startswith('file:'):
+            # A directory index: prefer the JSON page, as a server would
+            for page, content_type in (('index.json', 'application/vnd.pypi.simple.v1+json'),
+                                       ('index.html', 'text/html')):
+                try:
+                    _, body = self._get(url + page)
+                    break
+                except DownloadError:
+                    continue
+            else:
+                return []
+        else:
+            status, headers, body = self.downloader.request(url, {'Accept': SIMPLE_ACCEPT})
+            if status == 404:
+                return []
+            if status >= 300:
+                raise DownloadError(f"{url}: HTTP {status}")
+            content_type = headers.get('Content-Type', 'text/html')
+
+        files = []
+        if 'json' in content_type:
+            for entry in json.loads(body).get('files', []):
+                available, digest = _metadata_hash(
+                    entry.get('core-metadata', entry.get('dist-info-metadata', False)))
+                files.append({
+                    'filename': entry['filename'],
+                    'url': urllib.parse.urljoin(url, entry['url']),
+                    'sha256': entry.get('hashes', {}).get('sha256'),
+                    'requires_python': entry.get('requires-python'),
+                    'yanked': bool(entry.get('yanked', False)),
+                    'metadata': available,
+                    'metadata_sha256': digest,
+                })
+        else:
+            parser = _LinkParser()
+            parser.feed(body.decode('utf-8', 'replace'))
+            for attrs in parser.links:
+                href = attrs.get('href')
+                if not href:
+                    continue
+                link, _, fragment = urllib.parse.urljoin(url, href).partition('#')
+                available, digest = _metadata_hash(
+                    attrs.get('data-core-metadata', attrs.get('data-dist-info-metadata', False)))
+                files.append({
+                    'filename': urllib.parse.unquote(link.rsplit('/', 1)[-1]),
+                    'url': link,
+                    'sha256': fragment[len('sha256='):] if fragment.startswith('sha256=') else None,
+                    'requires_python': attrs.get('data-requires-python'),
+                    'yanked': 'data-yanked' in attrs,
+                    'metadata': available,
+                    'metadata_sha256': digest,
+                })
+        return files
+
+    def metadata(self, file):
+        """Return the core metadata of a wheel as an email.message.Message."""
+        with self.lock:
+            if file['url'] in self.metadata_cache:
+                return self.metadata_cache[file['url']]
+        message = parse_metadata(self._fetch_metadata(file))
+        with self.lock:
+            self.metadata_cache[file['url']] = message
+        return message
+
+    def _fetch_metadata(self, file):
+        if file['metadata']:
+            _, data = self._get(file['url'] + '.metadata')
+            if file['metadata_sha256'] and hashlib.sha256(data).hexdigest() != file['metadata_sha256']:
+                raise DownloadError(f"{file['filename']}.metadata: sha256 mismatch")
+            self.stats['sidecar'] += 1
+            return data
+
+        if file['url'].startswith('file:'):
+            self.stats['local'] += 1
+            return self._wheel_metadata(self._get(file['url'])[1], file['filename'])
+
+        # Read the tail first: a server that honours ranges answers 206 with the size
+        status, headers, data = self.downloader.request(
+            file['url'], {'Range': f'bytes=-{RANGE_BLOCK_SIZE}'})
+        if status >= 300:
+            raise DownloadError(f"{file['url']}: HTTP {status}")
+        if status == 206 and '/' in headers.get('Content-Range', ''):
+            size = int(headers['Content-Range'].rsplit('/', 1)[1])
+            tail_start = size - len(data)
+            # Only whole blocks go into the cache; the partial first one is refetched if needed
+            blocks = {}
+            first_block = -(-tail_start // RANGE_BLOCK_SIZE)
+            for block in range(first_block, -(-size // RANGE_BLOCK_SIZE)):
+                offset = block * RANGE_BLOCK_SIZE - tail_start
+                blocks[block] = data[offset:offset + RANGE_BLOCK_SIZE]
+
+            def fetch(start, end):
+                status, _, chunk = self.downloader.request(
+                    file['url'], {'Range': f'bytes={start}-{end}'})
+                if status != 206:
+                    raise DownloadError(f"{file['url']}: range request answered with HTTP {status}")
+                return chunk
+
+            self.stats['range'] += 1
+            return self._wheel_metadata(RangeFile(fetch, size, blocks), file['filename'])
+
+        if status != 200:
+            # A partial answer without its size is no use; fetch the whole wheel
+            _, data = self._get(file['url'])
+        # No range support: this is the whole wheel, so keep it for the collector
+        if file['sha256'] and hashlib.sha256(data).hexdigest() != file['sha256']:
+            raise DownloadError(f"{file['filename']}: sha256 mismatch")
+        if self.download_dir is not None:
+            self.download_dir.mkdir(parents=True, exist_ok=True)
+            part = self.download_dir / f"{file['filename']}.part"
+            part.write_bytes(data)
+            part.replace(self.download_dir / file['filename'])
+        self.stats['full'] += 1
+        return self._wheel_metadata(data, file['filename'])
+
+    @staticmethod
+    def _wheel_metadata(source, filename):
+        if isinstance(source, bytes):
+            source = io.BytesIO(source)
+        try:
+            with zipfile.ZipFile(source) as archive:
+                name = wheel_metadata_name(archive.namelist())
+                if name is None:
+                    raise DownloadError(f"{filename}: no .dist-info/METADATA in wheel")
+                return archive.read(name)
+        except zipfile.BadZipFile as e:
+            raise DownloadError(f"{filename}: {e}") from None
+
+
+def marker_environment(python_version, platform):
+    """Return the PEP 508 marker environment of a target."""
+    arch = platform.split('_', 1)[-1] if '_' in platform else platform
+    if platform.startswith('win'):
+        system, sys_platform, os_name = 'Windows', 'win32', 'nt'
+        machine = {'win_amd64': 'AMD64', 'win32': 'x86', 'win_arm64': 'ARM64'}.get(platform, 'AMD64')
+    elif platform.startswith('macosx'):
+        system, sys_platform, os_name = 'Darwin', 'darwin', 'posix'
+        machine = platform.rsplit('_', 1)[-1]
+        machine = 'x86_64' if machine in ('universal2', 'intel', 'universal') else machine
+    else:
+        system, sys_platform, os_name = 'Linux', 'linux', 'posix'
+        for prefix in ('manylinux_', 'musllinux_'):
+            if platform.startswith(prefix):
+                # manylinux_2_17_x86_64 -> x86_64
+                arch = platform[len(prefix):].split('_', 2)[-1]
+        machine = arch
+    return {
+        'implementation_name': 'cpython',
+        'implementation_version': f'{python_version}.0',
+        'os_name': os_name,
+        'platform_machine': machine,
+        'platform_python_implementation': 'CPython',
+        'platform_release': '',
+        'platform_system': system,
+        'platform_version': '',
+        'python_full_version': f'{python_version}.0',
+        'python_version': str(python_version),
+        'sys_platform': sys_platform,
+        'extra': '',
+    }
+
+
+class Candidate:
+    """One version of a project, with the file the target would install."""
+
+    def __init__(self, name, version, file, extras=frozenset()):
+        self.name = name
+        self.version = version
+        self.file = file
+        self.extras = extras
+
+    def __repr__(self):
+        return f"{self.name}=={self.version}"
+
+
+class Provider(resolvelib.AbstractProvider):
+    """resolvelib provider for one (python_version, platform) target."""
+
+    def __init__(self, client, python_version, platform, include_sdists=False):
+        self.client = client
+        self.python_version = Version(str(python_version))
+        self.environment = marker_environment(python_version, platform)
+        self.ranks = target_tags(python_version, platform)
+        self.include_sdists = include_sdists
+
+    def identify(self, requirement_or_candidate):
+        name = canonicalize_name(requirement_or_candidate.name)
+        extras = requirement_or_candidate.extras
+        return f"{name}[{','.join(sorted(extras))}]" if extras else name
+
+    def get_preference(self, identifier, resolutions, candidates, information, backtrack_causes):
+        # Pinned requirements first, then whatever backtracking pointed at
+        pinned = any(spec.operator in ('==', '===')
+                     for requirement, _ in information[identifier]
+                     for spec in requirement.specifier)
+        causes = {canonicalize_name(cause.requirement.name) for cause in backtrack_causes}
+        return (not pinned, identifier.split('[')[0] not in causes, identifier)
+
+    def versions(self, name):
+        """Return {Version: best file for the target}, skipping incompatible files."""
+        best = {}
+        for file in self.client.project_files(name):
+            parsed = parse_filename(file['filename'])
+            if parsed is None or (parsed['tags'] is None and not self.include_sdists):
+                continue
+            rank = file_rank(file['filename'], self.ranks)
+            if rank is None:
+                continue
+            if file['requires_python']:
+                try:
+                    if not SpecifierSet(file['requires_python']).contains(self.python_version):
+                        continue
+                except ValueError:
+                    pass
+            try:
+                version = Version(parsed['version'])
+            except InvalidVersion:
+                continue
+            if version not in best or rank < best[version][0]:
+                best[version] = (rank, parsed['version'], file)
+        return best
+
+    def find_matches(self, identifier, requirements, incompatibilities):
+        name = identifier.split('[')[0]
+        requirements = list(requirements[identifier])
+        extras = frozenset().union(*(requirement.extras for requirement in requirements))
+        specifier = SpecifierSet()
+        for requirement in requirements:
+            specifier &= requirement.specifier
+        excluded = {candidate.version for candidate in incompatibilities[identifier]}
+        pinned = any(spec.operator in ('==', '===') for spec in specifier)
+
+        versions = self.versions(name)
+        allowed = set(specifier.filter(versions))
+        candidates = []
+        for version in sorted(allowed, reverse=True):
+            _, raw_version, file = versions[version]
+            if raw_version in excluded or (file['yanked'] and not pinned):
+                continue
+            candidates.append(Candidate(name, raw_version, file, extras))
+        return candidates
+
+    def is_satisfied_by(self, requirement, candidate):
+        return requirement.specifier.contains(Version(candidate.version), prereleases=True)
+
+    def get_dependencies(self, candidate):
+        if candidate.file['filename'].endswith('.whl'):
+            metadata = self.client.metadata(candidate.file)
+        else:
+            return []
+        dependencies = []
+        if candidate.extras:
+            # An extra depends on its base project at the same version
+            dependencies.append(Requirement(f"{candidate.name}=={candidate.version}"))
+        for line in metadata.get_all('Requires-Dist') or []:
+            try:
+                requirement = Requirement(line)
+            except InvalidRequirement:
+                continue
+            if requirement.marker is not None:
+                wanted = candidate.extras or {''}
+                if not any(requirement.marker.evaluate(dict(self.environment, extra=extra))
+                           for extra in wanted):
+                    continue
+            elif candidate.extras:
+                # Unconditional requirements belong to the base candidate
+                continue
+            dependencies.append(requirement)
+        return dependencies
+
+
+def resolve(client, specs, python_version, platform, include_deps=True):
+    """Resolve specs for one target; return file records like the pip resolver's.
+
+    Raises RuntimeError if the specs cannot be satisfied.
+    """
+    try:
+        requirements = [Requirement(spec) for spec in specs]
+    except InvalidRequirement as e:
+        raise RuntimeError(f"Invalid requirement: {e}") from None
+    requested = {canonicalize_name(requirement.name) for requirement in requirements}
+    provider = Provider(client, python_version, platform, include_sdists=not include_deps)
+
+    if include_deps:
+        resolver = resolvelib.Resolver(provider, resolvelib.BaseReporter())
+        try:
+            result = resolver.resolve(requirements, max_rounds=MAX_ROUNDS)
+        except resolvelib.ResolutionImpossible as e:
+            causes = sorted({str(cause.requirement) for cause in e.causes})
+            raise RuntimeError(f"No versions satisfy {', '.join(causes)}") from None
+        except resolvelib.ResolutionTooDeep:
+            raise RuntimeError("Resolution did not finish (too much backtracking)") from None
+        except DownloadError as e:
+            raise RuntimeError(str(e)) from None
+        # Extras resolve to the same file as their base candidate
+        candidates = [candidate for candidate in result.mapping.values() if not candidate.extras]
+    else:
+        candidates = []
+        for requirement in requirements:
+            identifier = provider.identify(requirement)
+            matches = provider.find_matches(
+                identifier, {identifier: [requirement]}, {identifier: []})
+            if not matches:
+                raise RuntimeError(f"No versions satisfy {requirement}")
+            candidates.append(matches[0])
+
+    records = {}
+    for candidate in candidates:
+        records.setdefault(candidate.file['filename'], {
+            'name': candidate.name,
+            'version': candidate.version,
+            'filename': candidate.file['filename'],
+            'url': candidate.file['url'],
+            'sha256': candidate.file['sha256'],
+            'requested': candidate.name in requested,
+        })
+    return list(records.values())
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Resolve PyPI requirements from index metadata only')
+    parser.add_argument('specs', nargs='+', metavar='SPEC', help='Requirement, e.g. requests==2.31.0')
+    parser.add_argument('--index-url', default=DEFAULT_INDEX_URL,
+                        help=f'Simple index to resolve against (default: {DEFAULT_INDEX_URL})')
+    parser.add_argument('--python-version', default='3.11', help='Target Python version (default: 3.11)')
+    parser.add_argument('--platform', default='manylinux2014_x86_64',
+                        help='Target platform tag (default: manylinux2014_x86_64)')
+    parser.add_argument('--no-deps', action='store_true', help='Do not resolve dependencies')
+
+    args = parser.parse_args()
+
+    with Downloader() as downloader:
+        client = IndexClient(downloader, args.index_url)
+        try:
+            records = resolve(client, args.specs, args.python_version, args.platform,
+                              not args.no_deps)
+        except RuntimeError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+    for record in sorted(records, key=lambda record: record['name']):
+        print(f"{record['name']}=={record['version']}  {record['filename']}")
+    stats = client.stats
+    print(f"Metadata read from {stats['sidecar']} .metadata files, {stats['range']} range reads, "
+          f"{stats['local']} local wheels, {stats['full']} full downloads", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,637 @@
+#!/usr/bin/env python3
+"""
+RPM dependency resolution from yum/dnf repository metadata.
+
+For each repository, repodata/repomd.xml is read first, then the primary
+metadata it lists (and modules.yaml where there is one), fetched
+concurrently and checked against the checksums in repomd.xml. Packages of
+the requested architecture and noarch are parsed into a compact in-memory
+index: the versions of every package, and which packages provide each
+capability. Module packages of streams that are not a default are left
+out, as dnf does.
+
+From the requested packages, Requires are followed to their full
+transitive closure, together with Recommends where they can be met (dnf
+installs weak dependencies by default). For each requirement:
+
+- a package already selected that provides it satisfies it;
+- otherwise the package of that name is chosen, else a provider of the
+  capability, preferring the shortest name;
+- the newest version (compared as rpmvercmp does) is chosen;
+- rich dependencies ((a or b), (a if b), ...) are evaluated against what
+  is selected so far;
+- file requirements are looked up in the files primary lists, and only
+  when that fails is filelists metadata read, once, for the paths any
+  package requires.
+
+The result is one download list: location, size and checksum of every
+.rpm, for a single batch fetch. Conflicts and Obsoletes are not evaluated;
+the closure is solved in one pass. Nothing on the host (dnf, yum, rpm or
+its repository configuration) is used, so any release and architecture can
+be resolved from any machine:
+
+    python3 rpm_resolver.py --distribution rocky --release 9 \\
+        --architecture aarch64 curl git
+"""
+
+import argparse
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import re
+import shutil
+import subprocess
+import sys
+import xml.etree.ElementTree as ElementTree
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import yaml
+
+from downloader import DownloadError, Downloader
+
+
+# Repositories enabled by default, as URL templates; rhel is served by its
+# rebuild Rocky Linux, as the rockylinux container used to do
+DEFAULT_REPOSITORIES = {
+    'rocky': [
+        'https://dl.rockylinux.org/pub/rocky/{release}/BaseOS/{arch}/os/',
+        'https://dl.rockylinux.org/pub/rocky/{release}/AppStream/{arch}/os/',
+        'https://dl.rockylinux.org/pub/rocky/{release}/extras/{arch}/os/',
+    ],
+    'almalinux': [
+        'https://repo.almalinux.org/almalinux/{release}/BaseOS/{arch}/os/',
+        'https://repo.almalinux.org/almalinux/{release}/AppStream/{arch}/os/',
+        'https://repo.almalinux.org/almalinux/{release}/extras/{arch}/os/',
+    ],
+    'centos': [
+        'https://mirror.stream.centos.org/{release}-stream/BaseOS/{arch}/os/',
+        'https://mirror.stream.centos.org/{release}-stream/AppStream/{arch}/os/',
+    ],
+    'fedora': [
+        'https://dl.fedoraproject.org/pub/fedora/linux/releases/{release}/Everything/{arch}/os/',
+        'https://dl.fedoraproject.org/pub/fedora/linux/updates/{release}/Everything/{arch}/',
+    ],
+}
+DEFAULT_REPOSITORIES['rhel'] = DEFAULT_REPOSITORIES['rocky']
+
+REPO_NS = '{http://linux.duke.edu/metadata/repo}'
+COMMON_NS = '{http://linux.duke.edu/metadata/common}'
+RPM_NS = '{http://linux.duke.edu/metadata/rpm}'
+FILELISTS_NS = '{http://linux.duke.edu/metadata/filelists}'
+
+FLAGS = {'EQ': '=', 'LT': '<', 'LE': '<=', 'GT': '>', 'GE': '>='}
+RICH_OPERATORS = ('and', 'or', 'if', 'else', 'unless', 'with', 'without')
+EVR_RE = re.compile(r'^(?:(\d+):)?([^-]*)(?:-(.*))?$')
+
+
+def repositories(distribution, release, architecture, urls=None):
+    """Return the repository base URLs to read for one architecture.
+
+    urls replaces the defaults of the distribution; {release} and {arch}
+    in them are filled in either way. Raises ValueError for a distribution
+    without defaults when no urls are given.
+    """
+    templates = urls or DEFAULT_REPOSITORIES.get(distribution)
+    if not templates:
+        raise ValueError(f"No default repositories for {distribution}; "
+                         f"known: {', '.join(sorted(DEFAULT_REPOSITORIES))}")
+    bases = []
+    for template in templates:
+        base = template.replace('{release}', str(release)).replace('{arch}', architecture)
+        bases.append(base if base.endswith('/') else base + '/')
+    return bases
+
+
+def rpmvercmp(a, b):
+    """Compare two version (or release) strings as rpm does: -1, 0 or 1."""
+    if a == b:
+        return 0
+    i = j = 0
+    while i < len(a) or j < len(b):
+        while i < len(a) and not (a[i].isascii() and a[i].isalnum()) and a[i] not in '~^':
+            i += 1
+        while j < len(b) and not (b[j].isascii() and b[j].isalnum()) and b[j] not in '~^':
+            j += 1
+        # A tilde sorts before anything, even the end of the string
+        if (i < len(a) and a[i] == '~') or (j < len(b) and b[j] == '~'):
+            if not (i < len(a) and a[i] == '~'):
+                return 1
+            if not (j < len(b) and b[j] == '~'):
+                return -1
+            i += 1
+            j += 1
+            continue
+        # A caret sorts after the end of the string, before anything else
+        if (i < len(a) and a[i] == '^') or (j < len(b) and b[j] == '^'):
+            if i >= len(a):
+                return -1
+            if j >= len(b):
+                return 1
+            if a[i] != '^':
+                return 1
+            if b[j] != '^':
+                return -1
+            i += 1
+            j += 1
+            continue
+        if i >= len(a) or j >= len(b):
+            break
+        numeric = a[i].isdigit()
+        test = str.isdigit if numeric else (lambda c: c.isascii() and c.isalpha())
+        start_i, start_j = i, j
+        while i < len(a) and test(a[i]):
+            i += 1
+        while j < len(b) and test(b[j]):
+            j += 1
+        one, two = a[start_i:i], b[start_j:j]
+        if not two:
+            # Numeric segments are newer than alphabetic ones
+            return 1 if numeric else -1
+        if numeric:
+            one, two = one.lstrip('0'), two.lstrip('0')
+            if len(one) != len(two):
+                return 1 if len(one) > len(two) else -1
+        if one != two:
+            return 1 if one > two else -1
+    if i >= len(a) and j >= len(b):
+        return 0
+    return -1 if i >= len(a) else 1
+
+
+def parse_evr(value):
+    """Parse '[epoch:]version[-release]' into (epoch, version, release or None)."""
+    epoch, version, release = EVR_RE.match(value).groups()
+    return int(epoch or 0), version, release
+
+
+def compare_evr(a, b):
+    """Compare (epoch, version, release) tuples; a missing release matches any."""
+    if a[0] != b[0]:
+        return 1 if a[0] > b[0] else -1
+    result = rpmvercmp(a[1], b[1])
+    if result or a[2] is None or b[2] is None:
+        return result
+    return rpmvercmp(a[2], b[2])
+
+
+def evr_string(evr):
+    """Render an (epoch, version, release) tuple as rpm prints it."""
+    epoch, version, release = evr
+    text = f"{epoch}:{version}" if epoch else version
+    return f"{text}-{release}" if release is not None else text
+
+
+def ranges_overlap(provide_flags, provide_evr, require_flags, require_evr):
+    """Return True if a provide (flags, evr) meets a requirement, as rpmdsCompare does."""
+    if not provide_flags or not require_flags or provide_evr is None or require_evr is None:
+        return True
+    sense = compare_evr(provide_evr, require_evr)
+    if sense < 0:
+        return '>' in provide_flags or '<' in require_flags
+    if sense > 0:
+        return '<' in provide_flags or '>' in require_flags
+    return ('=' in provide_flags and '=' in require_flags) or \
+        ('<' in provide_flags and '<' in require_flags) or \
+        ('>' in provide_flags and '>' in require_flags)
+
+
+def parse_rich(text):
+    """Parse a rich dependency such as '(a >= 1 or (b if c))' into a tree.
+
+    Nodes are ('dep', name, flags, evr) or (operator, [operands]); an
+    if/unless node holds [then, condition] or [then, condition, else].
+    """
+    position = 0
+
+    def skip():
+        nonlocal position
+        while position < len(text) and text[position].isspace():
+            position += 1
+
+    def word():
+        nonlocal position
+        start = position
+        depth = 0
+        while position < len(text) and not text[position].isspace():
+            if text[position] == '(':
+                depth += 1
+            elif text[position] == ')':
+                if depth == 0:
+                    break
+                depth -= 1
+            position += 1
+        return text[start:position]
+
+    def operand():
+        nonlocal position
+        skip()
+        if text[position:position + 1] == '(':
+            return group()
+        name = word()
+        skip()
+        flags = evr = None
+        if text[position:position + 1] in ('<', '>', '='):
+            flags = word()
+            skip()
+            evr = parse_evr(word())
+        return ('dep', name, flags, evr)
+
+    def group():
+        nonlocal position
+        position += 1
+        operands = [operand()]
+        operator = None
+        while True:
+            skip()
+            if position >= len(text):
+                raise ValueError(f"Unbalanced rich dependency: {text}")
+            if text[position] == ')':
+                position += 1
+                break
+            keyword = word()
+            if keyword not in RICH_OPERATORS:
+                raise ValueError(f"Unknown operator {keyword!r} in {text}")
+            if keyword != 'else':
+                operator = operator or keyword
+            operands.append(operand())
+        if operator is None:
+            return operands[0]
+        return (operator, operands)
+
+    return group()
+
+
+def _entries(element, tag):
+    """Return the (name, flags, evr) entries of one rpm:<tag> list."""
+    found = element.find(f"{RPM_NS}{tag}")
+    if found is None:
+        return ()
+    entries = []
+    for entry in found.iter(f"{RPM_NS}entry"):
+        flags = FLAGS.get(entry.get('flags'))
+        evr = None
+        if entry.get('ver') is not None:
+            evr = (int(entry.get('epoch') or 0), entry.get('ver'), entry.get('rel'))
+        entries.append((sys.intern(entry.get('name')), flags, evr))
+    return tuple(entries)
+
+
+def parse_primary(data, base_url, architectures):
+    """Yield one record per package of primary.xml for the given architectures."""
+    for _, element in ElementTree.iterparse(io.BytesIO(data)):
+        if element.tag != f"{COMMON_NS}package":
+            continue
+        arch = element.findtext(f"{COMMON_NS}arch")
+        if arch not in architectures:
+            element.clear()
+            continue
+        version = element.find(f"{COMMON_NS}version")
+        checksum = element.find(f"{COMMON_NS}checksum")
+        location = element.find(f"{COMMON_NS}location")
+        size = element.find(f"{COMMON_NS}size")
+        rpm_format = element.find(f"{COMMON_NS}format")
+        evr = (int(version.get('epoch') or 0), version.get('ver'), version.get('rel'))
+        name = element.findtext(f"{COMMON_NS}name")
+        yield {
+            'name': name,
+            'evr': evr,
+            'version': evr_string(evr),
+            'arch': arch,
+            'nevra': f"{name}-{evr[0]}:{evr[1]}-{evr[2]}.{arch}",
+            'pkgid': checksum.text.strip(),
+            'checksum_type': checksum.get('type'),
+            'filename': location.get('href'),
+            'url': (location.get('{http://www.w3.org/XML/1998/namespace}base') or base_url) +
+                   location.get('href'),
+            'size': int(size.get('package') or 0),
+            'requires': _entries(rpm_format, 'requires'),
+            'recommends': _entries(rpm_format, 'recommends'),
+            'provides': _entries(rpm_format, 'provides'),
+            'files': tuple(sys.intern(item.text) for item in rpm_format.iter(f"{COMMON_NS}file")),
+        }
+        element.clear()
+
+
+def parse_repomd(text):
+    """Return {type: (location, checksum type, checksum)} from repomd.xml."""
+    metadata = {}
+    for data in ElementTree.fromstring(text).iter(f"{REPO_NS}data"):
+        checksum = data.find(f"{REPO_NS}checksum")
+        location = data.find(f"{REPO_NS}location")
+        if checksum is None or location is None:
+            continue
+        metadata[data.get('type')] = (location.get('href'), checksum.get('type'),
+                                      checksum.text.strip())
+    return metadata
+
+
+def decompress(data, path):
+    """Decompress metadata by the extension of its path."""
+    if path.endswith('.gz'):
+        return gzip.decompress(data)
+    if path.endswith('.xz'):
+        return lzma.decompress(data)
+    if path.endswith('.bz2'):
+        return bz2.decompress(data)
+    if path.endswith('.zst'):
+        # The standard library has no zstd; the command-line tool is used instead
+        if shutil.which('zstd') is None:
+            raise RuntimeError(f"zstd is required to read {path}")
+        return subprocess.run(['zstd', '-dc'], input=data, capture_output=True, check=True).stdout
+    return data
+
+
+def default_streams(documents):
+    """Return {module: default stream} and {(module, stream): [NEVRA]} from modules.yaml."""
+    defaults = {}
+    artifacts = {}
+    for document in documents:
+        if not isinstance(document, dict) or not isinstance(document.get('data'), dict):
+            continue
+        data = document['data']
+        if document.get('document') == 'modulemd-defaults' and data.get('stream'):
+            defaults[data['module']] = str(data['stream'])
+        elif document.get('document') == 'modulemd':
+            key = (data.get('name'), str(data.get('stream')))
+            artifacts.setdefault(key, []).extend((data.get('artifacts') or {}).get('rpms') or [])
+    return defaults, artifacts
+
+
+class RepoIndex:
+    """Every package version of one architecture, with what each provides."""
+
+    def __init__(self, architecture):
+        self.architecture = architecture
+        self.packages = {}
+        self.provides = {}
+        self.files = {}
+        self.seen = set()
+        self.filelists = []
+        self.filelists_loaded = False
+        self.load_filelists = None
+
+    def add(self, record):
+        key = (record['name'], record['evr'], record['arch'])
+        if key in self.seen:
+            return
+        self.seen.add(key)
+        self.packages.setdefault(record['name'], []).append(record)
+        for name, flags, evr in record['provides']:
+            self.provides.setdefault(name, []).append((record, flags, evr))
+        for path in record['files']:
+            self.files.setdefault(path, []).append(record)
+
+    def __len__(self):
+        return len(self.seen)
+
+    def file_requirements(self):
+        """Every path a package of the index requires."""
+        return {name for records in self.packages.values() for record in records
+                for name, _, _ in record['requires'] + record['recommends'] if name.startswith('/')}
+
+    def file_providers(self, path):
+        """Packages holding a file; filelists metadata is read the first time primary lacks one."""
+        if path not in self.files and not self.filelists_loaded and self.load_filelists:
+            self.filelists_loaded = True
+            self.load_filelists(self)
+        return self.files.get(path, [])
+
+    def providers(self, name, flags=None, evr=None):
+        """Packages providing a capability, the package of that name first, then newest first."""
+        if name.startswith('/'):
+            matching = list(self.file_providers(name))
+        else:
+            matching = [record for record, provided_flags, provided_evr in self.provides.get(name, [])
+                        if ranges_overlap(provided_flags, provided_evr, flags, evr)]
+        unique = {id(record): record for record in matching}.values()
+        return sorted(unique, key=lambda record: (
+            record['name'] != name, len(record['name']), record['name'], _EVR(record['evr'])))
+
+
+class _EVR:
+    """Sort key ordering newest first."""
+    __slots__ = ('evr',)
+
+    def __init__(self, evr):
+        self.evr = evr
+
+    def __lt__(self, other):
+        return compare_evr(self.evr, other.evr) > 0
+
+
+def fetch_index(downloader, bases, architecture):
+    """Read the primary metadata of every repository into a RepoIndex.
+
+    Repositories whose repomd.xml is missing are skipped with a note.
+    Raises RuntimeError if no metadata could be read at all.
+    """
+    def fetch_repomd(base):
+        try:
+            status, _, body = downloader.request(f"{base}repodata/repomd.xml")
+        except DownloadError:
+            # file:// repositories report a missing file as an error rather than a 404
+            return None
+        return parse_repomd(body) if status == 200 else None
+
+    def fetch_metadata(job):
+        base, (location, checksum_type, checksum) = job
+        url = base + location
+        status, _, body = downloader.request(url)
+        if status != 200:
+            raise DownloadError(f"{url}: HTTP {status}")
+        if hashlib.new(checksum_type, body).hexdigest() != checksum:
+            raise DownloadError(f"{url}: {checksum_type} does not match repomd.xml")
+        return decompress(body, location)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(bases))) as executor:
+        repomds = list(executor.map(fetch_repomd, bases))
+
+    jobs = []
+    module_jobs = []
+    filelists = []
+    for base, repomd in zip(bases, repomds):
+        if repomd is None:
+            print(f"  Note: {base} has no repodata/repomd.xml, skipping")
+            continue
+        if 'primary' not in repomd:
+            print(f"  Note: {base}repodata/repomd.xml lists no primary metadata, skipping")
+            continue
+        jobs.append((base, repomd['primary']))
+        if 'modules' in repomd:
+            module_jobs.append((base, repomd['modules']))
+        if 'filelists' in repomd:
+            filelists.append((base, repomd['filelists']))
+
+    if not jobs:
+        raise RuntimeError(f"No repository metadata found for {architecture}")
+
+    with ThreadPoolExecutor(max_workers=len(jobs) + len(module_jobs)) as executor:
+        primaries = list(executor.map(fetch_metadata, jobs))
+        modules = list(executor.map(fetch_metadata, module_jobs))
+
+    # Packages of module streams that are not a default are hidden, as dnf does
+    defaults, artifacts = default_streams(
+        document for data in modules for document in yaml.safe_load_all(data))
+    hidden = {nevra for (module, stream), nevras in artifacts.items()
+              if defaults.get(module) != stream for nevra in nevras}
+
+    index = RepoIndex(architecture)
+    for (base, _), data in zip(jobs, primaries):
+        for record in parse_primary(data, base, (architecture, 'noarch')):
+            if record['nevra'] not in hidden:
+                index.add(record)
+
+    def load_filelists(index):
+        wanted = index.file_requirements()
+        by_pkgid = {record['pkgid']: record for records in index.packages.values() for record in records}
+        with ThreadPoolExecutor(max_workers=max(1, len(filelists))) as executor:
+            for data in executor.map(fetch_metadata, filelists):
+                for _, element in ElementTree.iterparse(io.BytesIO(data)):
+                    if element.tag != f"{FILELISTS_NS}package":
+                        continue
+                    record = by_pkgid.get(element.get('pkgid'))
+                    if record is not None:
+                        for item in element.iter(f"{FILELISTS_NS}file"):
+                            if item.text in wanted and record not in index.files.get(item.text, []):
+                                index.files.setdefault(sys.intern(item.text), []).append(record)
+                    element.clear()
+
+    index.load_filelists = load_filelists if filelists else None
+    return index
+
+
+def resolve(index, names, include_deps=True):
+    """Compute the closure of the requested packages.
+
+    Returns (records sorted by package name, requested names not found,
+    [unsatisfied dependency descriptions]).
+    """
+    selected = {}
+    provided = {}
+    queue = deque()
+    missing = []
+    unsatisfied = []
+
+    def select(record):
+        selected[record['name']] = record
+        provided.setdefault(record['name'], []).append(('=', record['evr']))
+        for name, flags, evr in record['provides']:
+            provided.setdefault(name, []).append((flags, evr))
+        queue.append(record)
+
+    def satisfied(node):
+        if node[0] == 'dep':
+            _, name, flags, evr = node
+            if name.startswith('/'):
+                return any(selected.get(record['name']) is record
+                           for record in index.file_providers(name))
+            return any(ranges_overlap(provided_flags, provided_evr, flags, evr)
+                       for provided_flags, provided_evr in provided.get(name, []))
+        operator, operands = node
+        if operator in ('and', 'with'):
+            return all(satisfied(operand) for operand in operands)
+        if operator == 'or':
+            return any(satisfied(operand) for operand in operands)
+        if operator == 'without':
+            return satisfied(operands[0])
+        condition = satisfied(operands[1])
+        if condition == (operator == 'if'):
+            return satisfied(operands[0])
+        return satisfied(operands[2]) if len(operands) > 2 else True
+
+    def install(node):
+        """Select what a requirement needs; return False if it cannot be met."""
+        if satisfied(node):
+            return True
+        if node[0] == 'dep':
+            _, name, flags, evr = node
+            for record in index.providers(name, flags, evr):
+                # Another version of an already selected package cannot be added
+                if record['name'] not in selected:
+                    select(record)
+                    return True
+            return False
+        operator, operands = node
+        if operator in ('and', 'with'):
+            return all([install(operand) for operand in operands])
+        if operator == 'or':
+            return any(install(operand) for operand in operands)
+        if operator == 'without':
+            return install(operands[0])
+        condition = satisfied(operands[1])
+        if condition == (operator == 'if'):
+            return install(operands[0])
+        return install(operands[2]) if len(operands) > 2 else True
+
+    def describe(name, flags, evr):
+        return f"{name} {flags} {evr_string(evr)}" if flags and evr else name
+
+    def requirement(name, flags, evr):
+        return parse_rich(name) if name.startswith('(') else ('dep', name, flags, evr)
+
+    for name in names:
+        if name in selected or install(('dep', name, None, None)):
+            continue
+        missing.append(name)
+
+    while include_deps and queue:
+        record = queue.popleft()
+        for name, flags, evr in record['requires']:
+            if name.startswith('rpmlib('):
+                continue
+            try:
+                node = requirement(name, flags, evr)
+            except ValueError as e:
+                unsatisfied.append(f"{record['name']}: {e}")
+                continue
+            if not install(node):
+                unsatisfied.append(f"{record['name']}: {describe(name, flags, evr)}")
+        # Weak dependencies are taken where they can be met, and never reported
+        for name, flags, evr in record['recommends']:
+            try:
+                install(requirement(name, flags, evr))
+            except ValueError:
+                pass
+
+    return sorted(selected.values(), key=lambda record: record['name']), missing, unsatisfied
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Resolve RPM packages from repository metadata')
+    parser.add_argument('packages', nargs='+', metavar='PACKAGE', help='Package name or capability')
+    parser.add_argument('--distribution', default='rocky', choices=sorted(DEFAULT_REPOSITORIES),
+                        help='Distribution whose repositories to read (default: rocky)')
+    parser.add_argument('--release', default='9', help='Release (default: 9)')
+    parser.add_argument('--architecture', default='x86_64', help='Architecture (default: x86_64)')
+    parser.add_argument('--repo', action='append', metavar='URL',
+                        help='Repository URL (http(s) or file://) to read instead of the defaults; '
+                             '{release} and {arch} are filled in. May be repeated')
+    parser.add_argument('--no-deps', action='store_true', help='Do not resolve dependencies')
+
+    args = parser.parse_args()
+
+    bases = repositories(args.distribution, args.release, args.architecture, args.repo)
+    with Downloader() as downloader:
+        try:
+            index = fetch_index(downloader, bases, args.architecture)
+            records, missing, unsatisfied = resolve(index, args.packages, not args.no_deps)
+        except (RuntimeError, DownloadError) as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+
+    for record in records:
+        print(f"{record['name']} {record['version']} {record['arch']}  {record['filename']}")
+    for name in missing:
+        print(f"Warning: {name} not found", file=sys.stderr)
+    for description in unsatisfied:
+        print(f"Warning: unsatisfied dependency {description}", file=sys.stderr)
+    print(f"{len(records)} packages from an index of {len(index)}, "
+          f"{sum(record['size'] for record in records)} bytes", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Read-only npm registry for a collected npm directory.
+
+Serves the packuments npm_registry.py wrote to registry/ and the tarballs
+in tarballs/, so npm installs straight from the bundle:
+
+    python3 serve_registry.py --port 4873
+    npm install --registry http://localhost:4873/ express
+
+Tarball URLs in the packuments are rewritten to the host and port each
+request was made to, so the registry works under any name it is reached
+by. Only the standard library is used; this file is copied into the
+bundle next to the metadata it serves.
+
+To host the directory with any other static file server instead, rewrite
+the packuments once for the URL it will be served at, point npm at
+<URL>registry/, and have the server answer directory requests with
+index.json:
+
+    python3 serve_registry.py --rebase https://mirror.example.com/npm/
+"""
+
+import argparse
+import email.utils
+import json
+import os
+import re
+import sys
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+STATE_FILE = '.registry-state.json'
+
+DEFAULT_PORT = 4873
+
+# npm package names, scoped or not
+NAME_RE = re.compile(r'^(@[a-z0-9][\w.-]*/)?[a-z0-9_][\w.-]*$', re.IGNORECASE)
+STORE_NAME_RE = re.compile(r'^(sha512|sha384|sha256|sha1)-[0-9a-f]+\.tgz$')
+
+
+def read_base_url(npm_dir):
+    """Return the base URL the packuments were written with."""
+    with open(npm_dir / 'registry' / STATE_FILE, 'r') as f:
+        return json.load(f)['base_url']
+
+
+def rebase(npm_dir, base_url):
+    """Rewrite every packument's tarball URLs to base_url; return how many changed."""
+    if not base_url.endswith('/'):
+        base_url += '/'
+    state_path = npm_dir / 'registry' / STATE_FILE
+    with open(state_path, 'r') as f:
+        state = json.load(f)
+    old = f'"{state["base_url"]}tarballs/'
+    new = f'"{base_url}tarballs/'
+    changed = 0
+    for path in (npm_dir / 'registry').rglob('index.json'):
+        text = path.read_text()
+        if old in text and old != new:
+            path.write_text(text.replace(old, new))
+            changed += 1
+    state['base_url'] = base_url
+    tmp = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+    return changed
+
+
+class RegistryHandler(BaseHTTPRequestHandler):
+    """Answers packument and tarball requests from the npm directory."""
+
+    npm_dir = None
+    base_url = None
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        path = urllib.parse.unquote(urllib.parse.urlsplit(self.path).path).lstrip('/')
+        if path.startswith('tarballs/'):
+            filename = path[len('tarballs/'):]
+            if not STORE_NAME_RE.match(filename):
+                return self.send_error(404)
+            return self.send_file(self.npm_dir / 'tarballs' / filename,
+                                  'application/octet-stream', send_body)
+
+        name = path.rstrip('/')
+        if not NAME_RE.match(name):
+            return self.send_error(404)
+        packument = self.npm_dir / 'registry' / name / 'index.json'
+        try:
+            stat = packument.stat()
+            body = packument.read_bytes()
+        except OSError:
+            return self.send_error(404)
+        host = self.headers.get('Host') or f"{self.server.server_address[0]}:{self.server.server_address[1]}"
+        # Clients revalidate cached packuments; the body differs per host name
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}-{zlib.crc32(host.encode()):x}"'
+        last_modified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = body.replace(f'"{self.base_url}tarballs/'.encode(),
+                            f'"http://{host}/tarballs/'.encode())
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', last_modified)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def send_file(self, path, content_type, send_body):
+        try:
+            f = open(path, 'rb')
+        except OSError:
+            return self.send_error(404)
+        with f:
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.end_headers()
+            if send_body:
+                while True:
+                    chunk = f.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Serve a collected npm directory as a registry')
+    parser.add_argument('--dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help='npm directory holding registry/ and tarballs/ '
+                             '(default: the directory of this script)')
+    parser.add_argument('--bind', default='0.0.0.0', help='Address to listen on (default: 0.0.0.0)')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help=f'Port to listen on (default: {DEFAULT_PORT})')
+    parser.add_argument('--rebase', metavar='URL',
+                        help='Rewrite tarball URLs for hosting the directory at URL, then exit')
+
+    args = parser.parse_args()
+
+    npm_dir = Path(args.dir)
+    try:
+        base_url = read_base_url(npm_dir)
+    except (OSError, ValueError, KeyError):
+        print(f"Error: {npm_dir} has no registry metadata (registry/{STATE_FILE})", file=sys.stderr)
+        sys.exit(1)
+
+    if args.rebase:
+        changed = rebase(npm_dir, args.rebase)
+        print(f"Rewrote {changed} packuments for {args.rebase}")
+        return
+
+    RegistryHandler.npm_dir = npm_dir
+    RegistryHandler.base_url = base_url
+    server = ThreadingHTTPServer((args.bind, args.port), RegistryHandler)
+    print(f"Serving npm registry from {npm_dir} on http://{args.bind}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
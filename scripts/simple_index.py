@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Static PEP 503 / PEP 691 simple index for a directory of Python packages.
+
+Each project gets simple/<project>/index.html and index.json listing its
+files with sha256 fragments and Requires-Python, linking back into the
+package directory. The root index.html and index.json list the projects, so
+
+    pip install --index-url file:///path/to/pypi/simple <package>
+
+works offline, as does serving the pypi/ directory over HTTP.
+
+With --metadata, each wheel's METADATA is also written next to it as a
+PEP 658 <file>.metadata sidecar and advertised on the pages. Resolvers can
+then read dependencies without fetching whole wheels. This also makes the
+index a faithful local stand-in for PyPI when testing pypi_resolver.py.
+
+What was learned about each file (size, mtime, sha256, Requires-Python) is
+kept in simple/.index-state.json. A rebuild only hashes new or changed files
+and only rewrites the pages of projects whose files changed.
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import shutil
+import sys
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.parser import HeaderParser
+from pathlib import Path
+
+from artifact_cache import sha256_file, write_if_changed
+
+
+STATE_FILE = '.index-state.json'
+STATE_VERSION = 2
+
+SDIST_EXTENSIONS = ('.tar.gz', '.tar.bz2', '.tar.xz', '.tgz', '.zip')
+
+DEFAULT_WORKERS = os.cpu_count() or 4
+
+
+def normalize_name(name):
+    """Normalize a project name as PEP 503 does."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def parse_filename(filename):
+    """Parse a wheel or sdist filename.
+
+    Returns {'project', 'version', 'tags'} where tags is the set of
+    (python, abi, platform) tags a wheel supports and None for an sdist,
+    or None if the file is neither.
+    """
+    if filename.endswith('.whl'):
+        parts = filename[:-len('.whl')].split('-')
+        if len(parts) not in (5, 6):
+            return None
+        name, version = parts[0], parts[1]
+        python_tags, abi_tags, platform_tags = parts[-3:]
+        tags = {(python, abi, platform)
+                for python in python_tags.split('.')
+                for abi in abi_tags.split('.')
+                for platform in platform_tags.split('.')}
+        return {'project': normalize_name(name), 'version': version, 'tags': tags}
+
+    for extension in SDIST_EXTENSIONS:
+        if filename.endswith(extension):
+            stem = filename[:-len(extension)]
+            # The version is the part after the last '-' that starts with a digit
+            match = re.match(r'^(.+?)-(\d[^-]*)$', stem)
+            if match is None:
+                return None
+            return {'project': normalize_name(match.group(1)), 'version': match.group(2),
+                    'tags': None}
+    return None
+
+
+def wheel_metadata_name(names):
+    """Return the top-level *.dist-info/METADATA entry among archive names, or None."""
+    for name in names:
+        if name.count('/') == 1 and name.endswith('.dist-info/METADATA'):
+            return name
+    return None
+
+
+def read_metadata(path):
+    """Return the core metadata (METADATA or PKG-INFO) of a wheel or sdist as bytes, or None."""
+    try:
+        if path.name.endswith('.whl'):
+            with zipfile.ZipFile(path) as archive:
+                name = wheel_metadata_name(archive.namelist())
+                return archive.read(name) if name else None
+        if path.name.endswith('.zip'):
+            with zipfile.ZipFile(path) as archive:
+                for name in archive.namelist():
+                    if name.count('/') == 1 and name.endswith('/PKG-INFO'):
+                        return archive.read(name)
+        else:
+            with tarfile.open(path, 'r:*') as archive:
+                for member in archive:
+                    if member.isfile() and member.name.count('/') == 1 \
+                            and member.name.endswith('/PKG-INFO'):
+                        return archive.extractfile(member).read()
+    except (OSError, zipfile.BadZipFile, tarfile.TarError, EOFError):
+        pass
+    return None
+
+
+def parse_metadata(data):
+    """Parse core metadata bytes into an email.message.Message."""
+    return HeaderParser().parsestr(data.decode('utf-8', 'replace'))
+
+
+def describe_file(path):
+    """Hash a package file and read its Requires-Python."""
+    stat = path.stat()
+    metadata = read_metadata(path)
+    requires_python = parse_metadata(metadata).get('Requires-Python') if metadata else None
+    info = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256_file(path),
+        'requires_python': requires_python.strip() if requires_python else None,
+        'metadata_sha256': None,
+    }
+    if metadata is not None and path.name.endswith('.whl'):
+        info['metadata_sha256'] = hashlib.sha256(metadata).hexdigest()
+    return info
+
+
+def project_pages(project, files, href_prefix, metadata=False):
+    """Return (index.html, index.json) for one project.
+
+    With metadata, wheels advertise their PEP 658 .metadata sidecar.
+    """
+    links = []
+    json_files = []
+    for filename, info in sorted(files.items()):
+        url = f"{href_prefix}{filename}"
+        attrs = f'href="{html.escape(url)}#sha256={info["sha256"]}"'
+        if info['requires_python']:
+            attrs += f' data-requires-python="{html.escape(info["requires_python"])}"'
+        if metadata and info['metadata_sha256']:
+            # PEP 714 renamed the attribute; older clients still read the PEP 658 name
+            attrs += (f' data-core-metadata="sha256={info["metadata_sha256"]}"'
+                      f' data-dist-info-metadata="sha256={info["metadata_sha256"]}"')
+        links.append(f'    <a {attrs}>{html.escape(filename)}</a><br/>')
+
+        entry = {'filename': filename, 'url': url, 'hashes': {'sha256': info['sha256']},
+                 'size': info['size']}
+        if info['requires_python']:
+            entry['requires-python'] = info['requires_python']
+        if metadata and info['metadata_sha256']:
+            entry['core-metadata'] = {'sha256': info['metadata_sha256']}
+            entry['dist-info-metadata'] = entry['core-metadata']
+        json_files.append(entry)
+
+    versions = sorted({parse_filename(filename)['version'] for filename in files})
+    page = (
+        '<!DOCTYPE html>\n'
+        '<html>\n'
+        '  <head>\n'
+        '    <meta name="pypi:repository-version" content="1.1">\n'
+        f'    <title>Links for {html.escape(project)}</title>\n'
+        '  </head>\n'
+        '  <body>\n'
+        f'    <h1>Links for {html.escape(project)}</h1>\n'
+        + '\n'.join(links) + '\n'
+        '  </body>\n'
+        '</html>\n'
+    )
+    document = {'meta': {'api-version': '1.1'}, 'name': project,
+                'versions': versions, 'files': json_files}
+    return page, json.dumps(document, indent=2) + '\n'
+
+
+def root_pages(projects):
+    """Return (index.html, index.json) listing every project."""
+    links = [f'    <a href="{html.escape(project)}/">{html.escape(project)}</a><br/>'
+             for project in projects]
+    page = (
+        '<!DOCTYPE html>\n'
+        '<html>\n'
+        '  <head>\n'
+        '    <meta name="pypi:repository-version" content="1.1">\n'
+        '    <title>Simple index</title>\n'
+        '  </head>\n'
+        '  <body>\n'
+        + '\n'.join(links) + '\n'
+        '  </body>\n'
+        '</html>\n'
+    )
+    document = {'meta': {'api-version': '1.1'},
+                'projects': [{'name': project} for project in projects]}
+    return page, json.dumps(document, indent=2) + '\n'
+
+
+def build_index(packages_dir, simple_dir, workers=DEFAULT_WORKERS, metadata=False):
+    """Build or update the simple index for packages_dir in simple_dir.
+
+    With metadata, PEP 658 .metadata sidecars are written next to the wheels.
+
+    Returns (files indexed, projects, projects rewritten).
+    """
+    packages_dir = Path(packages_dir)
+    simple_dir = Path(simple_dir)
+    simple_dir.mkdir(parents=True, exist_ok=True)
+    state_path = simple_dir / STATE_FILE
+
+    previous = {}
+    rewrite_all = True
+    try:
+        with open(state_path, 'r') as f:
+            state = json.load(f)
+        if state.get('version') == STATE_VERSION:
+            previous = state['files']
+            rewrite_all = state.get('metadata', False) != metadata
+    except (OSError, ValueError, KeyError):
+        pass
+
+    # Only files whose size or mtime changed are hashed again
+    current = {}
+    stale = []
+    with os.scandir(packages_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or entry.name.endswith(('.part', '.metadata')):
+                continue
+            parsed = parse_filename(entry.name)
+            if parsed is None:
+                print(f"  Warning: Skipping {entry.name}: not a wheel or sdist")
+                continue
+            stat = entry.stat()
+            known = previous.get(entry.name)
+            if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+                current[entry.name] = known
+            else:
+                stale.append(entry.name)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for filename, info in zip(stale, executor.map(
+                lambda name: describe_file(packages_dir / name), stale)):
+            info['project'] = parse_filename(filename)['project']
+            current[filename] = info
+
+    projects = {}
+    for filename, info in current.items():
+        projects.setdefault(info['project'], {})[filename] = info
+
+    # A project is rewritten when any of its files was added, changed or removed
+    changed = {current[name]['project'] for name in stale}
+    changed |= {info['project'] for name, info in previous.items() if name not in current}
+    changed |= {project for project in projects
+                if rewrite_all or not (simple_dir / project / 'index.html').exists()}
+
+    if metadata:
+        for filename, info in current.items():
+            sidecar = packages_dir / f"{filename}.metadata"
+            if info['metadata_sha256'] and not sidecar.exists():
+                sidecar.write_bytes(read_metadata(packages_dir / filename))
+                changed.add(info['project'])
+    # Sidecars of files that are gone are removed with them
+    for filename in previous:
+        if filename not in current:
+            (packages_dir / f"{filename}.metadata").unlink(missing_ok=True)
+
+    href_prefix = os.path.relpath(packages_dir, simple_dir / 'project').replace(os.sep, '/') + '/'
+    for project in sorted(changed):
+        project_dir = simple_dir / project
+        if project not in projects:
+            shutil.rmtree(project_dir, ignore_errors=True)
+            continue
+        project_dir.mkdir(exist_ok=True)
+        page, document = project_pages(project, projects[project], href_prefix, metadata)
+        write_if_changed(project_dir / 'index.html', page)
+        write_if_changed(project_dir / 'index.json', document)
+
+    page, document = root_pages(sorted(projects))
+    write_if_changed(simple_dir / 'index.html', page)
+    write_if_changed(simple_dir / 'index.json', document)
+
+    tmp = state_path.with_name(state_path.name + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump({'version': STATE_VERSION, 'metadata': metadata, 'files': current},
+                  f, indent=1, sort_keys=True)
+    os.replace(tmp, state_path)
+
+    return len(current), len(projects), len(changed)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description='Build a static PEP 503/691 simple index')
+    parser.add_argument('packages_dir', help='Directory holding the wheels and sdists')
+    parser.add_argument('simple_dir', help='Directory to write the index to')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Files hashed at once (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--metadata', action='store_true',
+                        help='Write PEP 658 .metadata sidecars next to the wheels')
+
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.packages_dir):
+        print(f"Error: {args.packages_dir} is not a directory", file=sys.stderr)
+        sys.exit(1)
+    files, projects, rewritten = build_index(args.packages_dir, args.simple_dir, args.workers,
+                                           args.metadata)
+    print(f"Indexed {files} files in {projects} projects ({rewritten} project pages updated)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Wheel tag compatibility for (python_version, platform) targets.
+
+target_tags lists the (python, abi, platform) tags an interpreter of the
+given version on the given platform accepts, best first, in the order
+pip ranks them. Platforms are expanded the way pip expands --platform:
+manylinux2014_x86_64 also accepts manylinux_2_17_x86_64 and every older
+manylinux tag, and likewise for musllinux and macOS.
+"""
+
+import re
+
+from simple_index import parse_filename
+
+
+# Legacy manylinux names and the glibc version each one stands for
+MANYLINUX_ALIASES = {
+    'manylinux1': (2, 5),
+    'manylinux2010': (2, 12),
+    'manylinux2014': (2, 17),
+}
+
+# Oldest glibc a manylinux_2_Y tag exists for, per architecture
+MANYLINUX_MIN_GLIBC = {'x86_64': 5, 'i686': 5}
+MANYLINUX_DEFAULT_MIN_GLIBC = 17
+
+
+def expand_platform(platform):
+    """Return the platform tags a --platform value accepts, best first."""
+    match = re.match(r'^(manylinux1|manylinux2010|manylinux2014)_(.+)$', platform)
+    if match:
+        major, minor = MANYLINUX_ALIASES[match.group(1)]
+        return _manylinux(major, minor, match.group(2))
+
+    match = re.match(r'^manylinux_(\d+)_(\d+)_(.+)$', platform)
+    if match:
+        return _manylinux(int(match.group(1)), int(match.group(2)), match.group(3))
+
+    match = re.match(r'^musllinux_(\d+)_(\d+)_(.+)$', platform)
+    if match:
+        major, minor, arch = int(match.group(1)), int(match.group(2)), match.group(3)
+        return [f'musllinux_{major}_{m}_{arch}' for m in range(minor, -1, -1)]
+
+    match = re.match(r'^macosx_(\d+)_(\d+)_(.+)$', platform)
+    if match:
+        return _macosx(int(match.group(1)), int(match.group(2)), match.group(3))
+
+    return [platform]
+
+
+def _manylinux(major, minor, arch):
+    tags = []
+    oldest = MANYLINUX_MIN_GLIBC.get(arch, MANYLINUX_DEFAULT_MIN_GLIBC)
+    legacy = {version: name for name, version in MANYLINUX_ALIASES.items()}
+    for glibc_minor in range(minor, oldest - 1, -1):
+        tags.append(f'manylinux_{major}_{glibc_minor}_{arch}')
+        if (major, glibc_minor) in legacy:
+            tags.append(f'{legacy[(major, glibc_minor)]}_{arch}')
+    return tags
+
+
+def _macosx(major, minor, arch):
+    arches = [arch]
+    if arch in ('x86_64', 'arm64'):
+        arches.append('universal2')
+    if arch == 'x86_64':
+        arches += ['intel', 'fat64', 'fat3', 'universal']
+
+    versions = []
+    if major >= 11:
+        versions += [(m, 0) for m in range(major, 10, -1)]
+        minor = 16 if arch == 'x86_64' else -1
+        major = 10
+    if major == 10:
+        versions += [(10, m) for m in range(minor, -1, -1)]
+    return [f'macosx_{v_major}_{v_minor}_{a}' for v_major, v_minor in versions for a in arches]
+
+
+def target_tags(python_version, platform):
+    """Return {(python, abi, platform): rank} for a target; lower ranks are preferred."""
+    major, minor = (int(part) for part in str(python_version).split('.')[:2])
+    cpython = f'cp{major}{minor}'
+    platforms = expand_platform(platform)
+
+    ordered = []
+    # Interpreter-specific wheels, then the stable ABI of this and older versions
+    for plat in platforms:
+        ordered += [(cpython, cpython, plat), (cpython, 'abi3', plat), (cpython, 'none', plat)]
+    for older in range(minor - 1, 1, -1):
+        ordered += [(f'cp{major}{older}', 'abi3', plat) for plat in platforms]
+    # Generic Python wheels for the platform, then pure-Python wheels
+    for version in [f'py{major}{minor}', f'py{major}'] + \
+            [f'py{major}{older}' for older in range(minor - 1, -1, -1)]:
+        ordered += [(version, 'none', plat) for plat in platforms]
+    ordered.append((cpython, 'none', 'any'))
+    for version in [f'py{major}{minor}', f'py{major}'] + \
+            [f'py{major}{older}' for older in range(minor - 1, -1, -1)]:
+        ordered.append((version, 'none', 'any'))
+
+    ranks = {}
+    for tag in ordered:
+        ranks.setdefault(tag, len(ranks))
+    return ranks
+
+
+def file_rank(filename, ranks):
+    """Return the best rank of a wheel for a target, or None if it is incompatible.
+
+    sdists are compatible with every target and rank after all wheels.
+    """
+    parsed = parse_filename(filename)
+    if parsed is None:
+        return None
+    if parsed['tags'] is None:
+        return len(ranks)
+    matching = [ranks[tag] for tag in parsed['tags'] if tag in ranks]
+    return min(matching) if matching else None
@@ -0,0 +1,175 @@
+import hashlib
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+
+SCRIPTS_DIR = Path(__file__).resolve().parent.parent / 'scripts'
+FIXTURES_DIR = Path(__file__).resolve().parent / 'fixtures'
+
+sys.path.insert(0, str(SCRIPTS_DIR))
+
+
+@pytest.fixture
+def fixtures_dir():
+    return FIXTURES_DIR
+
+
+@pytest.fixture
+def npm_registry():
+    """Serve tests/fixtures/npm with serve_registry.py on localhost; yield its URL."""
+    from serve_registry import RegistryHandler, read_base_url
+
+    npm_dir = FIXTURES_DIR / 'npm'
+    handler = type('FixtureRegistryHandler', (RegistryHandler,), {
+        'npm_dir': npm_dir,
+        'base_url': read_base_url(npm_dir),
+        'log_message': lambda self, *args: None,
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def debian_keyring():
+    return str(FIXTURES_DIR / 'debian' / 'archive-keyring.gpg')
+
+
+@pytest.fixture
+def debian_mirror():
+    """file:// URL of tests/fixtures/debian with {snapshot} for the archive state."""
+    return (FIXTURES_DIR / 'debian').as_uri() + '/{snapshot}/'
+
+
+@pytest.fixture
+def rpm_repositories():
+    """file:// URL templates of the BaseOS and AppStream repositories in tests/fixtures/rpm."""
+    root = (FIXTURES_DIR / 'rpm').as_uri()
+    return [f"{root}/{{release}}/BaseOS/{{arch}}/os/", f"{root}/{{release}}/AppStream/{{arch}}/os/"]
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    """Artifact cache directory for a collector's cache.dir."""
+    return tmp_path / 'cache'
+
+
+@pytest.fixture
+def poison_cache(cache_dir, tmp_path):
+    """Return a function that stores a wrong file under an artifact cache key.
+
+    It stands for a cache filled from another mirror or index: the key
+    matches what the collector looks up, the content does not.
+    """
+    from artifact_cache import ArtifactStore
+
+    def poison(source, name, version, platform):
+        bogus = tmp_path / f"poisoned-{source}-{name.replace('/', '_')}"
+        bogus.write_bytes(f"not the {name} {version} the metadata names\n".encode())
+        store = ArtifactStore(cache_dir)
+        try:
+            store.store(source, name, version, platform, [bogus])
+        finally:
+            store.close()
+    return poison
+
+
+@pytest.fixture
+def overwrite_same_size():
+    """Return a function that zeroes files in place, keeping their size.
+
+    An interrupted rewrite can leave files like that, so a size check
+    alone would take them as already collected.
+    """
+    def overwrite(paths):
+        paths = list(paths)
+        assert paths
+        for path in paths:
+            path.write_bytes(bytes(path.stat().st_size))
+    return overwrite
+
+
+@pytest.fixture
+def assert_digests():
+    """Return a function checking {path: (hash algorithm, hex digest)} against the files."""
+    def check(expected):
+        assert expected
+        for path, (algorithm, digest) in expected.items():
+            assert hashlib.new(algorithm, path.read_bytes()).hexdigest() == digest, path.name
+    return check
+
+
+class FileServer:
+    """What the http_server fixture serves, and the requests it has seen.
+
+    files maps URL paths to bytes. responses maps a path to a list of
+    (status, headers, body) answers handed out before files is used, for
+    misbehaving servers. Range requests on files are honoured unless
+    ignore_range is set.
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.files = {}
+        self.responses = {}
+        self.ignore_range = False
+        self.requests = []
+
+
+@pytest.fixture
+def http_server():
+    """Serve a FileServer on localhost with http.server; yield it."""
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            state.requests.append((self.path, self.headers.get('Range')))
+            queued = state.responses.get(self.path)
+            if queued:
+                self.reply(*queued.pop(0))
+                return
+            if self.path not in state.files:
+                self.reply(404, {}, b'')
+                return
+            body = state.files[self.path]
+            requested = self.headers.get('Range')
+            if not requested or state.ignore_range:
+                self.reply(200, {}, body)
+                return
+            start = int(requested[len('bytes='):].rstrip('-'))
+            if start >= len(body):
+                self.reply(416, {'Content-Range': f"bytes */{len(body)}"}, b'')
+                return
+            self.reply(206, {'Content-Range': f"bytes {start}-{len(body) - 1}/{len(body)}"}, body[start:])
+
+        def reply(self, status, headers, body):
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    state = FileServer(f"http://127.0.0.1:{server.server_address[1]}")
+    thread = threading.Thread(target=server.serve_forever, kwargs={'poll_interval': 0.05}, daemon=True)
+    thread.start()
+    try:
+        yield state
+    finally:
+        server.shutdown()
+        server.server_close()
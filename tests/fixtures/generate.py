@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Regenerate the stand-in repositories under tests/fixtures/.
+
+The fixtures are checked in; run this after changing what they hold:
+
+    python3 tests/fixtures/generate.py
+
+pypi/ is a directory-backed simple index with PEP 658 .metadata sidecars,
+as simple_index.py --metadata writes it, so pypi_resolver.py can resolve
+against file://.../pypi/simple/ without network access.
+
+npm/ is a tarball store with the packuments npm_registry.py writes for it,
+which serve_registry.py serves as a registry on localhost.
+
+debian/ holds two states of a small signed archive, one directory per
+snapshot timestamp, for mirror: file://.../debian/{snapshot}/. Each is
+signed with a throwaway key whose public half is archive-keyring.gpg;
+jammy has InRelease, jammy-updates only Release and Release.gpg. gpg is
+needed to regenerate it.
+
+rpm/ is a BaseOS and an AppStream repository per architecture, with
+primary, filelists and (for AppStream) modules metadata, laid out as
+rpm/<release>/<repository>/<arch>/os/ for rpm.repositories.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import os
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import zipfile
+from pathlib import Path
+from xml.sax.saxutils import quoteattr
+
+
+FIXTURES_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = FIXTURES_DIR.parent.parent / 'scripts'
+
+# Fixed timestamp so regenerated archives are byte-identical
+EPOCH = (2024, 1, 1, 0, 0, 0)
+
+# (project, version, wheel tag, Requires-Python, Requires-Dist, extras)
+WHEELS = [
+    ('demo-app', '1.0', 'py3-none-any', None,
+     ['demo-lib>=1.1', "demo-fast; extra == 'fast'", "demo-win; sys_platform == 'win32'"], ['fast']),
+    ('demo-app', '2.0', 'py3-none-any', '>=3.12', ['demo-lib>=2.0'], []),
+    ('demo-lib', '1.0', 'py3-none-any', None, [], []),
+    ('demo-lib', '1.1', 'py3-none-any', None, [], []),
+    ('demo-lib', '2.0', 'py3-none-any', None, [], []),
+    ('demo-lib', '2.1', 'cp312-cp312-manylinux_2_17_x86_64.manylinux2014_x86_64', None, [], []),
+    ('demo-fast', '1.0', 'py3-none-any', None, [], []),
+    ('demo-win', '1.0', 'py3-none-any', None, [], []),
+    ('demo-pin', '1.0', 'py3-none-any', None, ['demo-lib<2'], []),
+    ('demo-conflict', '1.0', 'py3-none-any', None, ['demo-lib<1.0'], []),
+]
+
+
+# (name, version, dependencies)
+NPM_PACKAGES = [
+    ('demo-a', '1.0.0', {'demo-b': '^1.0.0'}),
+    ('demo-a', '1.1.0', {'demo-b': '^2.0.0'}),
+    ('demo-b', '1.0.0', {}),
+    ('demo-b', '1.2.0', {}),
+    ('demo-b', '2.0.0', {}),
+    ('demo-b', '2.1.0-beta.1', {}),
+    ('@demo/c', '1.0.0', {'demo-b': '1.0.0'}),
+    ('demo-missing-dep', '1.0.0', {'demo-nowhere': '^1.0.0'}),
+]
+
+
+# (name, version, architecture, extra control fields)
+DEBIAN_JAMMY = [
+    ('curl', '7.81.0-1', 'amd64', {'Depends': 'libcurl4 (= 7.81.0-1), libc6 (>= 2.34)'}),
+    ('curl', '7.81.0-1', 'arm64', {'Depends': 'libcurl4 (= 7.81.0-1), libc6 (>= 2.34)'}),
+    ('libcurl4', '7.81.0-1', 'amd64', {'Depends': 'libc6 (>= 2.34), libssl3 | libssl1.1'}),
+    ('libcurl4', '7.81.0-1', 'arm64', {'Depends': 'libc6 (>= 2.34), libssl3 | libssl1.1'}),
+    ('libc6', '2.35-0ubuntu3', 'amd64', {'Priority': 'required'}),
+    ('libc6', '2.35-0ubuntu3', 'arm64', {'Priority': 'required'}),
+    ('libssl3', '3.0.2-0ubuntu1', 'amd64', {'Depends': 'libc6 (>= 2.34)'}),
+    ('libssl3', '3.0.2-0ubuntu1', 'arm64', {'Depends': 'libc6 (>= 2.34)'}),
+    ('git', '1:2.34.1-1ubuntu1', 'amd64',
+     {'Depends': 'libc6 (>= 2.34), git-man (>> 1:2.34.1), git-man (<< 1:2.34.1-.)'}),
+    ('git-man', '1:2.34.1-1ubuntu1', 'all', {}),
+    ('mailutils', '1:3.14-1', 'amd64', {'Depends': 'default-mta | mail-transport-agent'}),
+    ('postfix', '3.6.4-1ubuntu1', 'amd64', {'Provides': 'mail-transport-agent'}),
+    ('exim4-daemon-light', '4.95-4ubuntu2', 'amd64',
+     {'Provides': 'mail-transport-agent', 'Priority': 'extra'}),
+]
+
+# snapshot -> {suite: packages}; the later state has an updated curl
+DEBIAN_SNAPSHOTS = {
+    '20240101T000000Z': {'jammy': DEBIAN_JAMMY},
+    '20240601T000000Z': {
+        'jammy': DEBIAN_JAMMY,
+        'jammy-updates': [
+            ('curl', '7.81.0-1ubuntu1.15', 'amd64',
+             {'Depends': 'libcurl4 (= 7.81.0-1ubuntu1.15), libc6 (>= 2.34)'}),
+            ('libcurl4', '7.81.0-1ubuntu1.15', 'amd64',
+             {'Depends': 'libc6 (>= 2.34), libssl3 (>= 3.0.0~~alpha1)'}),
+        ],
+    },
+}
+
+DEBIAN_ARCHITECTURES = ('amd64', 'arm64')
+
+# (repository, name, [epoch:]version-release, arch, provides, requires, files)
+# where provides and requires are (name, flags, [epoch:]version-release) or plain names
+RPM_PACKAGES = [
+    ('BaseOS', 'curl', '7.76.1-26.el9', None, [],
+     [('libcurl', 'EQ', '7.76.1-26.el9'), 'libc.so.6()(64bit)'], ['/usr/bin/curl']),
+    ('BaseOS', 'curl', '7.76.1-19.el9', None, [], ['libc.so.6()(64bit)'], ['/usr/bin/curl']),
+    ('BaseOS', 'libcurl', '7.76.1-26.el9', None, ['libcurl.so.4()(64bit)'],
+     ['libc.so.6()(64bit)', ('openssl-libs', 'GE', '1:3.0.0')], []),
+    ('BaseOS', 'glibc', '2.34-60.el9', None, ['libc.so.6()(64bit)'],
+     ['(glibc-langpack-en or glibc-all-langpacks)'], []),
+    ('BaseOS', 'glibc-langpack-en', '2.34-60.el9', None, [], [], []),
+    ('BaseOS', 'openssl-libs', '1:3.0.7-1.el9', None, [], ['libc.so.6()(64bit)'], []),
+    ('BaseOS', 'openssl-libs', '1:3.0.1-1.el9', None, [], ['libc.so.6()(64bit)'], []),
+    ('BaseOS', 'perl-interpreter', '4:5.32.1-480.el9', None, [], [], ['/usr/bin/perl']),
+    ('AppStream', 'git', '2.39.1-1.el9', None, [],
+     [('git-core', 'EQ', '2.39.1-1.el9'), 'perl(Git)', '/usr/bin/perl',
+      '/usr/libexec/git-core/git-sh-setup'], []),
+    ('AppStream', 'git-core', '2.39.1-1.el9', None, [], ['libc.so.6()(64bit)'],
+     ['/usr/libexec/git-core/git-sh-setup']),
+    ('AppStream', 'perl-Git', '2.39.1-1.el9', 'noarch', ['perl(Git)'],
+     [('git', 'EQ', '2.39.1-1.el9')], []),
+    ('AppStream', 'nodejs', '1:16.19.1-1.el9', None, [], [], []),
+    ('AppStream', 'nodejs', '1:18.14.2-2.module+el9.1.0', None, [], [], []),
+]
+
+# nodejs:18 is not the default stream, so its package is hidden
+RPM_MODULES = """---
+document: modulemd
+version: 2
+data:
+  name: nodejs
+  stream: "18"
+  artifacts:
+    rpms:
+{artifacts}
+---
+document: modulemd-defaults
+version: 1
+data:
+  module: nodejs
+  stream: "16"
+...
+"""
+
+RPM_ARCHITECTURES = ('x86_64', 'aarch64')
+
+# Files listed only in filelists, not in primary
+RPM_FILELISTS_ONLY = {'/usr/libexec/git-core/git-sh-setup'}
+
+
+def write_zip(path, members):
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, data in members:
+            info = zipfile.ZipInfo(name, EPOCH)
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, data)
+
+
+def generate_pypi():
+    root = FIXTURES_DIR / 'pypi'
+    shutil.rmtree(root, ignore_errors=True)
+    packages_dir = root / 'packages'
+    packages_dir.mkdir(parents=True)
+    for project, version, tag, requires_python, requires, extras in WHEELS:
+        module = project.replace('-', '_')
+        metadata = ["Metadata-Version: 2.1", f"Name: {project}", f"Version: {version}"]
+        if requires_python:
+            metadata.append(f"Requires-Python: {requires_python}")
+        metadata += [f"Provides-Extra: {extra}" for extra in extras]
+        metadata += [f"Requires-Dist: {requirement}" for requirement in requires]
+        dist_info = f"{module}-{version}.dist-info"
+        write_zip(packages_dir / f"{module}-{version}-{tag}.whl", [
+            (f"{module}/__init__.py", f"__version__ = '{version}'\n"),
+            (f"{dist_info}/METADATA", '\n'.join(metadata) + '\n'),
+            (f"{dist_info}/WHEEL", f"Wheel-Version: 1.0\nRoot-Is-Purelib: true\nTag: {tag}\n"),
+            (f"{dist_info}/RECORD", ''),
+        ])
+    subprocess.run([sys.executable, str(SCRIPTS_DIR / 'simple_index.py'), '--metadata',
+                    str(packages_dir), str(root / 'simple')], check=True)
+    # The state file only speeds up rebuilds and records mtimes
+    os.unlink(root / 'simple' / '.index-state.json')
+
+
+def npm_tarball(name, version, dependencies):
+    manifest = json.dumps({'name': name, 'version': version, 'dependencies': dependencies},
+                          indent=2).encode()
+    raw = io.BytesIO()
+    with tarfile.open(fileobj=raw, mode='w', format=tarfile.USTAR_FORMAT) as archive:
+        info = tarfile.TarInfo('package/package.json')
+        info.size = len(manifest)
+        info.mode = 0o644
+        info.mtime = 499162500
+        archive.addfile(info, io.BytesIO(manifest))
+    return gzip.compress(raw.getvalue(), mtime=0)
+
+
+def generate_npm():
+    sys.path.insert(0, str(SCRIPTS_DIR))
+    from npm_registry import build_registry
+
+    root = FIXTURES_DIR / 'npm'
+    shutil.rmtree(root, ignore_errors=True)
+    tarballs_dir = root / 'tarballs'
+    tarballs_dir.mkdir(parents=True)
+    for name, version, dependencies in NPM_PACKAGES:
+        data = npm_tarball(name, version, dependencies)
+        (tarballs_dir / f"sha512-{hashlib.sha512(data).hexdigest()}.tgz").write_bytes(data)
+    build_registry(root)
+
+
+def gpg(home, *args, **kwargs):
+    subprocess.run(['gpg', '--homedir', str(home), '--batch', '--yes', '--quiet', *args],
+                   check=True, **kwargs)
+
+
+def write_suite(root, suite, packages, home):
+    indexes = {}
+    for name, version, arch, fields in packages:
+        filename = f"pool/main/{name[0]}/{name}/{name}_{version.split(':')[-1]}_{arch}.deb"
+        data = f"stand-in for {name} {version} {arch}\n".encode()
+        (root / filename).parent.mkdir(parents=True, exist_ok=True)
+        (root / filename).write_bytes(data)
+        paragraph = [f"Package: {name}", f"Architecture: {arch}", f"Version: {version}",
+                     f"Priority: {fields.get('Priority', 'optional')}"]
+        paragraph += [f"{key}: {fields[key]}" for key in ('Pre-Depends', 'Depends', 'Provides')
+                      if key in fields]
+        paragraph += [f"Filename: {filename}", f"Size: {len(data)}",
+                      f"SHA256: {hashlib.sha256(data).hexdigest()}", f"Description: {name}"]
+        for index_arch in (DEBIAN_ARCHITECTURES if arch == 'all' else [arch]):
+            indexes.setdefault(f"main/binary-{index_arch}/Packages", []).append('\n'.join(paragraph))
+
+    suite_dir = root / 'dists' / suite
+    lines = []
+    for path, paragraphs in sorted(indexes.items()):
+        text = ('\n\n'.join(paragraphs) + '\n').encode()
+        (suite_dir / path).parent.mkdir(parents=True, exist_ok=True)
+        for suffix, data in (('', text), ('.xz', lzma.compress(text))):
+            (suite_dir / (path + suffix)).write_bytes(data)
+            lines.append(f" {hashlib.sha256(data).hexdigest()} {len(data)} {path}{suffix}")
+    release = suite_dir / 'Release'
+    release.write_text(f"Origin: Fixture\nSuite: {suite}\nCodename: jammy\n"
+                       f"Architectures: {' '.join(DEBIAN_ARCHITECTURES)}\nComponents: main\n"
+                       f"SHA256:\n" + '\n'.join(lines) + '\n')
+    if suite.endswith('-updates'):
+        gpg(home, '--armor', '--detach-sign', '--output', str(suite_dir / 'Release.gpg'), str(release))
+    else:
+        gpg(home, '--clearsign', '--output', str(suite_dir / 'InRelease'), str(release))
+        release.unlink()
+
+
+def generate_debian():
+    root = FIXTURES_DIR / 'debian'
+    shutil.rmtree(root, ignore_errors=True)
+    root.mkdir()
+    with tempfile.TemporaryDirectory() as home:
+        gpg(home, '--passphrase', '', '--quick-generate-key', 'Fixture Archive <archive@example.com>',
+            'ed25519', 'sign', 'never')
+        gpg(home, '--output', str(root / 'archive-keyring.gpg'), '--export')
+        for snapshot, suites in DEBIAN_SNAPSHOTS.items():
+            for suite, packages in suites.items():
+                write_suite(root / snapshot, suite, packages, home)
+
+
+def rpm_evr(text):
+    epoch, _, version_release = text.rpartition(':')
+    version, _, release = version_release.partition('-')
+    return epoch or '0', version, release
+
+
+def rpm_entries(tag, entries):
+    if not entries:
+        return ''
+    lines = []
+    for entry in entries:
+        name, flags, evr = (entry, None, None) if isinstance(entry, str) else entry
+        attrs = f"name={quoteattr(name)}"
+        if flags:
+            epoch, version, release = rpm_evr(evr)
+            attrs += f' flags="{flags}" epoch="{epoch}" ver={quoteattr(version)}'
+            attrs += f" rel={quoteattr(release)}" if release else ''
+        lines.append(f"      <rpm:entry {attrs}/>")
+    return f"    <rpm:{tag}>\n" + '\n'.join(lines) + f"\n    </rpm:{tag}>\n"
+
+
+def write_rpm_repository(base, repository, arch):
+    primary = []
+    filelists = []
+    nevras = []
+    for repo, name, evr, package_arch, provides, requires, files in RPM_PACKAGES:
+        package_arch = package_arch or arch
+        if repo != repository:
+            continue
+        epoch, version, release = rpm_evr(evr)
+        filename = f"Packages/{name[0]}/{name}-{version}-{release}.{package_arch}.rpm"
+        data = f"stand-in for {name} {evr} {package_arch}\n".encode()
+        (base / filename).parent.mkdir(parents=True, exist_ok=True)
+        (base / filename).write_bytes(data)
+        # openssl-libs carries a sha512 checksum, as some repositories do
+        checksum_type = 'sha512' if name == 'openssl-libs' else 'sha256'
+        checksum = hashlib.new(checksum_type, data).hexdigest()
+        version_attrs = f'epoch="{epoch}" ver={quoteattr(version)} rel={quoteattr(release)}'
+        primary.append(
+            f'  <package type="rpm">\n    <name>{name}</name>\n    <arch>{package_arch}</arch>\n'
+            f'    <version {version_attrs}/>\n'
+            f'    <checksum type="{checksum_type}" pkgid="YES">{checksum}</checksum>\n'
+            f'    <size package="{len(data)}" installed="{len(data)}" archive="{len(data)}"/>\n'
+            f'    <location href="{filename}"/>\n    <format>\n'
+            + rpm_entries('provides', [(name, 'EQ', evr)] + provides)
+            + rpm_entries('requires', requires)
+            + ''.join(f"    <file>{path}</file>\n" for path in files if path not in RPM_FILELISTS_ONLY)
+            + '    </format>\n  </package>\n')
+        filelists.append(f'  <package pkgid="{checksum}" name="{name}" arch="{package_arch}">\n'
+                         f'    <version {version_attrs}/>\n'
+                         + ''.join(f"    <file>{path}</file>\n" for path in files) + '  </package>\n')
+        nevras.append(f"{name}-{epoch}:{version}-{release}.{package_arch}")
+
+    metadata = {
+        'primary': ('primary.xml.gz', gzip.compress(
+            ('<?xml version="1.0" encoding="UTF-8"?>\n<metadata xmlns="http://linux.duke.edu/metadata/common" '
+             f'xmlns:rpm="http://linux.duke.edu/metadata/rpm" packages="{len(primary)}">\n'
+             + ''.join(primary) + '</metadata>\n').encode(), mtime=0)),
+        'filelists': ('filelists.xml.xz', lzma.compress(
+            ('<?xml version="1.0" encoding="UTF-8"?>\n<filelists xmlns="http://linux.duke.edu/metadata/filelists" '
+             f'packages="{len(filelists)}">\n' + ''.join(filelists) + '</filelists>\n').encode())),
+    }
+    if repository == 'AppStream':
+        artifacts = '\n'.join(f"    - {nevra}" for nevra in nevras if '.module+' in nevra)
+        metadata['modules'] = ('modules.yaml.gz', gzip.compress(
+            RPM_MODULES.format(artifacts=artifacts).encode(), mtime=0))
+    repomd = ['<?xml version="1.0" encoding="UTF-8"?>\n<repomd xmlns="http://linux.duke.edu/metadata/repo">\n'
+              '  <revision>1704067200</revision>\n']
+    (base / 'repodata').mkdir(parents=True)
+    for kind, (name, data) in metadata.items():
+        checksum = hashlib.sha256(data).hexdigest()
+        location = f"repodata/{checksum}-{name}"
+        (base / location).write_bytes(data)
+        repomd.append(f'  <data type="{kind}">\n    <checksum type="sha256">{checksum}</checksum>\n'
+                      f'    <location href="{location}"/>\n    <size>{len(data)}</size>\n  </data>\n')
+    repomd.append('</repomd>\n')
+    (base / 'repodata' / 'repomd.xml').write_text(''.join(repomd))
+
+
+def generate_rpm():
+    root = FIXTURES_DIR / 'rpm'
+    shutil.rmtree(root, ignore_errors=True)
+    for repository in ('BaseOS', 'AppStream'):
+        for arch in RPM_ARCHITECTURES:
+            write_rpm_repository(root / '9' / repository / arch / 'os', repository, arch)
+
+
+if __name__ == '__main__':
+    generate_pypi()
+    generate_npm()
+    generate_debian()
+    generate_rpm()
@@ -0,0 +1,46 @@
+import pytest
+
+import collect_npm
+from bundle_manifest import build_manifest, identify, stage_tree
+
+
+@pytest.fixture
+def npm_output(npm_registry, monkeypatch, tmp_path):
+    """An npm output directory collected from the fixture registry."""
+    monkeypatch.setenv('npm_config_registry', npm_registry)
+    output = tmp_path / 'npm'
+    config = {'npm': {'enabled': True, 'resolver': 'native',
+                      'packages': [{'name': 'demo-a', 'version': '^1.0.0'},
+                                   {'name': '@demo/c', 'version': '1.0.0'}]}}
+    assert collect_npm.collect(config, output) == 0
+    return output
+
+
+def npm_tarballs(files):
+    return {(entry['package'], entry['version']) for entry in files
+            if entry['path'].startswith('npm/tarballs/')}
+
+
+def test_identify_uses_file_names():
+    assert identify('pypi/packages/demo_lib-1.0-py3-none-any.whl') == ('pypi', 'demo_lib', '1.0')
+    assert identify('debian/pool/main/c/curl/curl_7.81.0-1_amd64.deb') == ('debian', 'curl', '7.81.0-1')
+    assert identify('npm/tarballs/sha512-abcd.tgz') == ('npm', None, None)
+    assert identify('npm/tarballs/sha512-abcd.tgz', {'npm/tarballs/sha512-abcd.tgz': ('demo-b', '1.0.0')}) \
+        == ('npm', 'demo-b', '1.0.0')
+
+
+def test_staged_npm_tarballs_keep_package_and_version(npm_output, tmp_path):
+    files, _, _ = stage_tree([('npm', npm_output)], tmp_path / 'staging')
+
+    expected = {('demo-a', '1.1.0'), ('demo-b', '2.0.0'), ('@demo/c', '1.0.0'), ('demo-b', '1.0.0')}
+    assert npm_tarballs(files) == expected
+    assert npm_tarballs(build_manifest(tmp_path / 'staging')['files']) == expected
+
+
+def test_referenced_npm_tarballs_keep_package_and_version(npm_output, tmp_path):
+    files, _, references = stage_tree([('npm', npm_output)], tmp_path / 'staging', mode='reference')
+
+    manifest = build_manifest(tmp_path / 'staging', references=references)
+
+    assert npm_tarballs(manifest['files']) == npm_tarballs(files)
+    assert all(package for package, _ in npm_tarballs(files))
@@ -0,0 +1,125 @@
+import json
+import shutil
+
+import pytest
+
+import collect_debian
+
+
+pytestmark = pytest.mark.skipif(shutil.which('gpgv') is None, reason='gpgv is not installed')
+
+
+def debian_config(tmp_path, mirror, keyring, packages, **settings):
+    return {
+        'debian': {'enabled': True, 'distribution': 'ubuntu', 'release': '22.04',
+                   'architectures': ['amd64'], 'mirror': mirror, 'keyring': keyring,
+                   'snapshot': '20240601T000000Z', 'packages': packages, **settings},
+        'cache': {'enabled': True, 'dir': str(tmp_path / 'cache')},
+    }
+
+
+def pool_digests(output):
+    """Return {pool file: ('sha256', digest)} as the resolutions give them."""
+    return {output / record['filename']: ('sha256', record['sha256'])
+            for resolution in (output / 'resolutions').glob('*.json')
+            for record in json.loads(resolution.read_text())['packages']}
+
+
+def test_present_files_are_checked_against_the_index(tmp_path, debian_mirror, debian_keyring,
+                                                     overwrite_same_size, assert_digests):
+    output = tmp_path / 'debian'
+    config = debian_config(tmp_path, debian_mirror, debian_keyring, ['curl'])
+    config['cache'] = {'enabled': False}
+    assert collect_debian.collect(config, output) == 0
+
+    overwrite_same_size((output / 'pool').rglob('libc6_*.deb'))
+    assert collect_debian.collect(config, output) == 0
+
+    assert_digests(pool_digests(output))
+
+
+def test_cached_files_are_checked_against_the_index(tmp_path, debian_mirror, debian_keyring,
+                                                    poison_cache, assert_digests):
+    poison_cache('debian', 'libc6', '2.35-0ubuntu3', 'ubuntu-22.04-amd64')
+    output = tmp_path / 'debian'
+    config = debian_config(tmp_path, debian_mirror, debian_keyring, ['curl'])
+
+    assert collect_debian.collect(config, output) == 0
+
+    assert_digests(pool_digests(output))
+
+
+def test_architecture_all_packages_are_stored_once(tmp_path, debian_mirror, debian_keyring,
+                                                   assert_digests):
+    output = tmp_path / 'debian'
+    config = debian_config(tmp_path, debian_mirror, debian_keyring, ['curl', 'git-man'],
+                           architectures=['amd64', 'arm64'])
+
+    assert collect_debian.collect(config, output) == 0
+
+    assert len(list((output / 'pool').rglob('git-man_*.deb'))) == 1
+    for arch in ('amd64', 'arm64'):
+        link = output / 'packages' / arch / 'git-man_2.34.1-1ubuntu1_all.deb'
+        assert link.is_symlink() and link.resolve().parent.name == 'git-man'
+    # curl has an update for amd64 only
+    assert {path.name for path in (output / 'packages' / 'arm64').iterdir() if 'curl' in path.name} \
+        == {'curl_7.81.0-1_arm64.deb', 'libcurl4_7.81.0-1_arm64.deb'}
+    assert_digests(pool_digests(output))
+
+
+def test_packages_no_longer_needed_are_removed(tmp_path, debian_mirror, debian_keyring):
+    output = tmp_path / 'debian'
+    assert collect_debian.collect(
+        debian_config(tmp_path, debian_mirror, debian_keyring, ['curl', 'git-man']), output) == 0
+
+    assert collect_debian.collect(
+        debian_config(tmp_path, debian_mirror, debian_keyring, ['git-man']), output) == 0
+
+    assert [path.name for path in (output / 'pool').rglob('*.deb')] == ['git-man_2.34.1-1ubuntu1_all.deb']
+    assert [path.name for path in (output / 'packages' / 'amd64').iterdir()] \
+        == ['git-man_2.34.1-1ubuntu1_all.deb']
+
+
+def test_failed_downloads_keep_older_files(tmp_path, debian_mirror, debian_keyring, fixtures_dir,
+                                           monkeypatch):
+    monkeypatch.setattr('downloader.time.sleep', lambda seconds: None)
+    output = tmp_path / 'debian'
+    assert collect_debian.collect(
+        debian_config(tmp_path, debian_mirror, debian_keyring, ['git-man']), output) == 0
+    mirror = tmp_path / 'mirror'
+    shutil.copytree(fixtures_dir / 'debian' / '20240601T000000Z', mirror)
+    next((mirror / 'pool').rglob('libssl3_*_amd64.deb')).unlink()
+    config = debian_config(tmp_path, mirror.as_uri() + '/', debian_keyring, ['curl'], snapshot='')
+
+    assert collect_debian.collect(config, output) == 1
+
+    assert (output / 'pool' / 'main' / 'g' / 'git-man').is_dir()
+
+
+def test_snapshot_closures_are_reused(tmp_path, debian_mirror, debian_keyring, capsys, assert_digests):
+    config = debian_config(tmp_path, debian_mirror, debian_keyring,
+                           [{'name': 'curl', 'version': '7.81.0-1'}])
+    assert collect_debian.collect(config, tmp_path / 'first') == 0
+    capsys.readouterr()
+
+    assert collect_debian.collect(config, tmp_path / 'second') == 0
+    assert 'Reusing the cached closure of amd64 (4 packages)' in capsys.readouterr().out
+    assert sorted(pool_digests(tmp_path / 'first').values()) \
+        == sorted(pool_digests(tmp_path / 'second').values())
+    assert_digests(pool_digests(tmp_path / 'second'))
+
+    assert collect_debian.collect(config, tmp_path / 'second', refresh=True) == 0
+    assert 'Reusing' not in capsys.readouterr().out
+
+
+def test_snapshots_fix_the_collected_versions(tmp_path, debian_mirror, debian_keyring):
+    for snapshot in ('20240101T000000Z', '20240601T000000Z'):
+        config = debian_config(tmp_path, debian_mirror, debian_keyring, ['curl'], snapshot=snapshot)
+        assert collect_debian.collect(config, tmp_path / snapshot) == 0
+
+    assert [path.name for path in (tmp_path / '20240101T000000Z' / 'pool').rglob('curl_*')] \
+        == ['curl_7.81.0-1_amd64.deb']
+    assert [path.name for path in (tmp_path / '20240601T000000Z' / 'pool').rglob('curl_*')] \
+        == ['curl_7.81.0-1ubuntu1.15_amd64.deb']
+    resolution = json.loads((tmp_path / '20240101T000000Z' / 'resolutions' / 'amd64.json').read_text())
+    assert resolution['snapshot'] == '20240101T000000Z'
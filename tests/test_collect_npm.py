@@ -0,0 +1,64 @@
+import pytest
+
+import collect_npm
+
+
+def npm_config(cache_dir, packages, resolver='native'):
+    return {
+        'npm': {'enabled': True, 'resolver': resolver, 'packages': packages},
+        'cache': {'enabled': True, 'dir': str(cache_dir)},
+    }
+
+
+def store_digests(tarballs_dir):
+    """Every store tarball is named by its digest: sha512-<hex>.tgz."""
+    return {path: tuple(path.name[:-len('.tgz')].split('-', 1)) for path in tarballs_dir.iterdir()}
+
+
+@pytest.fixture
+def registry(npm_registry, monkeypatch):
+    monkeypatch.setenv('npm_config_registry', npm_registry)
+    return npm_registry
+
+
+def test_collects_the_closure_into_the_store(registry, tmp_path, cache_dir, assert_digests):
+    output = tmp_path / 'npm'
+    config = npm_config(cache_dir, [{'name': 'demo-a', 'version': '^1.0.0'}])
+
+    assert collect_npm.collect(config, output) == 0
+
+    assert len(list((output / 'tarballs').iterdir())) == 2
+    assert_digests(store_digests(output / 'tarballs'))
+    assert (output / 'packages' / 'demo-a.json').exists()
+
+
+def test_cached_tarballs_are_checked_against_the_lock(registry, tmp_path, cache_dir, poison_cache,
+                                                      assert_digests):
+    poison_cache('npm', 'demo-b', '2.0.0', 'demo-b-2.0.0.tgz')
+    output = tmp_path / 'npm'
+    config = npm_config(cache_dir, [{'name': 'demo-a', 'version': '^1.0.0'}])
+
+    assert collect_npm.collect(config, output) == 0
+
+    assert len(list((output / 'tarballs').iterdir())) == 2
+    assert_digests(store_digests(output / 'tarballs'))
+
+
+def test_git_dependencies_count_as_failures(registry, tmp_path, cache_dir, monkeypatch):
+    lock = {'lockfileVersion': 3, 'packages': {
+        '': {'dependencies': {'demo-git': 'git+ssh://git@example.com/demo-git.git'}},
+        'node_modules/demo-git': {
+            'version': '1.0.0',
+            'resolved': 'git+ssh://git@example.com/demo-git.git#0123456789abcdef',
+        },
+    }}
+    monkeypatch.setattr(collect_npm, 'npm_lock', lambda *args: lock)
+    output = tmp_path / 'npm'
+    (output / 'tarballs').mkdir(parents=True)
+    (output / 'tarballs' / 'sha512-00.tgz').write_bytes(b'older entry')
+    config = npm_config(cache_dir, [{'name': 'demo-git', 'version': 'latest'}], resolver='npm')
+
+    assert collect_npm.collect(config, output) == 1
+
+    # Nothing is cleaned up while the store is incomplete
+    assert (output / 'tarballs' / 'sha512-00.tgz').exists()
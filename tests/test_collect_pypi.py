@@ -0,0 +1,41 @@
+import json
+
+import collect_pypi
+
+
+def pypi_config(cache_dir, index_url, packages, **settings):
+    return {
+        'pypi': {'enabled': True, 'resolver': 'native', 'index_url': index_url,
+                 'python_versions': ['3.11'], 'platforms': ['manylinux2014_x86_64'],
+                 'packages': packages, **settings},
+        'cache': {'enabled': True, 'dir': str(cache_dir)},
+    }
+
+
+def package_digests(output):
+    """Return {package file: ('sha256', digest)} as the resolutions give them."""
+    return {output / 'packages' / record['filename']: ('sha256', record['sha256'])
+            for resolution in (output / 'resolutions').glob('*.json')
+            for record in json.loads(resolution.read_text())['files']}
+
+
+def test_collects_the_resolved_wheels(tmp_path, cache_dir, fixtures_dir, assert_digests):
+    output = tmp_path / 'pypi'
+    config = pypi_config(cache_dir, (fixtures_dir / 'pypi' / 'simple').as_uri(), [{'name': 'demo-app'}])
+
+    assert collect_pypi.collect(config, output) == 0
+
+    assert sorted(path.name for path in (output / 'packages').iterdir()) == [
+        'demo_app-1.0-py3-none-any.whl', 'demo_lib-2.0-py3-none-any.whl']
+    assert_digests(package_digests(output))
+
+
+def test_cached_files_are_checked_against_the_index(tmp_path, cache_dir, fixtures_dir, poison_cache,
+                                                    assert_digests):
+    poison_cache('pypi', 'demo-lib', '2.0', 'demo_lib-2.0-py3-none-any.whl')
+    output = tmp_path / 'pypi'
+    config = pypi_config(cache_dir, (fixtures_dir / 'pypi' / 'simple').as_uri(), [{'name': 'demo-app'}])
+
+    assert collect_pypi.collect(config, output) == 0
+
+    assert_digests(package_digests(output))
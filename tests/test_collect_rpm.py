@@ -0,0 +1,55 @@
+import json
+
+import collect_rpm
+
+
+def rpm_config(tmp_path, repositories, packages, **settings):
+    return {
+        'rpm': {'enabled': True, 'distribution': 'rocky', 'release': '9', 'architectures': ['x86_64'],
+                'repositories': repositories, 'packages': packages, **settings},
+        'cache': {'enabled': True, 'dir': str(tmp_path / 'cache')},
+    }
+
+
+def package_digests(output):
+    """Return {package file: (checksum type, pkgid)} as the resolutions give them."""
+    return {output / 'packages' / record['filename'].rsplit('/', 1)[-1]:
+            (record['checksum_type'], record['pkgid'])
+            for resolution in (output / 'resolutions').glob('*.json')
+            for record in json.loads(resolution.read_text())['packages']}
+
+
+def test_noarch_packages_are_stored_once(tmp_path, rpm_repositories, assert_digests):
+    output = tmp_path / 'rpm'
+    config = rpm_config(tmp_path, rpm_repositories, ['perl-Git', 'curl'],
+                        architectures=['x86_64', 'aarch64'], include_dependencies=False)
+
+    assert collect_rpm.collect(config, output) == 0
+
+    assert sorted(path.name for path in (output / 'packages').iterdir()) == [
+        'curl-7.76.1-26.el9.aarch64.rpm', 'curl-7.76.1-26.el9.x86_64.rpm', 'perl-Git-2.39.1-1.el9.noarch.rpm']
+    assert_digests(package_digests(output))
+
+
+def test_present_files_are_checked_against_the_metadata(tmp_path, rpm_repositories, overwrite_same_size,
+                                                        assert_digests):
+    output = tmp_path / 'rpm'
+    config = rpm_config(tmp_path, rpm_repositories, ['curl'])
+    config['cache'] = {'enabled': False}
+    assert collect_rpm.collect(config, output) == 0
+
+    # openssl-libs has a sha512 checksum, the others sha256
+    overwrite_same_size((output / 'packages').glob('[co]*.rpm'))
+    assert collect_rpm.collect(config, output) == 0
+
+    assert_digests(package_digests(output))
+
+
+def test_cached_files_are_checked_against_the_metadata(tmp_path, rpm_repositories, poison_cache,
+                                                       assert_digests):
+    poison_cache('rpm', 'glibc', '2.34-60.el9', 'rocky-9-x86_64')
+    output = tmp_path / 'rpm'
+
+    assert collect_rpm.collect(rpm_config(tmp_path, rpm_repositories, ['curl']), output) == 0
+
+    assert_digests(package_digests(output))
@@ -0,0 +1,159 @@
+import shutil
+
+import pytest
+
+from debian_resolver import compare_versions, default_sources, fetch_index, resolve, version_satisfies
+from downloader import Downloader
+
+
+LATEST = '20240601T000000Z'
+
+needs_gpgv = pytest.mark.skipif(shutil.which('gpgv') is None, reason='gpgv is not installed')
+
+
+def read_index(mirror, keyring, architecture='amd64', snapshot=LATEST):
+    sources = default_sources('ubuntu', 'jammy', architecture, mirror, snapshot)
+    with Downloader(4) as downloader:
+        return fetch_index(downloader, sources, architecture, ['main'], keyring)
+
+
+def versions(records):
+    return {record['package']: record['version'] for record in records}
+
+
+@pytest.mark.parametrize('lower, higher', [
+    ('1.0', '1.1'),
+    ('1.0', '1.0-1'),
+    ('1.0~rc1', '1.0'),
+    ('1.0~~', '1.0~'),
+    ('1.2.9', '1.2.10'),
+    ('1.0a', '1.0+'),
+    ('1.0-1', '1.0-1ubuntu1'),
+    ('7.81.0-1', '7.81.0-1ubuntu1.15'),
+    ('9.9', '1:0.1'),
+    ('1:2.34.1-1ubuntu1', '1:2.34.1-1ubuntu1.11'),
+    ('3.0.0~~alpha1', '3.0.2-0ubuntu1'),
+])
+def test_compare_versions_orders_as_dpkg(lower, higher):
+    assert compare_versions(lower, higher) < 0
+    assert compare_versions(higher, lower) > 0
+
+
+@pytest.mark.parametrize('a, b', [('1.0', '1.0'), ('0:1.0', '1.0'), ('1.01', '1.1'), ('1.0-0', '1.0-00')])
+def test_compare_versions_equal(a, b):
+    assert compare_versions(a, b) == 0
+
+
+def test_version_satisfies_relations():
+    assert version_satisfies('1:2.34.1-1ubuntu1', '>>', '1:2.34.1')
+    assert version_satisfies('1:2.34.1-1ubuntu1', '<<', '1:2.34.1-.')
+    assert version_satisfies('2.35-0ubuntu3', '>=', '2.34')
+    assert not version_satisfies('2.35-0ubuntu3', '=', '2.35')
+    assert version_satisfies('1.0', None, None)
+
+
+@needs_gpgv
+def test_reads_inrelease_and_detached_signatures(debian_mirror, debian_keyring):
+    # jammy is signed inline (InRelease), jammy-updates with Release.gpg
+    index = read_index(debian_mirror, debian_keyring)
+
+    assert {record['version'] for record in index.candidates('curl')} == {'7.81.0-1', '7.81.0-1ubuntu1.15'}
+    assert [record['package'] for record in index.candidates('git-man')] == ['git-man']
+
+
+@needs_gpgv
+def test_rejects_release_files_the_keyring_did_not_sign(debian_mirror, tmp_path):
+    other = tmp_path / 'other-keyring.gpg'
+    other.write_bytes(b'')
+
+    with pytest.raises(RuntimeError, match='signature'):
+        read_index(debian_mirror, str(other))
+
+
+def test_missing_keyring_is_reported(debian_mirror, tmp_path):
+    with pytest.raises(RuntimeError, match='keyring'):
+        read_index(debian_mirror, str(tmp_path / 'absent.gpg'))
+
+
+@needs_gpgv
+def test_rejects_tampered_release_files(fixtures_dir, debian_keyring, tmp_path):
+    mirror = tmp_path / 'mirror'
+    shutil.copytree(fixtures_dir / 'debian' / LATEST, mirror)
+    release = mirror / 'dists' / 'jammy-updates' / 'Release'
+    release.write_text(release.read_text().replace('Origin: Fixture', 'Origin: Elsewhere'))
+
+    with pytest.raises(RuntimeError, match='signature'):
+        read_index(mirror.as_uri() + '/', debian_keyring)
+
+
+@needs_gpgv
+def test_resolves_the_newest_version_across_suites(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring)
+
+    records, missing, unsatisfied = resolve(index, ['curl'])
+
+    assert versions(records) == {'curl': '7.81.0-1ubuntu1.15', 'libcurl4': '7.81.0-1ubuntu1.15',
+                                 'libc6': '2.35-0ubuntu3', 'libssl3': '3.0.2-0ubuntu1'}
+    assert missing == unsatisfied == []
+
+
+@needs_gpgv
+def test_virtual_packages_prefer_higher_priority_providers(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring)
+
+    records, _, unsatisfied = resolve(index, ['mailutils'])
+
+    assert 'postfix' in versions(records)
+    assert 'exim4-daemon-light' not in versions(records)
+    assert unsatisfied == []
+
+
+@needs_gpgv
+def test_version_ranges_and_architecture_all(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring)
+
+    records, _, unsatisfied = resolve(index, ['git'], include_deps=True)
+
+    assert versions(records)['git-man'] == '1:2.34.1-1ubuntu1'
+    assert unsatisfied == []
+
+
+@needs_gpgv
+def test_snapshot_selects_the_archive_state(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring, snapshot='20240101T000000Z')
+
+    records, _, _ = resolve(index, ['curl'])
+
+    assert versions(records)['curl'] == '7.81.0-1'
+
+
+@needs_gpgv
+def test_pinned_versions_are_selected(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring)
+
+    records, missing, unsatisfied = resolve(index, ['curl'], pins={'curl': '7.81.0-1'})
+
+    # curl 7.81.0-1 depends on libcurl4 (= 7.81.0-1)
+    assert versions(records)['curl'] == versions(records)['libcurl4'] == '7.81.0-1'
+    assert missing == unsatisfied == []
+
+
+@needs_gpgv
+def test_pins_apply_to_dependencies(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring)
+
+    records, _, unsatisfied = resolve(index, ['curl'], pins={'libcurl4': '7.81.0-1'})
+
+    # The closure is solved in one pass: the newest curl needs the newer libcurl4
+    assert versions(records)['curl'] == '7.81.0-1ubuntu1.15'
+    assert 'libcurl4' not in versions(records)
+    assert unsatisfied == ['curl: libcurl4 (= 7.81.0-1ubuntu1.15)']
+
+
+@needs_gpgv
+def test_missing_pins_are_reported(debian_mirror, debian_keyring):
+    index = read_index(debian_mirror, debian_keyring)
+
+    _, missing, _ = resolve(index, ['curl'], pins={'curl': '1.0-1'})
+
+    assert missing == ['curl=1.0-1']
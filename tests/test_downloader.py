@@ -0,0 +1,153 @@
+import base64
+import hashlib
+
+import pytest
+
+from downloader import DownloadError, Downloader, content_range_start
+
+
+BODY = bytes(range(256)) * 64
+
+
+@pytest.fixture
+def downloader(monkeypatch):
+    monkeypatch.setattr('downloader.time.sleep', lambda seconds: None)
+    with Downloader(2, retries=1) as downloader:
+        yield downloader
+
+
+@pytest.fixture
+def served(http_server):
+    http_server.files['/file.bin'] = BODY
+    return http_server
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def test_content_range_start():
+    assert content_range_start('bytes 100-199/200') == 100
+    assert content_range_start('bytes 0-0/*') == 0
+    assert content_range_start('bytes */200') is None
+    assert content_range_start(None) is None
+
+
+def test_downloads_and_checks_the_hash_while_streaming(served, downloader, tmp_path):
+    dest = tmp_path / 'file.bin'
+
+    downloader.fetch(f"{served.url}/file.bin", dest, sha256(BODY))
+
+    assert dest.read_bytes() == BODY
+    assert not (tmp_path / 'file.bin.part').exists()
+
+
+def test_hash_mismatches_are_not_moved_into_place(served, downloader, tmp_path):
+    dest = tmp_path / 'file.bin'
+
+    with pytest.raises(DownloadError, match='sha256 mismatch'):
+        downloader.fetch(f"{served.url}/file.bin", dest, sha256(b'other'))
+
+    assert not dest.exists()
+    assert not (tmp_path / 'file.bin.part').exists()
+
+
+def test_integrity_strings_are_checked(served, downloader, tmp_path):
+    integrity = 'sha512-' + base64.b64encode(hashlib.sha512(BODY).digest()).decode()
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', integrity=integrity)
+
+    with pytest.raises(DownloadError, match='integrity mismatch'):
+        downloader.fetch(f"{served.url}/file.bin", tmp_path / 'other.bin',
+                         integrity='sha512-' + base64.b64encode(bytes(64)).decode())
+
+
+def test_partial_files_are_resumed(served, downloader, tmp_path):
+    (tmp_path / 'file.bin.part').write_bytes(BODY[:1000])
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', sha256(BODY))
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+    assert served.requests == [('/file.bin', 'bytes=1000-')]
+
+
+def test_servers_ignoring_the_range_restart_the_file(served, downloader, tmp_path):
+    served.ignore_range = True
+    (tmp_path / 'file.bin.part').write_bytes(BODY[:1000])
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', sha256(BODY))
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+
+
+def test_a_range_at_another_offset_restarts_the_file(served, downloader, tmp_path):
+    served.responses['/file.bin'] = [(206, {'Content-Range': f"bytes 0-99/{len(BODY)}"}, BODY[:100])]
+    (tmp_path / 'file.bin.part').write_bytes(BODY[:1000])
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin')
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+    assert served.requests == [('/file.bin', 'bytes=1000-'), ('/file.bin', None)]
+
+
+def test_unsatisfiable_ranges_without_a_hash_refetch(served, downloader, tmp_path):
+    # A stale partial file longer than the current one
+    (tmp_path / 'file.bin.part').write_bytes(BODY + b'stale tail')
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin')
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+    assert served.requests == [('/file.bin', f"bytes={len(BODY) + 10}-"), ('/file.bin', None)]
+
+
+def test_unsatisfiable_ranges_with_a_hash_finish_complete_files(served, downloader, tmp_path):
+    (tmp_path / 'file.bin.part').write_bytes(BODY)
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', sha256(BODY))
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+    assert served.requests == [('/file.bin', f"bytes={len(BODY)}-")]
+
+
+def test_unsatisfiable_ranges_with_a_hash_reject_stale_files(served, downloader, tmp_path):
+    (tmp_path / 'file.bin.part').write_bytes(BODY + b'stale tail')
+
+    with pytest.raises(DownloadError, match='sha256 mismatch'):
+        downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', sha256(BODY))
+
+    # The next attempt starts from scratch
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', sha256(BODY))
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+
+
+def test_redirects_are_followed(served, downloader, tmp_path):
+    served.responses['/moved'] = [(302, {'Location': '/file.bin'}, b'')]
+
+    downloader.fetch(f"{served.url}/moved", tmp_path / 'file.bin', sha256(BODY))
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+
+
+def test_redirects_without_a_location_fail_at_once(served, downloader, tmp_path):
+    served.responses['/moved'] = [(302, {}, b'')]
+
+    with pytest.raises(DownloadError, match='without a Location'):
+        downloader.fetch(f"{served.url}/moved", tmp_path / 'file.bin')
+
+    assert served.requests == [('/moved', None)]
+
+
+def test_server_errors_are_retried(served, downloader, tmp_path):
+    served.responses['/file.bin'] = [(503, {}, b'')]
+
+    downloader.fetch(f"{served.url}/file.bin", tmp_path / 'file.bin', sha256(BODY))
+
+    assert (tmp_path / 'file.bin').read_bytes() == BODY
+    assert len(served.requests) == 2
+
+
+def test_client_errors_are_not_retried(served, downloader, tmp_path):
+    with pytest.raises(DownloadError, match='HTTP 404'):
+        downloader.fetch(f"{served.url}/missing.bin", tmp_path / 'missing.bin')
+
+    assert len(served.requests) == 1
@@ -0,0 +1,72 @@
+import pytest
+
+from downloader import Downloader
+from npm_resolver import RegistryClient, lookup, resolve
+
+
+@pytest.fixture
+def downloader():
+    with Downloader(4) as downloader:
+        yield downloader
+
+
+def resolve_with(downloader, registry, dependencies, cache_dir=None):
+    client = RegistryClient(downloader, registry, cache_dir)
+    try:
+        return resolve(client, dependencies), client
+    finally:
+        client.close()
+
+
+def test_picks_latest_matching_release(downloader, npm_registry):
+    lock, _ = resolve_with(downloader, npm_registry, {'demo-a': '^1.0.0'})
+
+    packages = lock['packages']
+    assert lock['lockfileVersion'] == 3
+    assert packages['']['dependencies'] == {'demo-a': '^1.0.0'}
+    assert packages['node_modules/demo-a']['version'] == '1.1.0'
+    # 2.1.0-beta.1 is newer but a prerelease
+    assert packages['node_modules/demo-b']['version'] == '2.0.0'
+    entry = packages['node_modules/demo-b']
+    assert entry['resolved'].startswith(f"{npm_registry}tarballs/sha512-")
+    assert entry['integrity'].startswith('sha512-')
+
+
+def test_conflicting_versions_are_nested(downloader, npm_registry):
+    lock, _ = resolve_with(downloader, npm_registry, {'demo-a': '1.1.0', '@demo/c': '^1.0.0'})
+
+    entries = {path: entry for path, entry in lock['packages'].items() if path}
+    b_for_a = lookup(entries, 'node_modules/demo-a', 'demo-b')
+    b_for_c = lookup(entries, 'node_modules/@demo/c', 'demo-b')
+    assert entries[b_for_a]['version'] == '2.0.0'
+    assert entries[b_for_c]['version'] == '1.0.0'
+    assert 'node_modules/demo-b' in (b_for_a, b_for_c)
+
+
+def test_dist_tags_and_aliases(downloader, npm_registry):
+    lock, _ = resolve_with(downloader, npm_registry, {'demo-a': 'latest', 'old-b': 'npm:demo-b@1.0.0'})
+
+    assert lock['packages']['node_modules/demo-a']['version'] == '1.1.0'
+    alias = lock['packages']['node_modules/old-b']
+    assert (alias['name'], alias['version']) == ('demo-b', '1.0.0')
+
+
+def test_missing_packages_raise(downloader, npm_registry):
+    with pytest.raises(RuntimeError, match='demo-nowhere'):
+        resolve_with(downloader, npm_registry, {'demo-missing-dep': '1.0.0'})
+    with pytest.raises(RuntimeError, match='no-such-package'):
+        resolve_with(downloader, npm_registry, {'no-such-package': '*'})
+
+
+def test_non_registry_specs_raise(downloader, npm_registry):
+    with pytest.raises(RuntimeError, match='registry dependencies'):
+        resolve_with(downloader, npm_registry, {'demo-a': 'git+ssh://git@example.com/demo-a.git'})
+
+
+def test_cached_packuments_are_revalidated(downloader, npm_registry, tmp_path):
+    first, client = resolve_with(downloader, npm_registry, {'demo-a': '^1.0.0'}, tmp_path)
+    assert client.stats == {'fetched': 2, 'revalidated': 0}
+
+    second, client = resolve_with(downloader, npm_registry, {'demo-a': '^1.0.0'}, tmp_path)
+    assert client.stats == {'fetched': 0, 'revalidated': 2}
+    assert second == first
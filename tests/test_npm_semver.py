@@ -0,0 +1,75 @@
+import pytest
+
+from npm_semver import is_range, parse_range, parse_version, satisfies, version_key
+
+
+def matches(version, text):
+    return satisfies(parse_version(version), parse_range(text))
+
+
+def test_parse_version():
+    assert parse_version('1.2.3') == (1, 2, 3, ())
+    assert parse_version('v1.2.3-beta.2+build.5') == (1, 2, 3, ((1, 'beta'), (0, 2)))
+    assert parse_version('1.2') is None
+    assert parse_version('') is None
+
+
+def test_version_ordering():
+    ordered = ['0.9.0', '1.0.0-alpha', '1.0.0-alpha.1', '1.0.0-alpha.beta', '1.0.0-beta.2',
+               '1.0.0-beta.11', '1.0.0-rc.1', '1.0.0', '1.0.1', '1.10.0', '2.0.0']
+    assert sorted(reversed(ordered), key=version_key) == ordered
+
+
+@pytest.mark.parametrize('version, text', [
+    ('1.2.3', '^1.0.0'),
+    ('1.9.9', '^1.2.3'),
+    ('0.2.5', '^0.2.3'),
+    ('0.0.3', '^0.0.3'),
+    ('1.2.9', '~1.2.3'),
+    ('1.5.0', '~1'),
+    ('1.2.0', '1.x'),
+    ('1.2.7', '1.2.*'),
+    ('3.0.0', '*'),
+    ('3.0.0', ''),
+    ('1.5.0', '1.2 - 2.3'),
+    ('2.3.9', '1.2 - 2.3'),
+    ('2.0.0', '1.2.3 - 2'),
+    ('0.5.0', '<1.0.0 || >=3.0.0'),
+    ('3.1.0', '<1.0.0 || >=3.0.0'),
+    ('1.2.3', '>= 1.2.3 < 2'),
+    ('1.2.3', '=1.2.3'),
+    ('1.3.0-beta.2', '>=1.3.0-beta.1 <2'),
+])
+def test_satisfies(version, text):
+    assert matches(version, text)
+
+
+@pytest.mark.parametrize('version, text', [
+    ('2.0.0', '^1.0.0'),
+    ('0.3.0', '^0.2.3'),
+    ('0.0.4', '^0.0.3'),
+    ('1.3.0', '~1.2.3'),
+    ('2.0.0', '1.x'),
+    ('2.4.0', '1.2 - 2.3'),
+    ('2.0.0', '<1.0.0 || >=3.0.0'),
+    ('1.2.2', '>1.2.2'),
+    # Prereleases only match a range naming a prerelease of the same version
+    ('2.1.0-beta.1', '^2.0.0'),
+    ('2.1.0-beta.1', '*'),
+    ('1.4.0-beta.1', '>=1.3.0-beta.1 <2'),
+])
+def test_does_not_satisfy(version, text):
+    assert not matches(version, text)
+
+
+def test_unparsable_version_satisfies_nothing():
+    assert not satisfies(None, parse_range('*'))
+
+
+def test_ranges_and_tags():
+    assert is_range('^1.2.3')
+    assert is_range('1.x || >=2.5.0')
+    assert not is_range('latest')
+    assert not is_range('next')
+    with pytest.raises(ValueError):
+        parse_range('not a range')
@@ -0,0 +1,78 @@
+import pytest
+
+from downloader import Downloader
+from pypi_resolver import IndexClient, resolve
+
+
+@pytest.fixture
+def client(fixtures_dir):
+    with Downloader(4) as downloader:
+        yield IndexClient(downloader, (fixtures_dir / 'pypi' / 'simple').as_uri())
+
+
+def versions(records):
+    return {record['name']: record['version'] for record in records}
+
+
+def test_resolves_dependencies_from_metadata_sidecars(client):
+    records = resolve(client, ['demo-app'], '3.11', 'manylinux2014_x86_64')
+
+    # demo-app 2.0 needs Python 3.12; demo-lib 2.1 only has a cp312 wheel
+    assert versions(records) == {'demo-app': '1.0', 'demo-lib': '2.0'}
+    assert client.stats['sidecar'] == 2
+    assert client.stats['local'] == client.stats['range'] == client.stats['full'] == 0
+
+
+def test_records_point_at_index_files(client, fixtures_dir):
+    records = resolve(client, ['demo-lib==1.1'], '3.11', 'manylinux2014_x86_64')
+
+    assert len(records) == 1
+    record = records[0]
+    assert record['filename'] == 'demo_lib-1.1-py3-none-any.whl'
+    assert record['url'] == (fixtures_dir / 'pypi' / 'packages' / record['filename']).as_uri()
+    assert len(record['sha256']) == 64
+    assert record['requested']
+
+
+def test_newer_python_picks_newer_wheels(client):
+    records = resolve(client, ['demo-app'], '3.12', 'manylinux2014_x86_64')
+
+    assert versions(records) == {'demo-app': '2.0', 'demo-lib': '2.1'}
+    lib = next(record for record in records if record['name'] == 'demo-lib')
+    assert 'manylinux' in lib['filename']
+
+
+def test_markers_are_evaluated_for_the_target(client):
+    records = resolve(client, ['demo-app==1.0'], '3.11', 'win_amd64')
+
+    assert versions(records) == {'demo-app': '1.0', 'demo-lib': '2.0', 'demo-win': '1.0'}
+
+
+def test_extras_pull_in_their_requirements(client):
+    records = resolve(client, ['demo-app[fast]==1.0'], '3.11', 'manylinux2014_x86_64')
+
+    assert versions(records) == {'demo-app': '1.0', 'demo-lib': '2.0', 'demo-fast': '1.0'}
+
+
+def test_backtracks_to_a_compatible_set(client):
+    records = resolve(client, ['demo-app', 'demo-pin'], '3.12', 'manylinux2014_x86_64')
+
+    assert versions(records) == {'demo-app': '1.0', 'demo-lib': '1.1', 'demo-pin': '1.0'}
+    assert {record['name'] for record in records if record['requested']} == {'demo-app', 'demo-pin'}
+
+
+def test_unsatisfiable_requirements_raise(client):
+    with pytest.raises(RuntimeError, match='demo-lib'):
+        resolve(client, ['demo-conflict'], '3.11', 'manylinux2014_x86_64')
+
+
+def test_unknown_project_raises(client):
+    with pytest.raises(RuntimeError):
+        resolve(client, ['no-such-project'], '3.11', 'manylinux2014_x86_64')
+
+
+def test_without_dependencies_only_requested_projects(client):
+    records = resolve(client, ['demo-app'], '3.11', 'manylinux2014_x86_64', include_deps=False)
+
+    assert versions(records) == {'demo-app': '1.0'}
+    assert client.stats['sidecar'] == 0
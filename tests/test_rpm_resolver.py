@@ -0,0 +1,92 @@
+import pytest
+
+from downloader import Downloader
+from rpm_resolver import compare_evr, fetch_index, parse_evr, ranges_overlap, repositories, resolve, rpmvercmp
+
+
+def read_index(templates, architecture='x86_64'):
+    with Downloader(4) as downloader:
+        return fetch_index(downloader, repositories('rocky', 9, architecture, templates), architecture)
+
+
+def versions(records):
+    return {record['name']: record['version'] for record in records}
+
+
+@pytest.mark.parametrize('lower, higher', [
+    ('1.0', '1.1'),
+    ('1.0', '1.0.1'),
+    ('1.9', '1.10'),
+    ('1.0a', '1.0b'),
+    ('a', '1'),
+    ('1.0~rc1', '1.0'),
+    ('1.0~rc1', '1.0~rc2'),
+    ('1.0', '1.0^git1'),
+    ('1.0^git1', '1.0.1'),
+    ('1.0^', '1.0a'),
+    ('2.el9', '26.el9'),
+    ('1.el9', '1.el9_1'),
+])
+def test_rpmvercmp_orders_as_rpm(lower, higher):
+    assert rpmvercmp(lower, higher) == -1
+    assert rpmvercmp(higher, lower) == 1
+
+
+@pytest.mark.parametrize('a, b', [('1.0', '1.0'), ('1.01', '1.1'), ('1_0', '1.0'), ('1..0', '1.0')])
+def test_rpmvercmp_equal(a, b):
+    assert rpmvercmp(a, b) == 0
+
+
+def test_compare_evr():
+    assert parse_evr('1:3.0.7-1.el9') == (1, '3.0.7', '1.el9')
+    assert parse_evr('2.34') == (0, '2.34', None)
+    assert compare_evr(parse_evr('1:1.0-1'), parse_evr('9.9-9')) > 0
+    assert compare_evr(parse_evr('2.34-60.el9'), parse_evr('2.34-100.el9')) < 0
+    # A requirement without a release matches every release
+    assert compare_evr(parse_evr('2.34-60.el9'), parse_evr('2.34')) == 0
+
+
+def test_ranges_overlap():
+    assert ranges_overlap('=', parse_evr('1:3.0.7-1.el9'), '>=', parse_evr('1:3.0.0'))
+    assert not ranges_overlap('=', parse_evr('1:3.0.1-1.el9'), '>=', parse_evr('1:3.0.7'))
+    assert ranges_overlap(None, None, '>=', parse_evr('1.0'))
+
+
+def test_resolves_the_newest_closure(rpm_repositories):
+    index = read_index(rpm_repositories)
+
+    records, missing, unsatisfied = resolve(index, ['curl'])
+
+    assert versions(records) == {'curl': '7.76.1-26.el9', 'libcurl': '7.76.1-26.el9',
+                                 'glibc': '2.34-60.el9', 'glibc-langpack-en': '2.34-60.el9',
+                                 'openssl-libs': '1:3.0.7-1.el9'}
+    assert missing == unsatisfied == []
+
+
+def test_file_requirements_read_filelists(rpm_repositories):
+    index = read_index(rpm_repositories)
+
+    records, _, unsatisfied = resolve(index, ['git'])
+
+    # /usr/libexec/git-core/git-sh-setup is only in filelists
+    assert index.filelists_loaded
+    assert {'git-core', 'perl-Git', 'perl-interpreter'} <= set(versions(records))
+    assert unsatisfied == []
+
+
+def test_noarch_packages_are_indexed_for_every_architecture(rpm_repositories):
+    for architecture in ('x86_64', 'aarch64'):
+        records, _, _ = resolve(read_index(rpm_repositories, architecture), ['perl-Git'], False)
+        assert [(record['name'], record['arch']) for record in records] == [('perl-Git', 'noarch')]
+
+
+def test_non_default_module_streams_are_hidden(rpm_repositories):
+    records, _, _ = resolve(read_index(rpm_repositories), ['nodejs'])
+
+    assert versions(records) == {'nodejs': '1:16.19.1-1.el9'}
+
+
+def test_missing_packages_are_reported(rpm_repositories):
+    _, missing, _ = resolve(read_index(rpm_repositories), ['curl', 'no-such-package'])
+
+    assert missing == ['no-such-package']